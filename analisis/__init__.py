@@ -0,0 +1 @@
+"""Componentes reutilizables (sin Streamlit) del pipeline de análisis de ventas."""
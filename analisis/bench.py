@@ -0,0 +1,269 @@
+"""Benchmark del pipeline sobre datos sintéticos (ver `synth`) a distintas escalas.
+
+Uso:
+    python -m analisis.bench --sizes 10k,1m --output bench.json
+    python -m analisis.bench --sizes 10m,100m --mode streaming
+    python -m analisis.bench --sizes 1m --baseline bench.json   # compara contra una corrida anterior
+
+Cada tamaño corre en un proceso nuevo, de modo que el pico de RSS es el de ese caso
+y no arrastra memoria del anterior. Se mide por separado cada etapa: lectura de los
+CSV, los pasos de limpieza del `report` del pipeline (normalización, tipificación,
+exportación, merges, derivadas, cubo, índice) y las agregaciones de los gráficos del
+Paso 3. Los datos generados se reutilizan entre corridas con la misma semilla.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: sin pico de RSS
+    resource = None
+
+from .profiling import rss_mb
+from .synth import CHUNK_ROWS, generate
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000, "100m": 100_000_000}
+MODES = ("pandas", "streaming", "duckdb")
+DEFAULT_WORK_DIR = ".bench"
+DEFAULT_TOLERANCE = 0.2
+NOISE_SECONDS = 0.05  # diferencias por debajo de esto no cuentan como regresión
+_MARKER = "synth.json"
+
+def parse_size(size: str) -> int:
+    """'10k', '1m', '2.5m' o un entero."""
+    size = str(size).strip().lower()
+    if size in SIZES:
+        return SIZES[size]
+    for suffix, factor in (("k", 10 ** 3), ("m", 10 ** 6)):
+        if size.endswith(suffix):
+            return int(float(size[:-1]) * factor)
+    return int(size)
+
+# ========================= MEMORIA =========================
+def peak_rss_mb():
+    """Pico de RSS del proceso actual (MB), o None si la plataforma no lo informa."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024, 1)  # bytes en macOS, KB en Linux
+
+@contextmanager
+def stage(stages: list, name: str):
+    """Agrega a `stages` duración, RSS al terminar y pico de RSS acumulado de la etapa `name`."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages.append({"stage": name, "seconds": round(time.perf_counter() - t0, 4),
+                       "rss_mb": rss_mb(), "peak_rss_mb": peak_rss_mb()})
+
+# ========================= DATOS =========================
+def synth_data(work_dir: str, rows: int, seed: int = 0, chunk_rows: int = CHUNK_ROWS) -> tuple:
+    """Carpeta con los CSV sintéticos de `rows` líneas (se generan sólo si no existen) y su resumen."""
+    data_dir = os.path.join(work_dir, f"synth_{rows}_s{seed}")
+    marker = os.path.join(data_dir, _MARKER)
+    try:
+        with open(marker, "r", encoding="utf-8") as fh:
+            info = json.load(fh)
+        if info.get("rows") == rows and info.get("seed") == seed:
+            return data_dir, info
+    except (OSError, ValueError):
+        pass
+    t0 = time.perf_counter()
+    tables = generate(data_dir, rows, seed=seed, chunk_rows=chunk_rows)
+    info = {"rows": rows, "seed": seed, "tables": tables, "generate_seconds": round(time.perf_counter() - t0, 2),
+            "input_mb": round(sum(os.path.getsize(os.path.join(data_dir, f)) for f in os.listdir(data_dir))
+                              / 1024 ** 2, 1)}
+    with open(marker, "w", encoding="utf-8") as fh:
+        json.dump(info, fh)
+    return data_dir, info
+
+# ========================= ETAPAS =========================
+def _chart_stages(cube, stages: list):
+    """Las agregaciones de los gráficos y tablas del Paso 3, cada una por separado."""
+    cat_col = cube.cat_col
+    with stage(stages, "charts:histogram"):
+        cube.ticket_histogram(bins=20)
+    if cat_col:
+        with stage(stages, "charts:boxplot"):
+            cube.box_stats(cat_col)
+        with stage(stages, "charts:revenue"):
+            cube.revenue_by(cat_col)
+    with stage(stages, "charts:scatter"):
+        sample = cube.sample
+        if {"cantidad", "precio_unitario"}.issubset(sample.columns):
+            np.histogram2d(sample["cantidad"].astype("float64").fillna(0),
+                           sample["precio_unitario"].astype("float64").fillna(0), bins=60)
+    with stage(stages, "charts:describe"):
+        cube.describe()
+
+def run_case(data_dir: str, output_dir: str, mode: str = "pandas", workers: int = None,
+             formats=("csv",), chunksize: int = None) -> dict:
+    """Corre el pipeline en `mode` sobre `data_dir` y devuelve las etapas medidas."""
+    from .pipeline import clean_data
+    from .readers import load_raw_data
+    from .streaming import DEFAULT_CHUNKSIZE, stream_pipeline
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    stages = []
+    t0 = time.perf_counter()
+    if mode == "pandas":
+        with stage(stages, "read"):
+            raw = load_raw_data(data_dir, workers=workers)
+        with stage(stages, "clean"):
+            cleaned = clean_data(*raw, output_dir=output_dir, formats=formats, workers=workers)
+    elif mode == "streaming":
+        with stage(stages, "clean"):
+            cleaned = stream_pipeline(data_dir, output_dir, chunksize=chunksize or DEFAULT_CHUNKSIZE, formats=formats)
+    elif mode == "duckdb":
+        from .lazy import lazy_pipeline
+        with stage(stages, "clean"):
+            cleaned = lazy_pipeline(data_dir, output_dir, formats=formats, threads=workers)
+    else:
+        raise ValueError(f"Modo no soportado: {mode} (opciones: {', '.join(MODES)})")
+    # los pasos internos del pipeline (duración, CPU, filas y variación de RSS de `profiling.measure`)
+    stages.extend({"stage": f"clean:{e['step']}", **{k: v for k, v in e.items() if k != "step"}}
+                  for e in cleaned["report"] if "count" not in e)
+    _chart_stages(cleaned["cube"], stages)
+    return {
+        "stages": stages,
+        "total_seconds": round(time.perf_counter() - t0, 4),
+        "rows_out": int(cleaned["cube"].meta["rows"]),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def _fresh_process(fn, *args, **kwargs):
+    """Ejecuta `fn` en un proceso nuevo (spawn) para que el pico de RSS sea sólo el suyo."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(fn, *args, **kwargs).result()
+
+def _in_process(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+def run_benchmark(sizes, work_dir: str = DEFAULT_WORK_DIR, seed: int = 0, mode: str = "pandas",
+                  workers: int = None, formats=("csv",), chunksize: int = None, isolate: bool = True,
+                  log=print) -> dict:
+    """Genera (o reutiliza) los datos de cada tamaño, corre el pipeline y arma los resultados."""
+    runs = []
+    for size in sizes:
+        rows = parse_size(size)
+        log(f"[{size}] datos sintéticos ({rows:,} líneas)…")
+        data_dir, info = synth_data(work_dir, rows, seed)
+        log(f"[{size}] pipeline {mode}…")
+        runner = _fresh_process if isolate else _in_process
+        case = runner(run_case, data_dir, os.path.join(work_dir, f"out_{rows}"), mode, workers,
+                      tuple(formats), chunksize)
+        runs.append({"size": str(size), "rows": rows, "tables": info["tables"], "input_mb": info["input_mb"],
+                     "generate_seconds": info["generate_seconds"], **case})
+        log(f"[{size}] {case['total_seconds']:.2f} s, pico RSS {case['peak_rss_mb']} MB")
+    return {"meta": run_meta(seed=seed, mode=mode, workers=workers, formats=list(formats)), "runs": runs}
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_meta(**params) -> dict:
+    """Entorno de la corrida (para comparar resultados entre máquinas y versiones)."""
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "git": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        **params,
+    }
+
+# ========================= COMPARACIÓN =========================
+def compare(baseline: dict, current: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """Etapas (por tamaño) más lentas que en `baseline` por encima de `tolerance` (0.2 = +20 %)."""
+    base = {(r["rows"], s["stage"]): s["seconds"] for r in baseline["runs"] for s in r["stages"]}
+    base_rss = {r["rows"]: r.get("peak_rss_mb") for r in baseline["runs"]}
+    out = []
+    for run in current["runs"]:
+        for s in run["stages"]:
+            before = base.get((run["rows"], s["stage"]))
+            if before is None or s["seconds"] - before < NOISE_SECONDS:
+                continue
+            if s["seconds"] > before * (1 + tolerance):
+                out.append({"size": run["size"], "stage": s["stage"], "before": before, "after": s["seconds"],
+                            "ratio": round(s["seconds"] / max(before, 1e-9), 2)})
+        before = base_rss.get(run["rows"])
+        if before and run.get("peak_rss_mb") and run["peak_rss_mb"] > before * (1 + tolerance):
+            out.append({"size": run["size"], "stage": "peak_rss_mb", "before": before, "after": run["peak_rss_mb"],
+                        "ratio": round(run["peak_rss_mb"] / before, 2)})
+    return out
+
+# ========================= CLI =========================
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m analisis.bench",
+                                     description="Mide cada etapa del pipeline con datos sintéticos.")
+    parser.add_argument("--sizes", default="10k,1m",
+                        help=f"líneas de detalle por caso, separadas por coma ({', '.join(SIZES)} o un número)")
+    parser.add_argument("--mode", choices=MODES, default="pandas", help="pipeline a medir (default: pandas)")
+    parser.add_argument("--seed", type=int, default=0, help="semilla del generador (default: 0)")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR,
+                        help=f"carpeta para los datos generados y las salidas (default: {DEFAULT_WORK_DIR})")
+    parser.add_argument("--workers", type=int, help="workers de lectura/tipificación (default: todos los núcleos)")
+    parser.add_argument("--chunksize", type=int, help="con --mode streaming, líneas por bloque")
+    parser.add_argument("--format", default="csv", help="formatos de salida (csv, parquet o csv,parquet)")
+    parser.add_argument("--output", help="JSON de resultados (default: <work-dir>/bench_<fecha>.json)")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"margen antes de marcar una regresión (default: {DEFAULT_TOLERANCE} = +20%%)")
+    parser.add_argument("--in-process", action="store_true", help="no aislar cada tamaño en un proceso nuevo")
+    return parser
+
+def main(argv=None) -> int:
+    from .storage import parse_formats
+
+    args = build_parser().parse_args(argv)
+    try:
+        sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+        for s in sizes:
+            parse_size(s)
+        result = run_benchmark(sizes, args.work_dir, args.seed, args.mode, args.workers,
+                               parse_formats(args.format), args.chunksize, isolate=not args.in_process)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    output = args.output or os.path.join(args.work_dir, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(result, fh, ensure_ascii=False, indent=2)
+    for run in result["runs"]:
+        print(f"{run['size']:>6} ({run['rows']:,} líneas, {run['input_mb']} MB): "
+              f"{run['total_seconds']:.2f} s, pico RSS {run['peak_rss_mb']} MB")
+        for s in run["stages"]:
+            print(f"         {s['stage']:<24} {s['seconds']:>9.3f} s")
+    print(f"resultados: {output}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            regressions = compare(json.load(fh), result, args.tolerance)
+        for r in regressions:
+            print(f"regresión [{r['size']}] {r['stage']}: {r['before']} → {r['after']} (×{r['ratio']})")
+        if regressions:
+            return 2
+        print("sin regresiones respecto de " + args.baseline)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
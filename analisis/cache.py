@@ -0,0 +1,165 @@
+"""Caché persistente en disco (Feather/Arrow IPC) de tablas crudas ya parseadas.
+
+Cada entrada se identifica por la huella del CSV de origen: ruta, mtime, tamaño y
+hash de contenido. Si el archivo no cambió, la tabla se carga con memory mapping en
+lugar de volver a parsear el CSV.
+"""
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # sin pyarrow la caché queda deshabilitada (se parsea siempre)
+    pa = None
+    feather = None
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GiB
+_HASH_CHUNK = 4 * 1024 * 1024
+_INDEX_NAME = "index.json"
+
+def file_digest(path: str) -> str:
+    """Hash BLAKE2b del contenido completo del archivo (lectura en bloques)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(_HASH_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class TableCache:
+    """Caché de DataFrames en disco con invalidación explícita y desalojo LRU por tamaño."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = feather is not None
+        if self.enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # ------------------------- índice -------------------------
+    @property
+    def _index_path(self):
+        return os.path.join(self.cache_dir, _INDEX_NAME)
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index: dict):
+        tmp = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(index, fh)
+        os.replace(tmp, self._index_path)  # escritura atómica (varias sesiones)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.feather")
+
+    # ------------------------- huella -------------------------
+    def fingerprint(self, path: str, index: dict = None) -> dict:
+        """Ruta + mtime + tamaño + hash de contenido (el hash se reutiliza si el stat no cambió)."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        index = self._read_index() if index is None else index
+        digest = None
+        for meta in index.values():
+            if meta["path"] == path and meta["mtime_ns"] == st.st_mtime_ns and meta["size"] == st.st_size:
+                digest = meta["digest"]
+                break
+        if digest is None:
+            digest = file_digest(path)
+        key = hashlib.blake2b(
+            f"{path}|{st.st_mtime_ns}|{st.st_size}|{digest}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+        return {"key": key, "path": path, "mtime_ns": st.st_mtime_ns, "size": st.st_size, "digest": digest}
+
+    # ------------------------- lectura / escritura -------------------------
+    def get(self, path: str):
+        """Devuelve la tabla cacheada para `path` o None si no hay entrada vigente."""
+        if not self.enabled:
+            return None
+        index = self._read_index()
+        fp = self.fingerprint(path, index)
+        meta = index.get(fp["key"])
+        entry = self._entry_path(fp["key"])
+        if meta is None or not os.path.exists(entry):
+            return None
+        try:
+            table = feather.read_table(entry, memory_map=True)
+            df = table.to_pandas(split_blocks=True)
+        except Exception:
+            self._drop(index, fp["key"])
+            self._write_index(index)
+            return None
+        meta["last_access"] = time.time()
+        self._write_index(index)
+        return df
+
+    def put(self, path: str, df: pd.DataFrame) -> bool:
+        """Guarda `df` como Feather sin comprimir (apto para memory mapping)."""
+        if not self.enabled:
+            return False
+        index = self._read_index()
+        fp = self.fingerprint(path, index)
+        key = fp.pop("key")
+        # las entradas anteriores del mismo archivo quedan obsoletas
+        for stale in [k for k, m in index.items() if m["path"] == fp["path"] and k != key]:
+            self._drop(index, stale)
+        entry = self._entry_path(key)
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        try:
+            feather.write_feather(df, tmp, compression="uncompressed")
+            os.replace(tmp, entry)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        index[key] = dict(fp, bytes=os.path.getsize(entry), last_access=time.time())
+        self._evict(index)
+        self._write_index(index)
+        return True
+
+    def load(self, path: str, reader) -> pd.DataFrame:
+        """Lee `path` desde la caché o, si cambió, con `reader(path)` y lo cachea."""
+        df = self.get(path)
+        if df is None:
+            df = reader(path)
+            self.put(path, df)
+        return df
+
+    # ------------------------- invalidación / desalojo -------------------------
+    def invalidate(self, path: str = None) -> int:
+        """Elimina las entradas de `path` (o todas si es None). Devuelve cuántas se borraron."""
+        if not self.enabled:
+            return 0
+        index = self._read_index()
+        target = os.path.abspath(path) if path else None
+        keys = [k for k, m in index.items() if target is None or m["path"] == target]
+        for key in keys:
+            self._drop(index, key)
+        self._write_index(index)
+        return len(keys)
+
+    def size_bytes(self) -> int:
+        return sum(m.get("bytes", 0) for m in self._read_index().values())
+
+    def _drop(self, index: dict, key: str):
+        index.pop(key, None)
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def _evict(self, index: dict):
+        total = sum(m.get("bytes", 0) for m in index.values())
+        for key in sorted(index, key=lambda k: index[k].get("last_access", 0)):
+            if total <= self.max_bytes:
+                break
+            total -= index[key].get("bytes", 0)
+            self._drop(index, key)
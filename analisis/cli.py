@@ -0,0 +1,176 @@
+"""Punto de entrada de línea de comandos (batch, sin Streamlit).
+
+Uso:
+    python -m analisis --data-dir data --output-dir data_limpios [--keys claves.json]
+    python -m analisis --incremental   # sólo las filas nuevas desde la última corrida
+    python -m analisis --format csv,parquet   # además, Parquet particionado en data_limpios/parquet
+    python -m analisis --workers 16 --pool process   # parseo de CSV en 16 procesos
+    python -m analisis --backend duckdb --memory-limit 8GB   # plan perezoso, con spill a disco
+    python -m analisis --profile-jsonl etapas.jsonl --cprofile corrida.pstats   # instrumentación
+    python -m analisis --reconcile --max-exception-rate 0.001   # sale con 2 si la conciliación no pasa
+    python -m analisis --reports sucursales/*/ --workers 8   # un reporte por sucursal, en 8 procesos
+
+El archivo de claves es un JSON con cualquier subconjunto de
+det_prod_key, prod_key, det_venta_key, venta_key, cli_key_det y cli_key_cli;
+las que falten se detectan automáticamente igual que en la app.
+"""
+import argparse
+import json
+import os
+import sys
+
+from .cache import TableCache
+from .cube import CUBE_DIRNAME
+from .incremental import STATE_FILE, ingest
+from .lazy import BACKENDS, check_backend, lazy_pipeline
+from .parallel import POOL_KINDS
+from .profiling import profiled, top_functions, write_jsonl
+from .reconcile import failed_checks, save_reconciliation, summary_table
+from .reports import batch_reports
+from .pipeline import INTEGRATED_FILE, run_pipeline
+from .storage import FORMATS, PARQUET_DIRNAME, parse_formats
+from .streaming import DEFAULT_CHUNKSIZE, stream_pipeline, stream_reconcile
+
+def load_keys(path: str) -> dict:
+    """Lee el mapeo de columnas clave desde un archivo JSON."""
+    with open(path, "r", encoding="utf-8") as fh:
+        keys = json.load(fh)
+    if not isinstance(keys, dict):
+        raise ValueError(f"{path}: se esperaba un objeto JSON con el mapeo de claves")
+    return keys
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m analisis",
+        description="Limpieza → integración → exportación de los CSV de ventas, sin interfaz.",
+    )
+    parser.add_argument("--data-dir", default="data", help="carpeta con los CSV originales (default: data)")
+    parser.add_argument("--output-dir", default="data_limpios", help="carpeta de salida (default: data_limpios)")
+    parser.add_argument("--keys", help="JSON con el mapeo de columnas clave")
+    parser.add_argument("--cache-dir", help="carpeta de caché Feather de tablas crudas (opcional)")
+    parser.add_argument("--float32", action="store_true", help="guardar medidas numéricas como float32")
+    parser.add_argument("--report-memory", action="store_true", help="medir el pico de memoria de cada paso")
+    parser.add_argument("--chunksize", type=int,
+                        help="procesar el detalle en bloques de N filas (modo streaming, memoria acotada)")
+    parser.add_argument("--no-integrado", action="store_true", help=f"no escribir {INTEGRATED_FILE}")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"procesar sólo las filas nuevas de ventas/detalle desde la última corrida ({STATE_FILE})")
+    parser.add_argument("--full", action="store_true", help="con --incremental, reconstruir todo desde cero")
+    parser.add_argument("--workers", type=int,
+                        help="workers para leer y tipificar en paralelo (default: todos los núcleos; 1 = secuencial)")
+    parser.add_argument("--pool", choices=POOL_KINDS, default="thread",
+                        help="parsear los CSV en hilos o en procesos (default: thread)")
+    parser.add_argument("--backend", choices=BACKENDS, default="pandas",
+                        help="motor de ejecución: pandas (default) o duckdb (plan perezoso fuera de memoria)")
+    parser.add_argument("--memory-limit", help="con --backend duckdb, memoria máxima antes de usar disco (p.ej. 8GB)")
+    parser.add_argument("--format", default="csv",
+                        help=f"formatos de salida separados por coma: {', '.join(FORMATS)} (default: csv)")
+    parser.add_argument("--profile-jsonl",
+                        help="agregar las métricas de cada paso (tiempo, CPU, filas, memoria) a este JSON lines")
+    parser.add_argument("--cprofile", help="perfilar la corrida con cProfile y guardar el volcado pstats acá")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="guardar la conciliación (importes, precios, huérfanos, totales) en la carpeta de salida")
+    parser.add_argument("--max-exception-rate", type=float, default=0.0,
+                        help="con --reconcile, tasa de excepciones tolerada por control antes de fallar (default: 0)")
+    parser.add_argument("--reports", nargs="+", metavar="DATA_DIR",
+                        help="generar gráficos, tablas y conclusiones de cada carpeta (una por sucursal) en procesos")
+    parser.add_argument("--reports-root", default="proyecto_Archivos_definitivos",
+                        help="con --reports, carpeta donde se crea reportes/<sucursal>/ (default: proyecto_Archivos_definitivos)")
+    parser.add_argument("--force", action="store_true", help="con --reports, regenerar aunque los datos no hayan cambiado")
+    return parser
+
+def reports_step(args) -> int:
+    """Reportes por sucursal (`reports.batch_reports`); 1 si alguna sucursal falló."""
+    keys = load_keys(args.keys) if args.keys else None
+    index = batch_reports(args.reports, args.reports_root, workers=args.workers, keys=keys,
+                          chunksize=args.chunksize, force=args.force)
+    counts = index["estado"].value_counts()
+    print(f"{len(index)} sucursales en {index.attrs['seconds']} s: "
+          + ", ".join(f"{n} {estado}" for estado, n in counts.items()))
+    for row in index[index["estado"] == "error"].itertuples():
+        print(f"  {row.sucursal}: {row.error}", file=sys.stderr)
+    return 1 if counts.get("error") else 0
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.reports:
+        try:
+            return reports_step(args)
+        except (OSError, ValueError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+    try:
+        with profiled(args.cprofile, enabled=bool(args.cprofile)) as profiler:
+            keys = load_keys(args.keys) if args.keys else None
+            cache = TableCache(args.cache_dir) if args.cache_dir else None
+            formats = parse_formats(args.format)
+            opts = dict(keys=keys, cache=cache, float_dtype="float32" if args.float32 else "float64",
+                        track_memory=args.report_memory, formats=formats)
+            if args.backend == "duckdb":
+                check_backend(args.backend)
+                opts.pop("cache")  # DuckDB lee los CSV directamente
+                cleaned = lazy_pipeline(args.data_dir, args.output_dir, write_integrated=not args.no_integrado,
+                                        memory_limit=args.memory_limit, threads=args.workers, **opts)
+            elif args.incremental:
+                cleaned = ingest(args.data_dir, args.output_dir, full=args.full,
+                                 write_integrated=not args.no_integrado, **opts)
+            elif args.chunksize:
+                cleaned = stream_pipeline(args.data_dir, args.output_dir, chunksize=args.chunksize,
+                                          write_integrated=not args.no_integrado, **opts)
+            else:
+                cleaned = run_pipeline(args.data_dir, args.output_dir, write_integrated=not args.no_integrado,
+                                       workers=args.workers, pool=args.pool, **opts)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    if "csv" in formats:
+        print(f"CSV limpios guardados en: {args.output_dir}")
+    if "parquet" in formats:
+        print(f"Parquet particionado (anio/mes) en: {os.path.join(args.output_dir, PARQUET_DIRNAME)}")
+    batch = cleaned.get("incremental")
+    if batch:
+        print(f"incremental: {batch['ventas']} ventas y {batch['detalle']} líneas nuevas"
+              + (f" (reconstrucción: {batch['rebuild']})" if batch["rebuild"] else "")
+              + (f", {batch['late_lines']} líneas de ventas anteriores" if batch["late_lines"] else ""))
+    elif cleaned.get("backend") == "duckdb":
+        print(f"detalle: {cleaned['rows']} filas integradas con DuckDB (sin materializar)")
+    elif cleaned.get("streaming"):
+        print(f"detalle: {cleaned['rows']} filas procesadas por bloques")
+    else:
+        print(f"integrado: {len(cleaned['integrado'])} filas × {cleaned['integrado'].shape[1]} columnas")
+    cube = cleaned.get("cube")
+    if cube is not None:
+        print(f"cubo: {len(cube.cells)} celdas ({', '.join(cube.dims)}), "
+              f"{int(cube.ticket_summary()['count'])} tickets → {os.path.join(args.output_dir, CUBE_DIRNAME)}")
+    print("claves: " + json.dumps(cleaned["keys"], ensure_ascii=False))
+    for entry in cleaned["report"]:
+        print("  " + "  ".join(f"{k}={v}" for k, v in entry.items()))
+    if args.profile_jsonl:
+        mode = cleaned.get("backend") or ("incremental" if batch else "streaming" if cleaned.get("streaming")
+                                          else "pandas")
+        write_jsonl(cleaned["report"], args.profile_jsonl, data_dir=os.path.abspath(args.data_dir), mode=mode)
+        print(f"métricas por paso agregadas a: {args.profile_jsonl}")
+    if profiler is not None:
+        print(f"perfil cProfile: {args.cprofile}")
+        print(top_functions(profiler, limit=15))
+    if args.reconcile:
+        return reconcile_step(args, cleaned)
+    return 0
+
+def reconcile_step(args, cleaned: dict) -> int:
+    """Imprime y guarda la conciliación; 2 si algún control supera `--max-exception-rate`."""
+    result = cleaned.get("reconciliation")
+    if result is None:  # DuckDB e incremental no la calculan: se recorre el detalle por bloques
+        try:
+            result = stream_reconcile(args.data_dir, keys=cleaned["keys"], chunksize=args.chunksize or DEFAULT_CHUNKSIZE)
+        except (OSError, ValueError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+    folder = save_reconciliation(result, args.output_dir)
+    print(f"conciliación ({result['rows']} líneas, tolerancia {result['tolerance']}) → {folder}")
+    print(summary_table(result).to_string(index=False))
+    failed = failed_checks(result, args.max_exception_rate)
+    if failed:
+        print(f"conciliación fallida (tasa > {args.max_exception_rate}): {', '.join(failed)}", file=sys.stderr)
+        return 2
+    return 0
@@ -0,0 +1,177 @@
+"""Representación compacta del integrado y de las tablas limpias que quedan en la sesión.
+
+El integrado ancho repite en cada línea del detalle las columnas de productos,
+ventas y clientes (nombres, email, precio de catálogo…). `CompactTable` guarda en
+su lugar:
+
+- `fact`: las columnas propias del detalle más las derivadas (medidas, claves y
+  calendario), una fila por línea;
+- `dims`: productos, ventas y clientes, una fila por clave (las mismas tablas
+  limpias de la sesión, no una copia);
+- por dimensión, la posición (int32) de la fila que le toca a cada línea
+  (`joins.lookup_positions`, -1 si no hay correspondencia).
+
+Las columnas de las dimensiones se resuelven recién al pedirlas (`tabla["email"]`)
+con un `take` sobre esas posiciones, con los mismos nombres, sufijos y nulos que el
+integrado de `joins.integrate_gather`. `compact_frame` codifica como categóricas las
+columnas de texto con pocos valores distintos y achica los enteros al menor tipo que
+los contiene; los flotantes quedan como están (float32 cambiaría sumas y promedios).
+"""
+import numpy as np
+import pandas as pd
+
+from .joins import _take, client_dimension, dims_are_unique, join_names, lookup_positions
+from .profiling import measure
+
+CATEGORY_MAX_RATIO = 0.5  # texto con a lo sumo un valor distinto cada dos filas → categórica
+SESSION_TABLES = ("clientes", "productos", "ventas", "detalle")
+
+def compact_column(s: pd.Series, max_ratio: float = CATEGORY_MAX_RATIO) -> pd.Series:
+    """Enteros al menor tipo que los contiene; texto repetido como categórica; el resto igual."""
+    dtype = s.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype):
+        return s
+    if pd.api.types.is_integer_dtype(dtype):
+        return pd.to_numeric(s, downcast="integer")  # los nullables (Int64) pasan a Int8/Int16/…
+    if pd.api.types.is_string_dtype(dtype) and len(s) and s.nunique(dropna=True) <= max_ratio * len(s):
+        return s.astype("category")
+    return s
+
+def compact_frame(df: pd.DataFrame, max_ratio: float = CATEGORY_MAX_RATIO) -> pd.DataFrame:
+    """`compact_column` sobre cada columna (mismo índice y orden de columnas)."""
+    return pd.DataFrame({c: compact_column(df[c], max_ratio) for c in df.columns}, index=df.index, copy=False)
+
+def memory_bytes(obj) -> int:
+    """Memoria de un DataFrame, una `CompactTable` (sin sus dimensiones) o None."""
+    if obj is None:
+        return 0
+    if isinstance(obj, CompactTable):
+        return obj.nbytes()
+    return int(obj.memory_usage(index=True, deep=True).sum())
+
+def _positions_dtype(n: int):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+class CompactTable:
+    """Integrado angosto: `fact` + posiciones en `dims`; las columnas de dimensión se resuelven al acceder."""
+
+    def __init__(self, fact: pd.DataFrame, dims: dict = None, positions: dict = None, layout: dict = None):
+        self.fact = fact.reset_index(drop=True)
+        self.dims = dict(dims or {})
+        self.positions = dict(positions or {})
+        # nombre en el integrado → ("fact" | nombre de la dimensión, columna de origen)
+        self.layout = dict(layout) if layout is not None else {c: ("fact", c) for c in fact.columns}
+        self._missing = {name: bool((pos < 0).any()) for name, pos in self.positions.items()}
+
+    # ------------------------- forma -------------------------
+    def __len__(self) -> int:
+        return len(self.fact)
+
+    @property
+    def columns(self) -> pd.Index:
+        return pd.Index(list(self.layout))
+
+    @property
+    def shape(self) -> tuple:
+        return len(self), len(self.layout)
+
+    def __contains__(self, name) -> bool:
+        return name in self.layout
+
+    def nbytes(self) -> int:
+        """Memoria propia: hechos + posiciones (las dimensiones son las tablas de la sesión)."""
+        return memory_bytes(self.fact) + sum(int(p.nbytes) for p in self.positions.values())
+
+    # ------------------------- acceso -------------------------
+    def _column(self, name: str) -> pd.Series:
+        source, col = self.layout[name]
+        if source == "fact":
+            return self.fact[col].rename(name)
+        values = _take(self.dims[source][col], self.positions[source], self._missing[source])
+        return pd.Series(values, index=self.fact.index, name=name, copy=False)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._column(key)
+        return self.to_frame(list(key))
+
+    def to_frame(self, columns=None) -> pd.DataFrame:
+        """Integrado ancho (o sólo `columns`) materializado."""
+        columns = list(self.layout) if columns is None else list(columns)
+        return pd.DataFrame({c: self._column(c) for c in columns}, index=self.fact.index, copy=False)
+
+    def take(self, pos) -> "CompactTable":
+        """Las líneas `pos` (posiciones), sin resolver ninguna dimensión."""
+        pos = np.asarray(pos)
+        return CompactTable(self.fact.take(pos), self.dims,
+                            {name: p[pos] for name, p in self.positions.items()}, self.layout)
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        return self.take(np.arange(min(n, len(self)))).to_frame()
+
+    # ------------------------- construcción -------------------------
+    def join(self, name: str, dim: pd.DataFrame, left_key: str, right_key: str,
+             suffixes=("_x", "_y")) -> "CompactTable":
+        """Como `joins.gather_join`, pero guarda las posiciones en lugar de copiar las columnas de `dim`."""
+        pos = lookup_positions(self._column(left_key), dim[right_key]).astype(_positions_dtype(len(dim)))
+        left, right = join_names(self.layout, dim.columns, left_key, right_key, suffixes)
+        layout = {left[out]: src for out, src in self.layout.items()}
+        layout.update({out: (name, col) for out, col in right})
+        return CompactTable(self.fact, {**self.dims, name: dim}, {**self.positions, name: pos}, layout)
+
+    def with_columns(self, frame: pd.DataFrame) -> "CompactTable":
+        """Agrega a los hechos columnas calculadas por línea (p.ej. las derivadas del Paso 8)."""
+        extra = compact_frame(frame.reset_index(drop=True))
+        fact = pd.concat([self.fact, extra], axis=1)
+        return CompactTable(fact, self.dims, self.positions,
+                            {**self.layout, **{c: ("fact", c) for c in extra.columns}})
+
+def integrate_compact(tables: dict, keys: dict) -> CompactTable:
+    """Paso 7 en forma compacta: los mismos joins que `joins.integrate_gather`, sin materializarlos."""
+    table = CompactTable(tables["detalle"])
+    table = table.join("productos", tables["productos"], keys["det_prod_key"], keys["prod_key"], ("", "_prod"))
+    table = table.join("ventas", tables["ventas"], keys["det_venta_key"], keys["venta_key"])
+    clientes = client_dimension(tables["clientes"], keys)
+    if clientes is not None and keys["cli_key_det"] in table:
+        table = table.join("clientes", clientes, keys["cli_key_det"], keys["cli_key_cli"], ("", "_cli"))
+    return table
+
+def compact_integrated(tables: dict, keys: dict, integrado: pd.DataFrame):
+    """(tablas compactadas, integrado compacto) a partir del resultado de `pipeline.clean_data`.
+
+    Si alguna dimensión repite claves (el integrado salió del merge y puede tener más
+    filas que el detalle) el integrado se conserva ancho, sólo con `compact_frame`.
+    """
+    tables = {name: compact_frame(t) for name, t in tables.items()}
+    if integrado is None:
+        return tables, None
+    cli_key = keys.get("cli_key_cli")
+    cli_pair = [(tables["clientes"], cli_key)] if cli_key and cli_key in tables["clientes"].columns else []
+    if len(integrado) != len(tables["detalle"]) or not dims_are_unique(
+            (tables["productos"], keys["prod_key"]), (tables["ventas"], keys["venta_key"]), *cli_pair):
+        return tables, compact_frame(integrado)
+    table = integrate_compact(tables, keys)
+    table = table.with_columns(integrado[[c for c in integrado.columns if c not in table]])
+    if list(table.columns) != list(integrado.columns):
+        return tables, compact_frame(integrado)
+    tables["detalle"] = table.fact[list(tables["detalle"].columns)]  # vista de los hechos (copy-on-write)
+    return tables, table
+
+def compact_cleaned(cleaned: dict, track_memory: bool = False) -> dict:
+    """Resultado de la limpieza con tablas e integrado compactos (para guardar en la sesión).
+
+    Agrega al `report` el paso "compact" con la memoria de las tablas antes y después.
+    """
+    tables = {name: cleaned[name] for name in SESSION_TABLES if cleaned.get(name) is not None}
+    integrado = cleaned.get("integrado")
+    before = sum(memory_bytes(t) for t in tables.values()) + memory_bytes(integrado)
+    report = list(cleaned.get("report", []))
+    with measure(report, "compact", track_memory, rows_in=len(integrado) if integrado is not None else None) as info:
+        tables, integrado = compact_integrated(tables, cleaned.get("keys") or {}, integrado)
+        shared_detalle = isinstance(integrado, CompactTable)
+        after = sum(memory_bytes(t) for n, t in tables.items() if not (shared_detalle and n == "detalle"))
+        after += memory_bytes(integrado)
+        info.update({"rows_out": len(integrado) if integrado is not None else None,
+                     "session_mb_before": round(before / 1024 ** 2, 2),
+                     "session_mb_after": round(after / 1024 ** 2, 2)})
+    return {**cleaned, **tables, "integrado": integrado, "report": report}
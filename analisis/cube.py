@@ -0,0 +1,381 @@
+"""Cubo de agregados precalculados para los gráficos y tablas del Paso 3.
+
+El cubo se construye una sola vez por dataset limpio (en memoria o por bloques) y
+se persiste en Parquet junto a `data_limpios` (subcarpeta `cubo/`). Contiene:
+
+- `cells`: por celda categoria × mes × medio_pago × ciudad, conteo, suma, suma de
+  cuadrados, mínimo y máximo de cada medida de línea.
+- `buckets`: conteos por bucket logarítmico (ver `sketches.bucket_index`) de las
+  medidas con cuantiles, por celda; de ahí salen medianas, cuartiles e histogramas.
+- `tickets` / `ticket_buckets`: lo mismo para el total por ticket, por mes ×
+  medio_pago × ciudad (la categoría es un atributo de línea, no del ticket: un filtro
+  por categoría no cambia los tickets, ver `ticket_filters`).
+- `sample`: muestra uniforme acotada de líneas (dispersión y outliers del boxplot).
+
+Los gráficos leen sólo estas tablas chicas, así que su costo no depende del número
+de filas del detalle.
+"""
+import json
+import math
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .sketches import Reservoir, bucket_index, bucket_values, box_stats, gamma_for, quantiles_from_buckets
+
+CUBE_DIRNAME = "cubo"
+LINE_MEASURES = ("cantidad", "precio_unitario", "importe", "subtotal_calc", "desvio_importe")
+QUANTILE_MEASURES = ("cantidad", "precio_unitario", "importe")
+TICKET_DIMS = ("mes", "medio_pago", "ciudad")
+CITY_COLS = ("ciudad", "localidad", "provincia")
+DEFAULT_REL_ACC = 0.01
+_TABLES = ("cells", "buckets", "tickets", "ticket_buckets", "sample")
+
+def cube_dims(columns, cat_col=None) -> list:
+    """Dimensiones presentes: categoría, mes, medio de pago y la primera columna de ciudad."""
+    cols = list(columns)
+    city = next((c for c in CITY_COLS if c in cols), None)
+    return [d for d in (cat_col, "mes", "medio_pago", city) if d and d in cols]
+
+def ticket_filters(filters: dict, ticket_dims) -> dict:
+    """Los filtros que se aplican a los tickets: los de línea (p.ej. categoría) no los parten.
+
+    Todos los caminos de `filters.filtered_cube` usan esta regla: el histograma del
+    total por ticket muestra los tickets completos de la selección por fecha, medio de
+    pago y ciudad, aunque se filtre por categoría.
+    """
+    return {d: v for d, v in filters.items() if d in ticket_dims}
+
+def _stats_frame(frame: pd.DataFrame, dims: list, measures: list) -> pd.DataFrame:
+    """count/sum/sumsq/min/max por celda (un groupby por bloque)."""
+    spec = {"n": (measures[0] if measures else dims[0], "size")}
+    work = {d: frame[d] for d in dims}
+    for m in measures:
+        v = pd.to_numeric(frame[m], errors="coerce").astype("float64")
+        work[m], work[f"{m}__sq"] = v, v * v
+        spec.update({
+            f"{m}_n": (m, "count"), f"{m}_sum": (m, "sum"), f"{m}_sumsq": (f"{m}__sq", "sum"),
+            f"{m}_min": (m, "min"), f"{m}_max": (m, "max"),
+        })
+    work = pd.DataFrame(work)
+    if not dims:
+        work["_all"] = 0
+        dims = ["_all"]
+    out = work.groupby(dims, dropna=False, observed=True, sort=False).agg(**spec).reset_index()
+    return out.drop(columns=["_all"], errors="ignore")
+
+def _bucket_frame(frame: pd.DataFrame, dims: list, measures: list, gamma: float) -> pd.DataFrame:
+    parts = []
+    for m in measures:
+        v = pd.to_numeric(frame[m], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        ok = np.isfinite(v)
+        if not ok.any():
+            continue
+        sign, idx = bucket_index(v[ok], gamma)
+        part = {d: frame[d].to_numpy()[ok] for d in dims}
+        part.update({"measure": m, "sign": sign, "bucket": idx})
+        parts.append(pd.DataFrame(part))
+    if not parts:
+        return pd.DataFrame(columns=list(dims) + ["measure", "sign", "bucket", "count"])
+    work = pd.concat(parts, ignore_index=True)
+    return work.groupby(list(dims) + ["measure", "sign", "bucket"], dropna=False, sort=False).size() \
+        .rename("count").reset_index()
+
+def _combine_stats(frames: list, dims: list) -> pd.DataFrame:
+    df = pd.concat(frames, ignore_index=True)
+    if len(frames) == 1 or df.empty:
+        return df
+    how = {c: ("min" if c.endswith("_min") else "max" if c.endswith("_max") else "sum")
+           for c in df.columns if c not in dims}
+    if not dims:
+        return df.agg(how).to_frame().T
+    return df.groupby(dims, dropna=False, sort=False).agg(how).reset_index()
+
+def _combine_counts(frames: list, keys: list) -> pd.DataFrame:
+    df = pd.concat(frames, ignore_index=True)
+    if len(frames) == 1 or df.empty:
+        return df
+    return df.groupby(keys, dropna=False, sort=False)["count"].sum().reset_index()
+
+def _negate(frame: pd.DataFrame) -> pd.DataFrame:
+    """Conteos y sumas con signo opuesto (para restar en `_combine_*`); mín/máx sin cambios."""
+    frame = frame.copy()
+    for c in frame.columns:
+        if c in ("n", "count") or c.endswith(("_n", "_sum", "_sumsq")):
+            frame[c] = -frame[c]
+    return frame
+
+def _drop_empty(frame: pd.DataFrame) -> pd.DataFrame:
+    col = "n" if "n" in frame.columns else "count" if "count" in frame.columns else None
+    return frame[frame[col] > 0].reset_index(drop=True) if col and not frame.empty else frame
+
+class CubeBuilder:
+    """Construye el cubo a partir de uno o varios bloques del integrado."""
+
+    def __init__(self, dims: list, measures=LINE_MEASURES, quantile_measures=QUANTILE_MEASURES,
+                 ticket_dims=TICKET_DIMS, rel_acc: float = DEFAULT_REL_ACC, sample_size: int = 20_000,
+                 compact_every: int = 8, seed: int = 0):
+        self.dims = list(dims)
+        self.measures = list(measures)
+        self.quantile_measures = list(quantile_measures)
+        self.ticket_dims = [d for d in ticket_dims if d in self.dims]
+        self.rel_acc = rel_acc
+        self.gamma = gamma_for(rel_acc)
+        self.compact_every = compact_every
+        self.rows = 0
+        self.sample_size = sample_size
+        self._cells, self._buckets = [], []
+        self._sample = Reservoir(sample_size, seed=seed)
+        self._tickets = None
+
+    def update(self, df: pd.DataFrame) -> "CubeBuilder":
+        measures = [m for m in self.measures if m in df.columns]
+        qmeasures = [m for m in self.quantile_measures if m in df.columns]
+        self.rows += len(df)
+        self._cells.append(_stats_frame(df, self.dims, measures))
+        self._buckets.append(_bucket_frame(df, self.dims, qmeasures, self.gamma))
+        self._sample.update(df[self.dims + [m for m in QUANTILE_MEASURES if m in df.columns]])
+        if len(self._cells) >= self.compact_every:
+            self._cells = [_combine_stats(self._cells, self.dims)]
+            self._buckets = [_combine_counts(self._buckets, self.dims + ["measure", "sign", "bucket"])]
+        return self
+
+    def set_tickets(self, totals: pd.Series, attrs: pd.DataFrame = None) -> "CubeBuilder":
+        """Totales por ticket (uno por ticket) y sus atributos (alineados por índice)."""
+        frame = pd.DataFrame({"total_ticket": pd.to_numeric(totals, errors="coerce").to_numpy(dtype="float64")})
+        for d in self.ticket_dims:
+            frame[d] = attrs[d].to_numpy() if attrs is not None and d in attrs.columns else None
+        frame = frame.dropna(subset=["total_ticket"])
+        self._tickets = (
+            _stats_frame(frame, self.ticket_dims, ["total_ticket"]),
+            _bucket_frame(frame, self.ticket_dims, ["total_ticket"], self.gamma),
+        )
+        return self
+
+    def build(self, meta: dict = None) -> "Cube":
+        empty = pd.DataFrame(columns=self.dims)
+        cells = _combine_stats(self._cells, self.dims) if self._cells else empty
+        buckets = _combine_counts(self._buckets, self.dims + ["measure", "sign", "bucket"]) if self._buckets else empty
+        tickets, ticket_buckets = self._tickets or (pd.DataFrame(), pd.DataFrame())
+        info = {
+            "dims": self.dims, "ticket_dims": self.ticket_dims, "rel_acc": self.rel_acc, "rows": self.rows,
+            "sample_size": self.sample_size, "created": datetime.now().isoformat(timespec="seconds"),
+        }
+        info.update(meta or {})
+        return Cube(cells, buckets, tickets, ticket_buckets, self._sample.sample, info)
+
+class Cube:
+    """Agregados listos para graficar; `filter` devuelve un sub-cubo sin tocar el detalle."""
+
+    def __init__(self, cells, buckets, tickets, ticket_buckets, sample, meta: dict):
+        self.cells = cells
+        self.buckets = buckets
+        self.tickets = tickets
+        self.ticket_buckets = ticket_buckets
+        self.sample = sample
+        self.meta = meta
+        self.gamma = gamma_for(meta["rel_acc"])
+
+    @property
+    def dims(self) -> list:
+        return self.meta["dims"]
+
+    @property
+    def cat_col(self):
+        return self.meta.get("cat_col")
+
+    # ------------------------- filtros -------------------------
+    @staticmethod
+    def _mask(df: pd.DataFrame, filters: dict) -> pd.Series:
+        mask = pd.Series(True, index=df.index)
+        for dim, values in filters.items():
+            if values is None:
+                continue
+            if dim not in df.columns:
+                continue  # p.ej. la categoría no existe a nivel ticket
+            mask &= df[dim].isin(list(values))
+        return mask
+
+    def filter(self, **filters) -> "Cube":
+        """Sub-cubo con `dim=[valores]` (None = sin filtro)."""
+        filters = {d: v for d, v in filters.items() if v is not None}
+        if not filters:
+            return self
+        sample = self.sample[self._mask(self.sample, filters)] if not self.sample.empty else self.sample
+        tickets, ticket_buckets = self.tickets, self.ticket_buckets
+        by_ticket = ticket_filters(filters, self.meta["ticket_dims"])
+        if not tickets.empty:
+            tickets = tickets[self._mask(tickets, by_ticket)]
+            ticket_buckets = ticket_buckets[self._mask(ticket_buckets, by_ticket)]
+        return Cube(self.cells[self._mask(self.cells, filters)], self.buckets[self._mask(self.buckets, filters)],
+                    tickets, ticket_buckets, sample, self.meta)
+
+    def values(self, dim: str) -> list:
+        """Valores distintos de una dimensión (para armar filtros)."""
+        if dim not in self.cells.columns:
+            return []
+        return sorted(self.cells[dim].dropna().astype(str).unique())
+
+    # ------------------------- lecturas -------------------------
+    @property
+    def rows(self) -> int:
+        return int(self.cells["n"].sum()) if "n" in self.cells.columns else 0
+
+    def has_measure(self, measure: str) -> bool:
+        return f"{measure}_n" in self.cells.columns
+
+    def count(self, measure: str) -> int:
+        """Cantidad de valores no nulos de `measure`."""
+        return int(self.cells[f"{measure}_n"].sum()) if self.has_measure(measure) else 0
+
+    def total(self, measure: str = "importe") -> float:
+        col = f"{measure}_sum"
+        return float(self.cells[col].sum()) if col in self.cells.columns else math.nan
+
+    def revenue_by(self, dim: str, measure: str = "importe") -> pd.Series:
+        """Suma de `measure` por valor de `dim`, de mayor a menor."""
+        col = f"{measure}_sum"
+        if dim not in self.cells.columns or col not in self.cells.columns:
+            return pd.Series(dtype="float64", name=measure)
+        cells = self.cells[self.cells[f"{measure}_n"] > 0]
+        return cells.groupby(dim, dropna=True)[col].sum().sort_values(ascending=False).rename(measure)
+
+    def _summary(self, cells, buckets, measure: str, qs) -> dict:
+        n = float(cells[f"{measure}_n"].sum()) if f"{measure}_n" in cells.columns else 0.0
+        if n == 0:
+            return {"count": 0.0, "mean": math.nan, "std": math.nan, "min": math.nan, "max": math.nan,
+                    "quantiles": [math.nan for _ in qs]}
+        s, ss = cells[f"{measure}_sum"].sum(), cells[f"{measure}_sumsq"].sum()
+        var = max(ss - s * s / n, 0.0) / (n - 1) if n > 1 else math.nan
+        vmin, vmax = float(cells[f"{measure}_min"].min()), float(cells[f"{measure}_max"].max())
+        b = buckets[buckets["measure"] == measure] if "measure" in buckets.columns else buckets
+        if not b.empty:
+            b = b.groupby(["sign", "bucket"])["count"].sum().reset_index()
+        qv = quantiles_from_buckets(b["sign"], b["bucket"], b["count"], qs, self.gamma, vmin, vmax) \
+            if not b.empty else [math.nan for _ in qs]
+        return {"count": n, "mean": s / n, "std": math.sqrt(var) if var == var else math.nan,
+                "min": vmin, "max": vmax, "quantiles": qv}
+
+    def describe(self, measures=QUANTILE_MEASURES) -> pd.DataFrame:
+        """Equivalente (aproximado en cuartiles) a `df[measures].describe().T`."""
+        rows = {}
+        for m in measures:
+            if f"{m}_n" not in self.cells.columns:
+                continue
+            sm = self._summary(self.cells, self.buckets, m, (0.25, 0.5, 0.75))
+            rows[m] = {"count": sm["count"], "mean": sm["mean"], "std": sm["std"], "min": sm["min"],
+                       "25%": sm["quantiles"][0], "50%": sm["quantiles"][1], "75%": sm["quantiles"][2],
+                       "max": sm["max"]}
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+    def box_stats(self, dim: str, measure: str = "importe", whis: float = 1.5) -> list:
+        """Un dict por valor de `dim` para `Axes.bxp` (cuartiles del cubo + outliers de la muestra)."""
+        if dim not in self.cells.columns or f"{measure}_n" not in self.cells.columns:
+            return []
+        out = []
+        cells = self.cells[self.cells[f"{measure}_n"] > 0]
+        for value in cells[dim].dropna().unique():
+            sm = self._summary(cells[cells[dim] == value], self.buckets[self.buckets[dim] == value],
+                               measure, (0.25, 0.5, 0.75))
+            sample = None
+            if not self.sample.empty and measure in self.sample.columns:
+                sample = self.sample.loc[self.sample[dim] == value, measure].dropna()
+            out.append(box_stats(str(value), sm["quantiles"], sm["min"], sm["max"], sm["mean"],
+                                 int(sm["count"]), sample=sample, whis=whis))
+        return out
+
+    def ticket_summary(self) -> dict:
+        if self.tickets.empty:
+            return {"count": 0.0}
+        return self._summary(self.tickets, self.ticket_buckets, "total_ticket", (0.25, 0.5, 0.75))
+
+    def ticket_histogram(self, bins: int = 20):
+        """(conteos, bordes) del total por ticket, reconstruidos desde los buckets."""
+        if self.ticket_buckets.empty:
+            return np.zeros(0), np.zeros(0)
+        b = self.ticket_buckets.groupby(["sign", "bucket"])["count"].sum().reset_index()
+        values = bucket_values(b["sign"].to_numpy(), b["bucket"].to_numpy(), self.gamma)
+        lo, hi = float(self.tickets["total_ticket_min"].min()), float(self.tickets["total_ticket_max"].max())
+        values = np.clip(values, lo, hi)
+        return np.histogram(values, bins=bins, range=(lo, hi) if hi > lo else None, weights=b["count"].to_numpy())
+
+    # ------------------------- actualización -------------------------
+    def merge(self, other: "Cube", seed: int = 0, retract: bool = False) -> "Cube":
+        """Cubo con los agregados de ambos (p.ej. el histórico + el lote nuevo), sin releer el detalle.
+
+        Las celdas y los buckets se suman; la muestra se rearma tomando de cada cubo
+        una parte proporcional a las filas que resume. Con `retract` los conteos y sumas
+        de `other` se restan (valores que se reemplazan, p.ej. el total previo de un
+        ticket que recibió líneas nuevas); mínimos y máximos quedan como cotas.
+        """
+        if other.dims != self.dims or other.meta["rel_acc"] != self.meta["rel_acc"]:
+            raise ValueError("No se pueden fusionar cubos con distintas dimensiones o precisión")
+        ticket_dims = self.meta["ticket_dims"]
+        if retract:
+            other = Cube(*(_negate(t) for t in (other.cells, other.buckets, other.tickets, other.ticket_buckets)),
+                         other.sample.iloc[:0], {**other.meta, "rows": 0})
+
+        def parts(a, b):
+            return [t for t in (a, b) if not t.empty]
+
+        cells = _combine_stats(parts(self.cells, other.cells), self.dims) if parts(self.cells, other.cells) \
+            else self.cells
+        buckets = _combine_counts(parts(self.buckets, other.buckets), self.dims + ["measure", "sign", "bucket"]) \
+            if parts(self.buckets, other.buckets) else self.buckets
+        tickets = _combine_stats(parts(self.tickets, other.tickets), ticket_dims) \
+            if parts(self.tickets, other.tickets) else self.tickets
+        ticket_buckets = _combine_counts(parts(self.ticket_buckets, other.ticket_buckets),
+                                         ticket_dims + ["measure", "sign", "bucket"]) \
+            if parts(self.ticket_buckets, other.ticket_buckets) else self.ticket_buckets
+
+        rows_a, rows_b = self.meta["rows"], other.meta["rows"]
+        size = max(self.meta.get("sample_size", 0), len(self.sample), len(other.sample))
+        rng = np.random.default_rng(seed)
+        take_a = min(len(self.sample), round(size * rows_a / max(rows_a + rows_b, 1)))
+        take_b = min(len(other.sample), size - take_a)
+        picks = [s.iloc[np.sort(rng.choice(len(s), k, replace=False))] for s, k in
+                 ((self.sample, take_a), (other.sample, take_b)) if k > 0]
+        sample = pd.concat(picks, ignore_index=True) if picks else self.sample
+
+        if retract:
+            cells, buckets, tickets, ticket_buckets = (_drop_empty(t) for t in (cells, buckets, tickets, ticket_buckets))
+        meta = {**self.meta, "rows": rows_a + rows_b, "created": datetime.now().isoformat(timespec="seconds")}
+        return Cube(cells, buckets, tickets, ticket_buckets, sample, meta)
+
+    # ------------------------- persistencia -------------------------
+    def save(self, output_dir: str) -> str:
+        """Escribe el cubo en `output_dir/cubo/` (Parquet + meta.json). Devuelve la carpeta."""
+        path = os.path.join(output_dir, CUBE_DIRNAME)
+        os.makedirs(path, exist_ok=True)
+        for name in _TABLES:
+            table = getattr(self, name)
+            table = table.astype({c: "string" for c in table.columns if table[c].dtype == object})
+            table.to_parquet(os.path.join(path, f"{name}.parquet"), index=False)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as fh:
+            json.dump(self.meta, fh, ensure_ascii=False, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, output_dir: str) -> "Cube":
+        path = os.path.join(output_dir, CUBE_DIRNAME)
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        tables = [pd.read_parquet(os.path.join(path, f"{name}.parquet")) for name in _TABLES]
+        return cls(*tables, meta)
+
+def build_cube(df: pd.DataFrame, cat_col, keys: dict, ventas: pd.DataFrame = None, total_col=None,
+               **builder_opts) -> Cube:
+    """Cubo de un integrado en memoria (los totales por ticket siguen la lógica del Paso 3)."""
+    builder = CubeBuilder(cube_dims(df.columns, cat_col), **builder_opts)
+    builder.update(df)
+    det_key = keys["det_venta_key"]
+    attrs = df.groupby(det_key, sort=False)[builder.ticket_dims].first() if builder.ticket_dims else None
+    if total_col and ventas is not None and total_col in ventas.columns:
+        totals = pd.Series(ventas[total_col].to_numpy(), index=ventas[keys["venta_key"]].to_numpy())
+    else:
+        base_col = "importe" if "importe" in df.columns else ("subtotal_calc" if "subtotal_calc" in df.columns else None)
+        totals = df.groupby(det_key, sort=False)[base_col].sum() if base_col else pd.Series(dtype="float64")
+    builder.set_tickets(totals, attrs.reindex(totals.index) if attrs is not None else None)
+    return builder.build({"cat_col": cat_col, "total_col": total_col})
@@ -0,0 +1,186 @@
+"""Decodificación vectorizada de fechas y dimensión calendario.
+
+Las exportaciones de planilla traen fechas en formatos distintos según la tabla:
+seriales de Excel (``45462`` = 2024-06-19), ISO (``2024-06-19``), locales
+(``19/06/2024``) o enteros ``20240619``. `detect_date_format` decide el formato de
+una columna mirando una muestra y `decode_dates` la convierte completa:
+
+- números: aritmética sobre el arreglo (días desde 1899-12-30 → datetime64[ns]);
+- texto: se decodifican sólo los valores distintos (`pd.factorize`) con un formato
+  fijo y se expanden con los códigos, sin parsear fila por fila.
+
+`calendar()` es una dimensión precalculada (1900–2199) con un registro por día y
+columnas enteras: año, mes, mes absoluto (`mes_id`), semana ISO y día de la
+semana. Las columnas derivadas de una fecha se obtienen con un `take` sobre el
+número de día, de modo que agrupar por tiempo es agrupar por enteros.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+SERIAL, YYYYMMDD, UNIX, ISO, DMY, MDY, MIXED = "serial", "yyyymmdd", "unix", "iso", "dmy", "mdy", "mixed"
+EXCEL_EPOCH = np.datetime64("1899-12-30", "ns")  # día 0 de Excel (con el bug de 1900 incluido)
+SERIAL_RANGE = (1, 2958466)                      # 1899-12-31 … 9999-12-31
+SAMPLE_SIZE = 1000
+NS_PER_DAY = 86_400 * 10 ** 9
+NA_LABEL = "NaT"                                 # etiqueta de `mes` sin fecha (como to_period(...).astype(str))
+
+CALENDAR_START, CALENDAR_END = "1900-01-01", "2199-12-31"
+_DAY0 = np.datetime64(CALENDAR_START, "D").astype("int64")
+
+_ISO = re.compile(r"^\d{4}-\d{1,2}-\d{1,2}([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?$")
+_LOCAL = re.compile(r"^(\d{1,2})[/.-](\d{1,2})[/.-](\d{2}|\d{4})( \d{1,2}:\d{2}(:\d{2})?)?$")
+_LOCAL_FORMATS = ("{d}/{m}/%Y", "{d}/{m}/%Y %H:%M", "{d}/{m}/%Y %H:%M:%S", "{d}/{m}/%y")
+
+# ========================= DETECCIÓN =========================
+def _numeric_format(values: np.ndarray):
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return None
+    lo, hi = values.min(), values.max()
+    if SERIAL_RANGE[0] <= lo and hi < SERIAL_RANGE[1]:
+        return SERIAL
+    if 1e7 <= lo and hi < 1e8 and np.array_equal(values, np.round(values)):
+        return YYYYMMDD
+    if 1e8 <= lo and hi < 1e10:
+        return UNIX
+    return None
+
+def detect_date_format(s: pd.Series, sample_size: int = SAMPLE_SIZE):
+    """Formato de la columna (SERIAL, YYYYMMDD, UNIX, ISO, DMY, MDY o MIXED) según una muestra.
+
+    Devuelve None si la columna ya es datetime o está vacía.
+    """
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return None
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return _numeric_format(s.to_numpy(dtype="float64", na_value=np.nan))
+    sample = pd.Series(s.dropna().unique()[:sample_size]).astype(str).str.strip()
+    sample = sample[sample != ""]
+    if sample.empty:
+        return None
+    num = pd.to_numeric(sample, errors="coerce")
+    if num.notna().all():
+        return _numeric_format(num.to_numpy(dtype="float64"))
+    if sample.str.match(_ISO).mean() >= 0.9:
+        return ISO
+    parts = sample.str.extract(_LOCAL)
+    if parts[0].notna().mean() >= 0.9:
+        first, second = parts[0].dropna().astype(int), parts[1].dropna().astype(int)
+        if (second > 12).any() and not (first > 12).any():
+            return MDY
+        return DMY  # por defecto día/mes (configuración regional de los datos)
+    return MIXED
+
+# ========================= DECODIFICACIÓN =========================
+def _from_numeric(values: np.ndarray, fmt: str) -> np.ndarray:
+    out = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[ns]")
+    ok = np.isfinite(values)
+    if fmt == SERIAL:
+        ok &= (values >= SERIAL_RANGE[0]) & (values < SERIAL_RANGE[1])
+        out[ok] = EXCEL_EPOCH + np.round(values[ok] * NS_PER_DAY).astype("int64").astype("timedelta64[ns]")
+    elif fmt == UNIX:
+        out[ok] = (values[ok] * 10 ** 9).astype("int64").astype("datetime64[ns]")
+    elif fmt == YYYYMMDD:
+        v = values[ok].astype("int64")
+        y, m, d = v // 10000, v // 100 % 100, v % 100
+        valid = (m >= 1) & (m <= 12) & (d >= 1) & (d <= 31)
+        months = ((y - 1970) * 12 + m - 1).astype("datetime64[M]")
+        days = months.astype("datetime64[D]") + (d - 1).astype("timedelta64[D]")
+        valid &= days.astype("datetime64[M]") == months  # 31/02 → NaT
+        idx = np.flatnonzero(ok)
+        out[idx[valid]] = days[valid].astype("datetime64[ns]")
+    return out
+
+def _from_text(uniques: pd.Series, fmt: str) -> pd.Series:
+    """Decodifica los valores distintos (ya recortados) con el formato detectado."""
+    if fmt == ISO:
+        return pd.to_datetime(uniques, format="ISO8601", errors="coerce")
+    if fmt in (DMY, MDY):
+        d, m = ("%d", "%m") if fmt == DMY else ("%m", "%d")
+        text = uniques.str.replace(r"[.-]", "/", regex=True)
+        out = pd.Series(pd.NaT, index=uniques.index, dtype="datetime64[ns]")
+        for pattern in _LOCAL_FORMATS:
+            todo = out.isna() & text.notna()
+            if not todo.any():
+                break
+            out[todo] = pd.to_datetime(text[todo], format=pattern.format(d=d, m=m), errors="coerce")
+        return out
+    return pd.to_datetime(uniques, errors="coerce", format="mixed", dayfirst=True)
+
+def decode_dates(s: pd.Series, fmt: str = None) -> pd.Series:
+    """Columna datetime64[ns] decodificada con `fmt` (o el detectado por `detect_date_format`)."""
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return s.astype("datetime64[ns]")
+    fmt = fmt or detect_date_format(s)
+    if fmt is None:
+        return pd.Series(pd.NaT, index=s.index, dtype="datetime64[ns]", name=s.name)
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        values = s.to_numpy(dtype="float64", na_value=np.nan)
+        return pd.Series(_from_numeric(values, fmt), index=s.index, name=s.name)
+    # texto: se decodifica cada valor distinto una sola vez y se expande con los códigos
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    uniques = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    if fmt in (SERIAL, YYYYMMDD, UNIX):
+        decoded = _from_numeric(pd.to_numeric(uniques, errors="coerce").to_numpy(dtype="float64"), fmt)
+    else:
+        decoded = _from_text(uniques, fmt).to_numpy(dtype="datetime64[ns]")
+    decoded = np.append(decoded, np.datetime64("NaT", "ns"))  # el código -1 (nulo) apunta al final
+    return pd.Series(decoded[codes], index=s.index, name=s.name)
+
+# ========================= CALENDARIO =========================
+@lru_cache(maxsize=1)
+def calendar() -> pd.DataFrame:
+    """Un registro por día de 1900 a 2199 con atributos enteros (índice = nº de día)."""
+    days = pd.date_range(CALENDAR_START, CALENDAR_END, freq="D")
+    iso = days.isocalendar()
+    cal = pd.DataFrame({
+        "fecha": days,
+        "anio": days.year.astype("int16"),
+        "mes_num": days.month.astype("int8"),
+        "mes_id": ((days.year - 1970) * 12 + days.month - 1).astype("int32"),  # meses desde 1970-01
+        "semana": iso["week"].to_numpy().astype("int8"),
+        "dia_semana": days.dayofweek.astype("int8"),  # 0 = lunes
+    })
+    return cal
+
+@lru_cache(maxsize=1)
+def month_labels() -> np.ndarray:
+    """Etiqueta 'AAAA-MM' de cada `mes_id` del calendario (una por mes, no por fila)."""
+    months = pd.period_range(CALENDAR_START, CALENDAR_END, freq="M")
+    return np.asarray(months.strftime("%Y-%m"), dtype=object)
+
+def day_keys(fechas: pd.Series) -> np.ndarray:
+    """Posición de cada fecha en `calendar()` (-1 si es nula o está fuera de rango)."""
+    days = pd.to_datetime(fechas, errors="coerce").to_numpy(dtype="datetime64[D]")
+    keys = days.astype("int64") - _DAY0
+    keys[np.isnat(days) | (keys < 0) | (keys >= len(calendar()))] = -1
+    return keys
+
+def calendar_parts(fechas: pd.Series, columns=("anio", "mes_num", "mes_id", "semana", "dia_semana")) -> pd.DataFrame:
+    """Atributos del calendario para cada fecha (join por nº de día; enteros nulos como <NA>)."""
+    keys = day_keys(fechas)
+    missing = keys < 0
+    cal = calendar()
+    out = {}
+    for col in columns:
+        values = cal[col].to_numpy()[np.maximum(keys, 0)]
+        out[col] = pd.array(values, dtype=f"{values.dtype.name.capitalize()}") if missing.any() else values
+        if missing.any():
+            out[col][missing] = pd.NA
+    return pd.DataFrame(out, index=fechas.index)
+
+@lru_cache(maxsize=1)
+def _month_label_array():
+    return pd.array(np.append(month_labels(), NA_LABEL), dtype="str")
+
+def month_label(mes_id) -> pd.Series:
+    """'AAAA-MM' a partir de `mes_id` (NA_LABEL para nulos), tomando las etiquetas ya calculadas."""
+    mes_id = pd.Series(mes_id)
+    labels = _month_label_array()
+    offset = pd.Period("1970-01", freq="M").ordinal - pd.Period(CALENDAR_START, freq="M").ordinal
+    pos = mes_id.to_numpy(dtype="float64", na_value=np.nan)
+    idx = np.where(np.isnan(pos), len(labels) - 1, np.nan_to_num(pos) + offset).astype("int64")
+    return pd.Series(labels.take(idx), index=mes_id.index)
@@ -0,0 +1,267 @@
+"""Diagnóstico de las tablas crudas (Paso 1) en una sola pasada, con sketches.
+
+Por cada columna: tipo, nulos, valores distintos (`sketches.HyperLogLog`), mínimo,
+máximo y valores más frecuentes (`sketches.TopK`); por tabla, filas y filas repetidas
+exactas (`sketches.HashSample` sobre un hash por fila). Cada columna de un bloque se
+factoriza una vez y el resto (hash, conteos, mín/máx) se calcula sobre sus valores
+distintos; los hashes de las columnas se combinan en el de la fila, así que no hay
+un `duplicated()` aparte que vuelva a hashear todo.
+
+Cada bloque de `pd.read_csv` infiere sus tipos por separado: el mismo valor llega
+como 5 (int64), 5.0 (float64, si el bloque tiene un nulo) o "5" (texto, si el bloque
+tiene un encabezado repetido). Por eso todo se calcula sobre una forma canónica de
+cada valor (`_canonical`: entero, decimal o texto) y el tipo de la columna es el que
+pandas elegiría para el archivo entero; así el perfil por bloques coincide con el de
+la tabla completa.
+
+`ProfileBuilder` se alimenta por bloques (`profile_csv` lee el CSV con `chunksize`,
+sin cargarlo entero) y los perfiles de bloques o procesos distintos se fusionan con
+`merge`. Con pocos distintos (o pocas filas) los conteos son exactos; si no, son
+estimaciones y el perfil lo indica. `profile_file` guarda el perfil como JSON en
+`cache_dir`, por huella del archivo (ruta, mtime y tamaño): un rerun con los mismos
+CSV lo lee en lugar de recalcularlo.
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .readers import _drop_unnamed, sniff_csv
+from .sketches import HashSample, HyperLogLog, TopK
+
+PROFILE_VERSION = 2
+TOP_K = 5
+DEFAULT_CHUNKSIZE = 1_000_000
+_ROW_MIX = np.uint64(0x100000001B3)  # primo FNV-1a de 64 bits
+_NULL_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+def _plain(value):
+    """Escalar apto para JSON (numpy → Python, fechas → texto)."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return str(pd.Timestamp(value))
+    return value.item() if isinstance(value, np.generic) else value
+
+def _extreme(a, b, pick):
+    """min/max de dos valores que pueden ser None."""
+    if a is None or b is None:
+        return b if a is None else a
+    return pick(a, b)
+
+def _canonical(uniques: pd.Index):
+    """(valores, hashes, es_número) de los valores distintos de un bloque, sin depender de su dtype.
+
+    Los números y los textos que son números quedan como int (si son enteros) o float;
+    el resto (fechas, booleanos, texto) como texto.
+    """
+    kind = uniques.dtype.kind
+    values = np.asarray(uniques, dtype=object)
+    if kind in "iuf":
+        num = uniques.to_numpy(dtype="float64")
+    elif kind in "bmM":
+        num = np.full(len(uniques), np.nan)
+    else:
+        num = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    is_num = ~np.isnan(num)
+    whole = is_num & (np.abs(num) < 2.0 ** 63) & (num == np.round(num))
+    frac, text = is_num & ~whole, ~is_num
+    ints = uniques.to_numpy()[whole].astype(np.int64) if kind in "iu" else num[whole].astype(np.int64)
+    values = values.copy()
+    values[whole] = ints.astype(object)
+    values[frac] = num[frac].astype(object)
+    values[text] = [str(v) for v in values[text]]
+    hashes = np.empty(len(uniques), dtype=np.uint64)
+    hashes[whole] = pd.util.hash_array(ints)
+    hashes[frac] = pd.util.hash_array(num[frac])
+    hashes[text] = pd.util.hash_array(values[text].astype(object))
+    return values, hashes, is_num
+
+def _merge_dtype(a: str, b: str) -> str:
+    """Tipo que pandas infiere para dos bloques de la misma columna leídos juntos."""
+    if a == b:
+        return a
+    return "float64" if _dtype_kind(a) in "iuf" and _dtype_kind(b) in "iuf" else "str"
+
+def _dtype_kind(name: str) -> str:
+    try:
+        return np.dtype(name).kind
+    except TypeError:  # dtypes de pandas (str, category, ...)
+        return "O"
+
+class _ColumnSketch:
+    """mín/máx por separado para números y textos: si la columna tiene algún número se informan los numéricos."""
+
+    def __init__(self, dtype: str, top_k: int, precision: int):
+        self.dtype = dtype
+        self.nulls = 0
+        self.extremes = {True: (None, None), False: (None, None)}  # es_número → (mín, máx)
+        self.distinct = HyperLogLog(precision)
+        self.top = TopK(top_k)
+
+    @property
+    def min(self):
+        return self.extremes[self.extremes[True][0] is not None][0]
+
+    @property
+    def max(self):
+        return self.extremes[self.extremes[True][0] is not None][1]
+
+    def _extend(self, numeric: bool, lo, hi):
+        old_lo, old_hi = self.extremes[numeric]
+        self.extremes[numeric] = (_extreme(old_lo, lo, min), _extreme(old_hi, hi, max))
+
+    def update(self, values: np.ndarray, counts: np.ndarray, hashes: np.ndarray, is_num: np.ndarray,
+               nulls: int, dtype: str):
+        """Un bloque ya factorizado: valores distintos canónicos, sus conteos y sus hashes."""
+        self.dtype = _merge_dtype(self.dtype, dtype)
+        self.nulls += nulls
+        self.distinct.update(hashes)
+        self.top.update_counts(pd.Series(counts, index=pd.Index(values, dtype=object)))
+        for numeric in (True, False):
+            part = values[is_num == numeric]
+            if len(part):
+                self._extend(numeric, min(part), max(part))
+
+    def merge(self, other: "_ColumnSketch"):
+        self.dtype = _merge_dtype(self.dtype, other.dtype)
+        self.nulls += other.nulls
+        for numeric, (lo, hi) in other.extremes.items():
+            self._extend(numeric, lo, hi)
+        self.distinct.merge(other.distinct)
+        self.top.merge(other.top)
+
+class ProfileBuilder:
+    """Perfil de una tabla alimentado por bloques (`update`) y combinable (`merge`)."""
+
+    def __init__(self, top_k: int = TOP_K, precision: int = 14):
+        self.top_k = top_k
+        self.precision = precision
+        self.rows = 0
+        self.columns = {}
+        self.row_hashes = HashSample()
+        self.seconds = 0.0
+
+    def update(self, df: pd.DataFrame) -> "ProfileBuilder":
+        """Una pasada por columna: `factorize` y después todo sobre los valores distintos del bloque."""
+        t0 = time.perf_counter()
+        self.rows += len(df)
+        row = np.zeros(len(df), dtype=np.uint64)
+        for name in df.columns:
+            s = df[name]
+            sketch = self.columns.get(name)
+            if sketch is None:
+                sketch = self.columns[name] = _ColumnSketch(str(s.dtype), self.top_k, self.precision)
+            codes, uniques = pd.factorize(s, use_na_sentinel=True)
+            values, hashes, is_num = _canonical(uniques)
+            valid = codes >= 0
+            counts = np.bincount(codes[valid], minlength=len(uniques))
+            sketch.update(values, counts, hashes, is_num, len(codes) - int(counts.sum()), str(s.dtype))
+            line = np.full(len(codes), _NULL_HASH)
+            line[valid] = hashes[codes[valid]]
+            row = (row ^ line) * _ROW_MIX  # el hash de la fila depende del orden de las columnas
+        self.row_hashes.update(row)
+        self.seconds += time.perf_counter() - t0
+        return self
+
+    def merge(self, other: "ProfileBuilder") -> "ProfileBuilder":
+        self.rows += other.rows
+        self.seconds += other.seconds
+        for name, sketch in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(sketch)
+            else:
+                self.columns[name] = sketch
+        self.row_hashes.merge(other.row_hashes)
+        return self
+
+    def build(self) -> dict:
+        """Perfil como dict (serializable a JSON)."""
+        columns = []
+        for name, sk in self.columns.items():
+            columns.append({
+                "name": str(name), "dtype": sk.dtype, "nulls": sk.nulls,
+                "distinct": sk.distinct.count(), "distinct_exact": sk.distinct.exact,
+                "min": sk.min, "max": sk.max,
+                "top": [[_plain(v), c] for v, c in sk.top.top()], "top_exact": sk.top.error == 0,
+            })
+        return {
+            "version": PROFILE_VERSION, "rows": self.rows, "columns": columns,
+            "duplicates": self.row_hashes.repeated(), "duplicates_exact": self.row_hashes.exact,
+            "seconds": round(self.seconds, 4),
+        }
+
+def profile_frame(df: pd.DataFrame, top_k: int = TOP_K) -> dict:
+    """Perfil de un DataFrame ya cargado (una pasada)."""
+    return ProfileBuilder(top_k).update(df).build()
+
+def profile_csv(path: str, chunksize: int = DEFAULT_CHUNKSIZE, top_k: int = TOP_K) -> dict:
+    """Perfil de un CSV leído por bloques de `chunksize` filas (memoria acotada por bloque)."""
+    dialect = sniff_csv(path)
+    builder = ProfileBuilder(top_k)
+    for chunk in pd.read_csv(path, sep=dialect["sep"], encoding=dialect["encoding"], chunksize=chunksize):
+        builder.update(_drop_unnamed(chunk))
+    return builder.build()
+
+# ========================= CACHÉ POR HUELLA =========================
+def profile_key(path: str, variant: str = "") -> str:
+    """Huella de `path` (ruta absoluta, mtime y tamaño) + variante del perfil."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    raw = f"{PROFILE_VERSION}|{path}|{st.st_mtime_ns}|{st.st_size}|{variant}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+def _read_json(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+def profile_file(path: str, df: pd.DataFrame = None, cache_dir: str = None,
+                 chunksize: int = DEFAULT_CHUNKSIZE, top_k: int = TOP_K) -> dict:
+    """Perfil de `path`: desde `df` si es la tabla completa ya cargada; si no, leyendo por bloques.
+
+    Con `cache_dir` el perfil se guarda y se reutiliza mientras el archivo no cambie.
+    """
+    variant = f"{'memoria' if df is not None else 'bloques'}|{top_k}"
+    entry = os.path.join(cache_dir, f"{profile_key(path, variant)}.json") if cache_dir else None
+    profile = _read_json(entry) if entry else None
+    if profile is not None:
+        return {**profile, "cached": True}
+    profile = profile_frame(df, top_k) if df is not None else profile_csv(path, chunksize, top_k)
+    if entry:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(profile, fh, ensure_ascii=False, default=str)
+        os.replace(tmp, entry)  # escritura atómica (varias sesiones)
+    return {**profile, "cached": False}
+
+def clear_profiles(cache_dir: str) -> int:
+    """Borra los perfiles guardados en `cache_dir`; devuelve cuántos había."""
+    if not os.path.isdir(cache_dir):
+        return 0
+    names = [n for n in os.listdir(cache_dir) if n.endswith(".json")]
+    for name in names:
+        os.remove(os.path.join(cache_dir, name))
+    return len(names)
+
+def profile_table(profile: dict) -> pd.DataFrame:
+    """Una fila por columna: tipo, nulos, distintos, mín/máx y más frecuentes (para mostrar)."""
+    rows = profile["rows"]
+    out = []
+    for c in profile["columns"]:
+        approx = "" if c["distinct_exact"] else "≈"
+        out.append({
+            "columna": c["name"], "tipo": c["dtype"], "nulos": c["nulls"],
+            "% nulos": round(100 * c["nulls"] / rows, 2) if rows else 0.0,
+            "distintos": f"{approx}{c['distinct']:,}",
+            "mín": None if c["min"] is None else str(c["min"]),
+            "máx": None if c["max"] is None else str(c["max"]),
+            "más frecuentes": ", ".join(f"{v} ({n:,})" for v, n in c["top"]),
+        })
+    return pd.DataFrame(out)
@@ -0,0 +1,187 @@
+"""Filtros interactivos del Paso 3 resueltos con índices sobre el integrado.
+
+`FilterIndex` se construye una vez (al terminar la limpieza) y guarda:
+
+- un índice ordenado de fechas: las posiciones de las filas ordenadas por fecha y
+  las fechas ya ordenadas (int64), de modo que un rango es un `searchsorted`;
+- por dimensión (categoría, medio de pago, ciudad), los códigos de cada fila
+  (`pd.factorize`) y una lista ordenada de posiciones por valor (índice invertido).
+
+Una combinación de filtros se resuelve arrancando por el filtro más selectivo
+(el que deja menos filas) y verificando los demás sólo sobre esas posiciones
+(`permitido[codigos[pos]]`, `lo <= fechas[pos] < hi`), sin construir máscaras
+booleanas del largo de la tabla completa.
+
+`filtered_cube` elige la vía más barata para alimentar los gráficos: si los
+filtros se pueden expresar sobre las dimensiones del cubo precalculado (meses
+completos), se filtra el cubo; si no, se arma un cubo sólo con las filas elegidas
+(con el backend DuckDB, consultando el plan perezoso con los filtros en el escaneo).
+En todas las vías los filtros de línea (categoría) no recortan los tickets del
+histograma: se siguen mostrando los tickets completos (ver `cube.ticket_filters`).
+"""
+import numpy as np
+import pandas as pd
+
+from .compact import CompactTable
+from .cube import CITY_COLS, LINE_MEASURES, Cube, build_cube, ticket_filters
+from .schema import detect_date_col
+
+def _positions_dtype(n: int):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+class FilterIndex:
+    """Índice de fechas ordenado + índice invertido por valor para filtrar `df` por posiciones."""
+
+    def __init__(self, df: pd.DataFrame, date_col=None, dims=()):
+        self.n = len(df)
+        pos_dtype = _positions_dtype(self.n)
+        self.date_col = date_col if date_col in df.columns else None
+        self._dates = None
+        if self.date_col:
+            dates = pd.to_datetime(df[self.date_col], errors="coerce")
+            values = dates.to_numpy(dtype="datetime64[ns]").view("int64")
+            valid = np.flatnonzero(dates.notna().to_numpy())
+            self._dates = values
+            self._date_order = valid[np.argsort(values[valid], kind="stable")].astype(pos_dtype)
+            self._sorted_dates = values[self._date_order]
+
+        self.dims = [d for d in dims if d and d in df.columns]
+        self._codes, self._labels, self._starts, self._postings = {}, {}, {}, {}
+        for d in self.dims:
+            codes, uniques = pd.factorize(df[d], use_na_sentinel=True)
+            codes = codes.astype(np.int32)
+            # las posiciones de cada valor quedan contiguas y ordenadas (argsort estable)
+            order = np.argsort(codes, kind="stable").astype(pos_dtype)
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            skip = int((codes < 0).sum())  # los nulos (-1) quedan al principio
+            self._codes[d] = codes
+            self._labels[d] = {str(u): k for k, u in enumerate(uniques)}
+            self._starts[d] = skip + np.concatenate([[0], np.cumsum(counts)])
+            self._postings[d] = order
+
+    # ------------------------- metadatos -------------------------
+    def values(self, dim: str) -> list:
+        return sorted(self._labels.get(dim, {}))
+
+    def date_bounds(self):
+        """(mínima, máxima) fecha indexada, o None si no hay fechas válidas."""
+        if self._dates is None or not len(self._sorted_dates):
+            return None
+        return pd.Timestamp(self._sorted_dates[0]), pd.Timestamp(self._sorted_dates[-1])
+
+    # ------------------------- resolución -------------------------
+    def _date_range(self, start, end):
+        """(lo, hi) en el orden por fecha para [start, end] (días completos)."""
+        lo_v = pd.Timestamp(start).value if start is not None else np.iinfo(np.int64).min
+        hi_v = (pd.Timestamp(end).normalize() + pd.Timedelta(days=1)).value if end is not None \
+            else np.iinfo(np.int64).max
+        lo, hi = np.searchsorted(self._sorted_dates, [lo_v, hi_v], side="left")
+        return int(lo), int(hi), lo_v, hi_v
+
+    def _codes_for(self, dim: str, values) -> np.ndarray:
+        labels = self._labels[dim]
+        return np.array(sorted({labels[str(v)] for v in values if str(v) in labels}), dtype=np.int32)
+
+    def select(self, date_range=None, **filters):
+        """Posiciones (ordenadas) de las filas que cumplen todos los filtros; None si no hay filtros.
+
+        `date_range` es (desde, hasta) inclusive; cada filtro de dimensión es una lista
+        de valores aceptados (None o vacía = sin filtro).
+        """
+        plans = []
+        if date_range is not None and self._dates is not None:
+            lo, hi, lo_v, hi_v = self._date_range(*date_range)
+            plans.append((hi - lo, "date", (lo, hi, lo_v, hi_v)))
+        for dim, values in filters.items():
+            if not values or dim not in self._codes:
+                continue
+            codes = self._codes_for(dim, values)
+            starts = self._starts[dim]
+            size = int((starts[codes + 1] - starts[codes]).sum())
+            plans.append((size, dim, codes))
+        if not plans:
+            return None
+        plans.sort(key=lambda p: p[0])
+        if plans[0][0] == 0:
+            return np.empty(0, dtype=_positions_dtype(self.n))
+
+        _, kind, spec = plans[0]
+        if kind == "date":
+            lo, hi = spec[:2]
+            pos = np.sort(self._date_order[lo:hi])
+        else:
+            starts, postings = self._starts[kind], self._postings[kind]
+            parts = [postings[starts[c]:starts[c + 1]] for c in spec]
+            pos = parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+        for _, kind, spec in plans[1:]:
+            if kind == "date":
+                d = self._dates[pos]
+                pos = pos[(d >= spec[2]) & (d < spec[3])]
+            else:
+                allowed = np.zeros(len(self._labels[kind]) + 1, dtype=bool)  # el último = nulo (-1)
+                allowed[spec] = True
+                pos = pos[allowed[self._codes[kind][pos]]]
+            if not len(pos):
+                break
+        return pos
+
+def build_filter_index(df: pd.DataFrame, cat_col=None) -> FilterIndex:
+    """Índice para los filtros del Paso 3 (fecha, categoría, medio de pago y ciudad)."""
+    city = next((c for c in CITY_COLS if c in df.columns), None)
+    return FilterIndex(df, detect_date_col(df.columns), [cat_col, "medio_pago", city])
+
+def months_in_range(start, end) -> list:
+    """Meses ('AAAA-MM') que toca el rango [start, end]."""
+    return [str(p) for p in pd.period_range(pd.Timestamp(start), pd.Timestamp(end), freq="M")]
+
+def months_bounds(months):
+    """(primer día del primer mes, último día del último mes) o None si no hay meses válidos."""
+    periods = pd.PeriodIndex([m for m in months if m and m != "NaT"], freq="M")
+    if not len(periods):
+        return None
+    return periods.min().start_time, periods.max().end_time.normalize()
+
+def cube_city_col(cube):
+    return next((d for d in cube.dims if d in CITY_COLS), None)
+
+def covers_whole_months(start, end) -> bool:
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    return start.day == 1 and end == end + pd.offsets.MonthEnd(0)
+
+def filtered_cube(cube, filters: dict, date_range=None, index: FilterIndex = None, df: pd.DataFrame = None,
+                  keys: dict = None, ventas: pd.DataFrame = None, plan=None):
+    """Cubo para los gráficos con los filtros aplicados.
+
+    `df` es el integrado, ancho o compacto (`compact.CompactTable`). Sin índice ni
+    `plan` (modo streaming) el rango de fechas se aproxima a meses completos.
+    """
+    filters = {d: list(v) for d, v in filters.items() if v}
+    if not filters and date_range is None:
+        return cube
+    exact_months = date_range is None or covers_whole_months(*date_range)
+    if plan is not None and not (exact_months and "mes" in cube.dims):
+        return plan.cube(filters, date_range, sample_size=cube.meta.get("sample_size", 20_000),
+                         rel_acc=cube.meta["rel_acc"])
+    if index is None or df is None or (exact_months and "mes" in cube.dims):
+        if date_range is not None and "mes" in cube.dims:
+            filters["mes"] = months_in_range(*date_range)
+        return cube.filter(**filters)
+
+    lines = _selection_cube(cube, df, index.select(date_range=date_range, **filters), keys, ventas)
+    by_ticket = ticket_filters(filters, cube.meta["ticket_dims"])
+    if by_ticket == filters:
+        return lines
+    tickets = _selection_cube(cube, df, index.select(date_range=date_range, **by_ticket), keys, ventas)
+    return Cube(lines.cells, lines.buckets, tickets.tickets, tickets.ticket_buckets, lines.sample, lines.meta)
+
+def _selection_cube(cube, df, pos, keys: dict, ventas: pd.DataFrame = None):
+    """Cubo de las filas `pos` del integrado (None = todas)."""
+    sub = df.take(pos) if pos is not None else df
+    det_key, venta_key = keys["det_venta_key"], keys["venta_key"]
+    if isinstance(sub, CompactTable):  # sólo las columnas que usa el cubo, resueltas para esas filas
+        sub = sub.to_frame([c for c in dict.fromkeys([*cube.dims, *LINE_MEASURES, det_key]) if c in sub])
+    if ventas is not None and venta_key in ventas.columns:
+        ventas = ventas[ventas[venta_key].isin(sub[det_key].unique())]
+    return build_cube(sub, cube.cat_col, keys, ventas, cube.meta.get("total_col"),
+                      rel_acc=cube.meta["rel_acc"])
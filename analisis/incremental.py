@@ -0,0 +1,386 @@
+"""Ingesta incremental: en cada corrida sólo se procesan las filas nuevas de ventas y detalle.
+
+El estado se guarda en `output_dir/estado_incremental.json`:
+
+- por archivo crudo (`ventas`, `detalle`): dialecto, columnas, offset en bytes hasta
+  donde se procesó y una firma BLAKE2b de los últimos bytes procesados;
+- la marca de agua de la clave de venta (máximo `id_venta` procesado): las filas de
+  ventas con id menor o igual se descartan aunque reaparezcan;
+- la huella de `clientes` y `productos`, las claves, las columnas y tipos de cada
+  salida y el tamaño confirmado de cada CSV de salida.
+
+Los tipos de ventas y detalle los fija el primer lote (`schema.ChunkSchema`) y se
+guardan en el estado: los bloques y las corridas siguientes se convierten a ellos.
+
+Cada corrida lee desde el offset guardado hasta el final (`readers.iter_byte_range`),
+limpia e integra sólo esas filas, las agrega al final de los CSV limpios y fusiona el
+cubo del lote con el cubo guardado (`Cube.merge`): el costo es proporcional al volumen
+nuevo, no al histórico. Al empezar, los CSV de salida se truncan al tamaño confirmado,
+de modo que una corrida interrumpida no deja filas duplicadas (en Parquet se borran los
+archivos del lote que no llegó a confirmarse).
+
+Se reconstruye todo (la misma ingesta, desde el offset 0) si no hay estado, si un
+archivo crudo fue reescrito (la firma no coincide o es más corto que el offset), si
+cambiaron clientes/productos, los formatos de salida o si se piden otras claves.
+
+El cubo y los totales por ticket (`totales_ticket.parquet`) se escriben primero en
+`.pendiente/` y se mueven a su lugar recién después de guardar el estado marcado como
+``"pending"`` (`_commit_pending`): si la corrida se corta antes, lo pendiente se
+descarta y el lote se vuelve a procesar; si se corta durante el cambio, la próxima
+corrida lo completa. Así un lote nunca se suma dos veces al cubo.
+
+Las líneas de detalle de ventas ya procesadas en corridas anteriores ("tardías") se
+integran buscando esas ventas en `ventas_limpio.csv` y suman al cubo de líneas. Si la
+venta tiene total en `ventas`, su ticket no cambia; si el total se reconstruye del
+detalle, `update_ticket_store` le suma las líneas nuevas y el cubo resta el total
+anterior del ticket y suma el actualizado. Se cuentan en el lote (`late_lines`).
+"""
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from .cache import file_digest
+from .cube import CUBE_DIRNAME, Cube, CubeBuilder, cube_dims
+from .joins import dims_are_unique, integrate_gather, lookup_positions
+from .pipeline import (
+    CLEAN_FILES, INTEGRATED_FILE, add_derived, detect_cat_col, detect_total_col, ensure_dir, export_clean,
+    integrate_merge, resolve_keys,
+)
+from .profiling import measure
+from .readers import BLOCK_BYTES, iter_byte_range, raw_paths, read_header, robust_read_csv, sniff_csv
+from .schema import ChunkSchema, apply_schema
+from .storage import (
+    clear_table, detalle_partitions, parse_formats, read_table, remove_batch, table_dir, ventas_partitions, write_table,
+)
+from .streaming import DEFAULT_CHUNKSIZE, TicketAccumulator, prepare_raw
+
+STATE_FILE = "estado_incremental.json"
+TICKETS_FILE = "totales_ticket.parquet"
+STATE_VERSION = 1
+PENDING_DIRNAME = ".pendiente"
+EDGE_BYTES = 4096
+SOURCES = ("ventas", "detalle")
+DIMENSIONS = ("clientes", "productos")
+
+# ========================= ESTADO =========================
+def read_state(output_dir: str):
+    try:
+        with open(os.path.join(output_dir, STATE_FILE), "r", encoding="utf-8") as fh:
+            state = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("version") == STATE_VERSION else None
+
+def write_state(output_dir: str, state: dict):
+    path = os.path.join(output_dir, STATE_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)  # escritura atómica: el estado sólo avanza si la corrida terminó
+
+def _commit_pending(output_dir: str, state: dict):
+    """Mueve cubo y totales por ticket de `PENDING_DIRNAME` a su lugar (idempotente) y confirma el estado."""
+    pending = os.path.join(output_dir, PENDING_DIRNAME)
+    staged_cube = os.path.join(pending, CUBE_DIRNAME)
+    if os.path.isdir(staged_cube):
+        shutil.rmtree(os.path.join(output_dir, CUBE_DIRNAME), ignore_errors=True)
+        os.replace(staged_cube, os.path.join(output_dir, CUBE_DIRNAME))
+    staged_store = os.path.join(pending, TICKETS_FILE)
+    if os.path.exists(staged_store):
+        os.replace(staged_store, os.path.join(output_dir, TICKETS_FILE))
+    state["pending"] = False
+    write_state(output_dir, state)
+    shutil.rmtree(pending, ignore_errors=True)
+
+def _recover(output_dir: str, state):
+    """Completa el cambio de una corrida cortada después de guardar su estado; si no, descarta lo pendiente."""
+    if state is not None and state.get("pending"):
+        _commit_pending(output_dir, state)
+    shutil.rmtree(os.path.join(output_dir, PENDING_DIRNAME), ignore_errors=True)
+
+def edge_digest(path: str, end: int, floor: int = 0) -> str:
+    """Firma de los últimos `EDGE_BYTES` antes de `end` (detecta archivos reescritos sin releerlos)."""
+    start = max(floor, end - EDGE_BYTES)
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _new_source(path: str) -> dict:
+    dialect = sniff_csv(path)
+    columns, data_start = read_header(path, dialect)
+    return {"dialect": dialect, "columns": columns, "data_start": data_start, "offset": data_start,
+            "edge": edge_digest(path, data_start)}
+
+def _source_unchanged(path: str, src: dict) -> bool:
+    if os.path.getsize(path) < src["offset"]:
+        return False
+    return edge_digest(path, src["offset"], src["data_start"]) == src["edge"]
+
+def rebuild_reason(state, paths: dict, dims_digest: dict, keys: dict = None, formats=("csv",)):
+    """Motivo para reconstruir desde cero (None si se puede seguir incrementalmente)."""
+    if state is None:
+        return "sin estado previo"
+    if state["formats"] != list(formats):
+        return "cambiaron los formatos de salida"
+    if state["dims_digest"] != dims_digest:
+        return "cambiaron clientes/productos"
+    for name in SOURCES:
+        if not _source_unchanged(paths[name], state["sources"][name]):
+            return f"{os.path.basename(paths[name])} fue reescrito"
+    if keys and any(state["keys"].get(k) != v for k, v in keys.items()):
+        return "cambiaron las claves"
+    return None
+
+def _truncate_outputs(out_paths: dict, committed: dict):
+    """Descarta lo que una corrida interrumpida haya agregado después del último estado confirmado."""
+    for name, path in out_paths.items():
+        size = committed.get(name, 0)
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+# ========================= LÍNEAS TARDÍAS =========================
+def lookup_clean_ventas(output_dir: str, ids, key: str, schema=None, float_dtype="float64",
+                        formats=("csv",)) -> pd.DataFrame:
+    """Ventas ya limpias cuya clave está en `ids` (Parquet con filtro, o `ventas_limpio.csv` por bloques)."""
+    if "parquet" in formats:
+        return read_table(output_dir, "ventas", filters=[(key, "in", list(ids))])
+    path = os.path.join(output_dir, CLEAN_FILES["ventas"])
+    found = []
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        for chunk in pd.read_csv(path, chunksize=DEFAULT_CHUNKSIZE):
+            chunk = apply_schema(chunk, "ventas", schema, float_dtype)
+            found.append(chunk[chunk[key].isin(ids)])
+    return pd.concat(found, ignore_index=True) if found else pd.DataFrame()
+
+# ========================= TOTALES POR TICKET =========================
+def update_ticket_store(path: str, totals: pd.Series, attrs: pd.DataFrame, out_path: str = None):
+    """Suma los totales del lote a los acumulados por ticket (sólo si el total se reconstruye del detalle).
+
+    Lee los acumulados de `path` y escribe los nuevos en `out_path` (por defecto, `path`).
+    Devuelve (previos, totales, atributos): los valores anteriores de los tickets que
+    ya existían (a restar del cubo) y los valores actualizados de todos los del lote.
+    """
+    delta = attrs.copy()
+    delta.insert(0, "total_ticket", totals.to_numpy(dtype="float64"))
+    store = pd.read_parquet(path) if os.path.exists(path) else delta.iloc[:0]
+    known = delta.index.isin(store.index)
+    previous = store.loc[delta.index[known]]
+    updated = delta.copy()
+    if len(previous):
+        updated.loc[known, "total_ticket"] += previous["total_ticket"].to_numpy()
+        for col in attrs.columns:  # los atributos se toman de la primera línea vista
+            updated.loc[known, col] = previous[col].where(previous[col].notna(), updated.loc[known, col]).to_numpy()
+    store = pd.concat([store[~store.index.isin(updated.index)], updated])
+    store.astype({c: "string" for c in store.columns if store[c].dtype == object}).to_parquet(out_path or path)
+    return previous, updated["total_ticket"], updated[list(attrs.columns)]
+
+# ========================= INGESTA =========================
+def _ticket_base(columns):
+    return "importe" if "importe" in columns else ("subtotal_calc" if "subtotal_calc" in columns else None)
+
+def _append(df: pd.DataFrame, path: str, columns: dict, name: str):
+    """Agrega `df` al CSV de salida `name` respetando el orden de columnas ya escrito."""
+    fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+    if fresh:
+        columns[name] = list(df.columns)
+    elif set(df.columns) != set(columns[name]):
+        raise ValueError(f"Las columnas de {os.path.basename(path)} cambiaron; reconstruir con --full")
+    df[columns[name]].to_csv(path, mode="a", header=fresh, index=False, encoding="utf-8")
+
+def ingest(data_dir: str, output_dir: str, keys: dict = None, full: bool = False, write_integrated: bool = True,
+           cache=None, block_bytes: int = BLOCK_BYTES, sample_size: int = 20_000, schema: dict = None,
+           float_dtype="float64", track_memory: bool = False, formats=("csv",)) -> dict:
+    """Procesa las filas nuevas de ventas/detalle desde la última corrida (o todo, si hay que reconstruir).
+
+    En Parquet cada lote agrega sus propios archivos (`lote00042-...`) a las particiones.
+    """
+    formats = parse_formats(formats)
+    paths = raw_paths(data_dir)
+    missing = [k for k, p in paths.items() if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"Faltan archivos: {', '.join(missing)} en {data_dir}")
+    ensure_dir(output_dir)
+    report = []
+
+    dims_digest = {name: file_digest(paths[name]) for name in DIMENSIONS}
+    state = read_state(output_dir)
+    _recover(output_dir, state)
+    state = None if full else state
+    reason = "reconstrucción pedida" if full else rebuild_reason(state, paths, dims_digest, keys, formats)
+    out_paths = {}
+    if "csv" in formats:
+        out_paths = {name: os.path.join(output_dir, CLEAN_FILES[name]) for name in SOURCES}
+        if write_integrated:
+            out_paths["integrado"] = os.path.join(output_dir, INTEGRATED_FILE)
+    parquet_tables = (*SOURCES, "integrado") if "parquet" in formats else ()
+    store_path = os.path.join(output_dir, TICKETS_FILE)
+    pending = os.path.join(output_dir, PENDING_DIRNAME)
+    if reason:
+        state = {
+            "version": STATE_VERSION, "dims_digest": dims_digest, "formats": list(formats), "hwm": None,
+            "keys": None, "cat_col": None, "total_col": None, "ticket_base": None, "cube_dims": None,
+            "columns": {}, "dtypes": {}, "outputs": {}, "batches": [],
+            "sources": {name: _new_source(paths[name]) for name in SOURCES},
+        }
+        # primero el estado: si la corrida se corta mientras se borran las salidas, la próxima reconstruye
+        for path in [os.path.join(output_dir, STATE_FILE), *out_paths.values(), store_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(os.path.join(output_dir, CUBE_DIRNAME), ignore_errors=True)
+        for name in parquet_tables:
+            clear_table(output_dir, name)
+    else:
+        _truncate_outputs(out_paths, state["outputs"])
+    batch_name = f"lote{len(state['batches']):05d}"
+    for name in parquet_tables:
+        remove_batch(output_dir, name, batch_name)  # restos de una corrida interrumpida con el mismo número
+
+    with measure(report, "load+type:dims", track_memory):
+        read = (lambda p: cache.load(p, robust_read_csv)) if cache is not None else robust_read_csv
+        tables = {name: prepare_raw(read(paths[name]), name, schema, float_dtype) for name in DIMENSIONS}
+    export_clean(tables, output_dir, formats)
+
+    fixed = {name: ChunkSchema(name, state.setdefault("dtypes", {}).get(name)) for name in SOURCES}
+    ends = {name: os.path.getsize(paths[name]) for name in SOURCES}
+    src_v, src_d = state["sources"]["ventas"], state["sources"]["detalle"]
+    with measure(report, "read+type:ventas", track_memory):
+        parts = list(iter_byte_range(paths["ventas"], src_v["offset"], ends["ventas"], src_v["columns"],
+                                     src_v["dialect"], block_bytes))
+        ventas = prepare_raw(pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=src_v["columns"]),
+                             "ventas", schema, float_dtype)
+        ventas = fixed["ventas"].conform(ventas)
+    det_chunks = iter_byte_range(paths["detalle"], src_d["offset"], ends["detalle"], src_d["columns"],
+                                 src_d["dialect"], block_bytes)
+    first = next(det_chunks, None)
+    if reason and first is None:
+        raise ValueError(f"{paths['detalle']} no tiene filas")
+    first = fixed["detalle"].conform(prepare_raw(first, "detalle", schema, float_dtype)) if first is not None else None
+
+    keys = state["keys"] or resolve_keys({**tables, "ventas": ventas, "detalle": first}, keys)
+    venta_key, det_venta_key = keys["venta_key"], keys["det_venta_key"]
+    if state["hwm"] is not None and pd.api.types.is_numeric_dtype(ventas[venta_key]):
+        ventas = ventas[ventas[venta_key] > state["hwm"]].reset_index(drop=True)
+    if "ventas" in out_paths:
+        _append(ventas, out_paths["ventas"], state["columns"], "ventas")
+    if parquet_tables and len(ventas):
+        write_table(ventas, output_dir, "ventas", ventas_partitions(ventas), basename=batch_name)
+
+    total_col = state["total_col"] if state["keys"] else detect_total_col(ventas)
+    cli_pair = [(tables["clientes"], keys["cli_key_cli"])] if keys.get("cli_key_cli") else []
+    builder = tickets = None
+    # posiciones y tickets por la primera fila de cada venta (como el gather y el camino en memoria)
+    venta_ids = ventas[venta_key][~ventas[venta_key].duplicated()].reset_index(drop=True)
+    if state["cube_dims"] is not None:
+        builder = CubeBuilder(state["cube_dims"], sample_size=sample_size)
+        tickets = TicketAccumulator(venta_ids, state["ticket_base"], builder.ticket_dims)
+    late_ventas, late_lines, preview, n_new = ventas.iloc[:0], 0, None, len(ventas)
+
+    with measure(report, "integrate:detalle", track_memory):
+        rest = (fixed["detalle"].conform(prepare_raw(raw, "detalle", schema, float_dtype)) for raw in det_chunks)
+        for i, chunk in enumerate(chain([first] if first is not None else [], rest)):
+            # ventas de corridas anteriores referidas por líneas tardías
+            pos = lookup_positions(chunk[det_venta_key], venta_ids)
+            unknown = chunk[det_venta_key][pos < 0]
+            if len(unknown) and state["batches"]:
+                wanted = pd.Index(unknown.unique()).difference(pd.Index(late_ventas[venta_key].unique()))
+                if len(wanted):
+                    found = lookup_clean_ventas(output_dir, wanted.tolist(), venta_key, schema, float_dtype, formats)
+                    late_ventas = pd.concat([late_ventas, found[list(ventas.columns)]], ignore_index=True) \
+                        if not found.empty else late_ventas
+            lookup = pd.concat([ventas, late_ventas], ignore_index=True) if len(late_ventas) else ventas
+            unique = dims_are_unique((tables["productos"], keys["prod_key"]), (lookup, venta_key), *cli_pair)
+            integrate = integrate_gather if unique else integrate_merge
+            df = add_derived(integrate({**tables, "ventas": lookup, "detalle": chunk}, keys))
+
+            if "detalle" in out_paths:
+                _append(chunk, out_paths["detalle"], state["columns"], "detalle")
+            if "integrado" in out_paths:
+                _append(df, out_paths["integrado"], state["columns"], "integrado")
+            if parquet_tables:
+                part = detalle_partitions(chunk, lookup, det_venta_key, venta_key)
+                write_table(chunk, output_dir, "detalle", part, basename=f"{batch_name}-b{i:04d}")
+                write_table(df, output_dir, "integrado", basename=f"{batch_name}-b{i:04d}")
+            if builder is None:
+                state["cat_col"], state["ticket_base"] = detect_cat_col(df), _ticket_base(df.columns)
+                builder = CubeBuilder(cube_dims(df.columns, state["cat_col"]), sample_size=sample_size)
+                tickets = TicketAccumulator(venta_ids, state["ticket_base"], builder.ticket_dims)
+            if preview is None:
+                preview = chunk.head(100)
+            builder.update(df)
+            lookup_ids = lookup[venta_key][~lookup[venta_key].duplicated()]  # las nuevas quedan primero
+            venta_pos = lookup_positions(df[det_venta_key], lookup_ids)
+            late = venta_pos >= len(venta_ids)
+            late_lines += int(late.sum())
+            # las líneas tardías se acumulan por clave (como huérfanas) y se suman a su ticket abajo
+            tickets.update(df, np.where(late, -1, venta_pos), det_venta_key)
+
+    with measure(report, "aggregate", track_memory):
+        cube = None
+        if builder is not None:
+            meta = {"cat_col": state["cat_col"], "total_col": total_col}
+            retracted = None
+            if total_col:
+                totals = pd.Series(ventas[total_col].to_numpy(), index=ventas[venta_key].to_numpy())
+                _, attrs = tickets.totals()
+                attrs = attrs[~attrs.index.duplicated()].reindex(totals.index)
+            else:
+                totals, attrs = tickets.totals()
+                os.makedirs(pending, exist_ok=True)
+                previous, totals, attrs = update_ticket_store(store_path, totals, attrs,
+                                                              os.path.join(pending, TICKETS_FILE))
+                if len(previous):
+                    retraction = CubeBuilder(builder.dims, sample_size=0)
+                    retracted = retraction.set_tickets(previous["total_ticket"], previous).build(meta)
+            builder.set_tickets(totals, attrs)
+            batch = builder.build(meta)
+            cube = Cube.load(output_dir) if os.path.isdir(os.path.join(output_dir, CUBE_DIRNAME)) else None
+            if cube is not None and retracted is not None:
+                cube = cube.merge(retracted, retract=True)
+            cube = cube.merge(batch) if cube is not None else batch
+            cube.save(pending)
+
+    info = {
+        "at": datetime.now().isoformat(timespec="seconds"), "rebuild": reason, "ventas": n_new,
+        "detalle": builder.rows if builder is not None else 0, "late_lines": late_lines,
+    }
+    if n_new and pd.api.types.is_numeric_dtype(ventas[venta_key]):
+        hwm = int(ventas[venta_key].max())
+        state["hwm"] = hwm if state["hwm"] is None else max(state["hwm"], hwm)
+    for name in SOURCES:
+        src = state["sources"][name]
+        src["offset"], src["edge"] = ends[name], edge_digest(paths[name], ends[name], src["data_start"])
+    state["dtypes"].update({name: fixed[name].kinds for name in SOURCES})
+    state.update({
+        "keys": keys, "total_col": total_col, "cube_dims": builder.dims if builder is not None else None,
+        "outputs": {name: os.path.getsize(p) for name, p in out_paths.items() if os.path.exists(p)},
+    })
+    state["batches"].append(info)
+    state["pending"] = True
+    write_state(output_dir, state)
+    _commit_pending(output_dir, state)
+
+    return {
+        **tables,
+        "ventas": ventas,
+        "detalle": preview if preview is not None else pd.DataFrame(columns=src_d["columns"]),
+        "integrado": None,
+        "streaming": True,
+        "incremental": info,
+        "cube": cube,
+        "index": None,
+        "rows": info["detalle"],
+        "cat_col": state["cat_col"],
+        "total_col": total_col,
+        "keys": keys,
+        "paths": out_paths,
+        "parquet": {name: table_dir(output_dir, name) for name in (*DIMENSIONS, *parquet_tables)}
+        if parquet_tables else {},
+        "report": report,
+    }
@@ -0,0 +1,183 @@
+"""Trabajos en segundo plano (la limpieza del Paso 2) con progreso por etapa y cancelación.
+
+`JobRunner` es un pool de hilos compartido por todas las sesiones del servidor, con
+un registro de trabajos por id y por clave. Mientras un trabajo con la misma clave
+(p.ej. la carpeta de salida) sigue activo, `submit` devuelve ese trabajo en lugar de
+lanzar otro: dos sesiones que limpian a la misma carpeta no escriben a la vez, y un
+rerun de la app vuelve a engancharse al trabajo por su id. Como la clave no dice qué
+produce el trabajo, `tag` lo identifica (p.ej. el dataset): quien recibe un trabajo con
+otro `tag` sabe que la clave está ocupada por algo distinto de lo que pidió.
+
+Se usan hilos y no procesos porque el resultado (tablas limpias, cubo, índice) tiene
+que quedar en la memoria del servidor para las sesiones, y devolverlo desde otro
+proceso obligaría a serializarlo entero; el parseo y los cómputos de pandas/Arrow
+sueltan el GIL buena parte del tiempo.
+
+El progreso sale de los mismos `profiling.measure` del pipeline: el trabajo escucha
+(`profiling.listen`) el inicio y el fin de cada etapa y los avances que publican los
+pasos largos. La cancelación es cooperativa: `Job.cancel()` marca el pedido y el
+trabajo se corta con `JobCancelled` en el próximo límite de etapa (o de bloque en
+streaming); un trabajo que todavía no arrancó se descarta directamente. Lo que ya se
+hubiera escrito en la carpeta de salida queda como esté.
+"""
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .profiling import listen
+
+JOB_STATES = ("pendiente", "corriendo", "terminado", "error", "cancelado")
+FINAL_STATES = ("terminado", "error", "cancelado")
+
+class JobCancelled(Exception):
+    """El trabajo se canceló (se lanza dentro del trabajo, entre etapas)."""
+
+class Job:
+    """Un trabajo: estado, etapas terminadas, etapa actual y resultado o error."""
+
+    def __init__(self, key, label: str = "", tag=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.label = label
+        self.tag = tag
+        self.state = "pendiente"
+        self.stages = []
+        self.current = None
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.created = time.time()
+        self.started = self.finished = None
+        self.future = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    # ------------------------- estado -------------------------
+    @property
+    def done(self) -> bool:
+        return self.state in FINAL_STATES
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def snapshot(self) -> dict:
+        """Copia del estado para mostrar (sin tomar el resultado)."""
+        with self._lock:
+            return {
+                "id": self.id, "label": self.label, "state": self.state,
+                "current": dict(self.current) if self.current else None,
+                "stages": [dict(e) for e in self.stages], "elapsed": round(self.elapsed, 2),
+                "cancel_requested": self.cancel_requested,
+                "error": None if self.error is None else f"{type(self.error).__name__}: {self.error}",
+            }
+
+    def cancel(self) -> bool:
+        """Pide cancelar; True si ya no va a correr (no había arrancado o ya había terminado)."""
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self._finish("cancelado")
+        return self.done
+
+    def wait(self, timeout: float = None) -> bool:
+        """Espera a que termine (o `timeout` segundos); True si terminó."""
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.done:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    # ------------------------- ejecución -------------------------
+    def _finish(self, state: str, result=None, error=None):
+        with self._lock:
+            self.state, self.result, self.error = state, result, error
+            self.current = None
+            self.finished = time.time()
+
+    def _on_stage(self, event: str, step: str, data: dict):
+        with self._lock:
+            if event == "start":
+                self.current = {"step": step, "since": time.time(), **data}
+            elif event == "progress":
+                self.current = {**(self.current or {"step": step, "since": time.time()}), **data}
+            else:
+                self.stages.append(data)
+                self.current = None
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def _run(self, fn, args, kwargs):
+        if self._cancel.is_set():
+            self._finish("cancelado")
+            return
+        with self._lock:
+            self.state, self.started = "corriendo", time.time()
+        try:
+            with listen(self._on_stage):
+                result = fn(*args, **kwargs)
+        except JobCancelled:
+            self._finish("cancelado")
+        except Exception as e:
+            self.traceback = traceback.format_exc()
+            self._finish("error", error=e)
+        else:
+            self._finish("terminado", result)
+
+class JobRunner:
+    """Pool de `max_workers` hilos + registro de trabajos (se conservan los `keep_finished` últimos terminados)."""
+
+    def __init__(self, max_workers: int = 2, keep_finished: int = 8):
+        self.max_workers = max_workers
+        self.keep_finished = keep_finished
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, label: str = "", tag=None, **kwargs) -> Job:
+        """Lanza `fn(*args, **kwargs)`; si ya hay un trabajo activo con `key`, devuelve ése (su `tag` puede ser otro)."""
+        with self._lock:
+            active = self._find(key)
+            if active is not None:
+                return active
+            job = Job(key, label, tag)
+            self._jobs[job.id] = job
+            job.future = self._pool.submit(job._run, fn, args, kwargs)
+            self._trim()
+            return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find(self, key):
+        """Trabajo activo (pendiente o corriendo) con `key`, o None."""
+        with self._lock:
+            return self._find(key)
+
+    def active(self) -> list:
+        with self._lock:
+            return [j for j in self._jobs.values() if not j.done]
+
+    def shutdown(self, cancel: bool = True, wait: bool = False):
+        if cancel:
+            for job in self.active():
+                job.cancel()
+        self._pool.shutdown(wait=wait, cancel_futures=cancel)
+
+    def _find(self, key):
+        return next((j for j in self._jobs.values() if j.key == key and not j.done), None)
+
+    def _trim(self):
+        finished = [job_id for job_id, j in self._jobs.items() if j.done]
+        for job_id in finished[: max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
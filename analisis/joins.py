@@ -0,0 +1,97 @@
+"""Integración por "gather": búsquedas indexadas contra tablas de dimensión pequeñas.
+
+En lugar de encadenar `DataFrame.merge` (cada uno materializa una copia completa
+del intermedio), cada clave del detalle se traduce una sola vez a la posición de
+su fila en la dimensión (`Index.get_indexer`) y las columnas de la dimensión se
+recogen con `take`. La tabla ancha se arma con un único `DataFrame(...)` al final.
+
+Replica la semántica de `merge(how="left")` del pipeline: nombres con sufijos,
+nulos en las filas sin correspondencia y enteros que pasan a float sólo si falta
+algún valor. Requiere claves únicas en las dimensiones (si no, usar el merge).
+"""
+import numpy as np
+import pandas as pd
+
+from .schema import TEXT_DTYPE
+
+def _as_key_index(s: pd.Series) -> pd.Index:
+    return pd.Index(s.array)
+
+def _comparable(fact_key: pd.Series, dim_key: pd.Series):
+    """Pone ambas claves en un espacio comparable (numérico o texto)."""
+    num = pd.api.types.is_numeric_dtype
+    if num(fact_key.dtype) and num(dim_key.dtype):
+        return fact_key, dim_key
+    if isinstance(fact_key.dtype, pd.CategoricalDtype) and fact_key.dtype == dim_key.dtype:
+        return fact_key, dim_key
+    return fact_key.astype(TEXT_DTYPE), dim_key.astype(TEXT_DTYPE)
+
+def lookup_positions(fact_key: pd.Series, dim_key: pd.Series) -> np.ndarray:
+    """Posición en `dim_key` de cada valor de `fact_key` (-1 si no existe).
+
+    Las claves categóricas se resuelven sobre sus categorías (un lookup por valor
+    distinto) y luego se expanden con los códigos enteros.
+    """
+    fact_key, dim_key = _comparable(fact_key, dim_key)
+    dim_index = _as_key_index(dim_key)
+    if isinstance(fact_key.dtype, pd.CategoricalDtype):
+        codes = fact_key.cat.codes.to_numpy()
+        cat_pos = dim_index.get_indexer(fact_key.cat.categories)
+        return np.where(codes >= 0, cat_pos[codes], -1)
+    return dim_index.get_indexer(_as_key_index(fact_key))
+
+def dims_are_unique(*pairs) -> bool:
+    """True si cada (DataFrame, columna) tiene claves únicas (condición para el gather)."""
+    return all(df[col].is_unique for df, col in pairs)
+
+def _values(s: pd.Series):
+    return s.to_numpy() if isinstance(s.dtype, np.dtype) else s.array
+
+def _take(s: pd.Series, pos: np.ndarray, has_missing: bool):
+    values = _values(s)
+    if isinstance(values, np.ndarray):
+        return pd.api.extensions.take(values, pos, allow_fill=has_missing)
+    return values.take(pos, allow_fill=has_missing)
+
+def join_names(left_names, dim_columns, left_key: str, right_key: str, suffixes=("_x", "_y")):
+    """Nombres de salida de `merge(how="left")`: (renombres de la izquierda, [(salida, columna de dim)])."""
+    same_key = left_key == right_key
+    right_cols = [c for c in dim_columns if not (same_key and c == right_key)]
+    overlap = set(right_cols) & set(left_names)
+    if overlap and not any(suffixes):
+        raise ValueError(f"Columnas superpuestas sin sufijo: {sorted(overlap)}")
+    left = {name: f"{name}{suffixes[0]}" if name in overlap else name for name in left_names}
+    return left, [(f"{c}{suffixes[1]}" if c in overlap else c, c) for c in right_cols]
+
+def gather_join(columns: dict, dim: pd.DataFrame, left_key: str, right_key: str, suffixes=("_x", "_y")) -> dict:
+    """Equivalente a `left.merge(dim, left_on, right_on, how="left")` sobre columnas en un dict.
+
+    `columns` (nombre → array, en orden) representa la tabla izquierda; se devuelve
+    un dict nuevo con las columnas de la dimensión agregadas (sin copiar las de la izquierda).
+    """
+    pos = lookup_positions(pd.Series(columns[left_key]), dim[right_key])
+    has_missing = bool((pos < 0).any())
+    left, right = join_names(columns, dim.columns, left_key, right_key, suffixes)
+    out = {left[name]: values for name, values in columns.items()}
+    for name, col in right:
+        out[name] = _take(dim[col], pos, has_missing)
+    return out
+
+def client_dimension(clientes: pd.DataFrame, keys: dict):
+    """Lo que el integrado trae de clientes: la clave y la primera columna de ciudad (None si no hay clave)."""
+    cli_key_cli = keys.get("cli_key_cli")
+    if not (keys.get("cli_key_det") and cli_key_cli and cli_key_cli in clientes.columns):
+        return None
+    extras = [c for c in ("ciudad", "localidad", "provincia") if c in clientes.columns][:1]
+    return clientes[[cli_key_cli] + extras]
+
+def integrate_gather(tables: dict, keys: dict) -> pd.DataFrame:
+    """Paso 7 (vía gather): detalle + productos + ventas [+ clientes] en una sola materialización."""
+    detalle = tables["detalle"]
+    columns = {c: _values(detalle[c]) for c in detalle.columns}
+    columns = gather_join(columns, tables["productos"], keys["det_prod_key"], keys["prod_key"], ("", "_prod"))
+    columns = gather_join(columns, tables["ventas"], keys["det_venta_key"], keys["venta_key"])
+    clientes = client_dimension(tables["clientes"], keys)
+    if clientes is not None and keys["cli_key_det"] in columns:
+        columns = gather_join(columns, clientes, keys["cli_key_det"], keys["cli_key_cli"], ("", "_cli"))
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(detalle)), copy=False)
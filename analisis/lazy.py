@@ -0,0 +1,445 @@
+"""Backend perezoso (DuckDB) para integración y agregación fuera de memoria.
+
+El backend por defecto es pandas (`pipeline.run_pipeline`): cada paso materializa
+su resultado completo. Con el backend ``duckdb`` los mismos pasos —nombres
+normalizados, tipos según `schema.RULES`, encabezados repetidos, los tres joins y
+las derivadas `subtotal_calc`, `desvio_importe`, `anio`, `mes`— se declaran como
+vistas SQL sobre los CSV originales (`LazyPlan`) y DuckDB los ejecuta como un único
+plan:
+
+- projection pushdown: cada consulta lee sólo las columnas que usa (el cubo no
+  toca `nombre_producto`, `email`, ...);
+- predicate pushdown: los filtros por mes, categoría, etc. se aplican en el escaneo;
+- spill a disco: joins y agregaciones que no entran en `memory_limit` usan
+  `temp_directory`.
+
+A pandas sólo llegan las dimensiones (chicas), las columnas del cubo en lotes de
+`batch_rows` filas y los totales por ticket ya agregados en SQL. El detalle y el
+integrado limpios se escriben con `COPY` sin pasar por pandas.
+"""
+import os
+import threading
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # el backend es opcional: sin duckdb sólo queda pandas
+    duckdb = None
+
+from .cube import LINE_MEASURES, QUANTILE_MEASURES, CubeBuilder, cube_dims, ticket_filters
+from .dates import DMY, MDY, SAMPLE_SIZE, SERIAL, SERIAL_RANGE, UNIX, YYYYMMDD, detect_date_format
+from .pipeline import (
+    CLEAN_FILES, INTEGRATED_FILE, KEY_NAMES, detect_cat_col, detect_total_col, ensure_dir, export_clean,
+    normalize_names, resolve_keys,
+)
+from .profiling import measure
+from .readers import raw_paths, read_header, sniff_csv
+from .schema import DATE, ID, NUMERIC, TEXT, TEXT_DTYPE, column_kind, detect_date_col
+from .storage import COMPRESSION, clear_table, parse_formats
+
+BACKENDS = ("pandas", "duckdb")
+DEFAULT_BATCH_ROWS = 1_000_000
+SPILL_DIRNAME = ".duckdb_tmp"
+_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"  # mismo valor que escribe pyarrow para nulos
+_CITY_EXTRAS = ("ciudad", "localidad", "provincia")
+_NUMERIC_TYPES = ("BIGINT", "DOUBLE", "INTEGER", "FLOAT", "HUGEINT", "SMALLINT", "TINYINT", "DECIMAL")
+
+def _q(name) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _lit(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _is_numeric_type(sql_type: str) -> bool:
+    return str(sql_type).upper().startswith(_NUMERIC_TYPES)
+
+def available_backends() -> list:
+    return [b for b in BACKENDS if b != "duckdb" or duckdb is not None]
+
+def check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend no soportado: {backend} (opciones: {', '.join(BACKENDS)})")
+    if backend == "duckdb" and duckdb is None:
+        raise ValueError("El backend duckdb requiere duckdb (pip install duckdb)")
+    return backend
+
+class LazyPlan:
+    """Vistas DuckDB `clientes`, `productos`, `ventas`, `detalle` (limpias) e `integrado`.
+
+    Nada se lee al construir el plan salvo el encabezado de cada CSV y un escaneo de
+    las columnas id para decidir entero o texto (igual que `schema.as_id`).
+
+    El plan se comparte entre sesiones (registro de datasets) y una conexión DuckDB no
+    admite consultas concurrentes: después de construirlo, todo uso de `con` (crear una
+    relación, ejecutarla o leer sus lotes) pasa por `_lock`.
+    """
+
+    def __init__(self, data_dir: str, keys: dict = None, schema: dict = None, float_dtype="float64",
+                 memory_limit: str = None, temp_dir: str = None, threads: int = None):
+        check_backend("duckdb")
+        self.paths = raw_paths(data_dir)
+        missing = [k for k, p in self.paths.items() if not os.path.exists(p)]
+        if missing:
+            raise FileNotFoundError(f"Faltan archivos: {', '.join(missing)} en {data_dir}")
+        self._lock = threading.RLock()
+        self.con = duckdb.connect()
+        self.con.execute("SET preserve_insertion_order = false")  # permite ejecutar el plan en streaming
+        if memory_limit:
+            self.con.execute(f"SET memory_limit = {_lit(memory_limit)}")
+        if temp_dir:
+            os.makedirs(temp_dir, exist_ok=True)
+            self.con.execute(f"SET temp_directory = {_lit(temp_dir)}")
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        self.float_type = "FLOAT" if str(float_dtype) == "float32" else "DOUBLE"
+        self.types, self.ids = {}, {}
+        for name in ("clientes", "productos", "ventas", "detalle"):
+            self._register(name, schema)
+        empty = {name: pd.DataFrame(columns=list(cols)) for name, cols in self.types.items()}
+        self.keys = resolve_keys(empty, keys)
+        self._register_integrated()
+
+    # ------------------------- tablas limpias -------------------------
+    def _register(self, name: str, schema: dict = None):
+        path = self.paths[name]
+        dialect = sniff_csv(path)
+        raw_names = read_header(path, dialect)[0]
+        encoding = "utf-8" if dialect["encoding"] == "utf-8-sig" else dialect["encoding"]
+        source = (f"read_csv({_lit(path)}, header = true, delim = {_lit(dialect['sep'])}, quote = '\"', "
+                  f"encoding = {_lit(encoding)}, null_padding = true, strict_mode = false, "
+                  f"auto_type_candidates = ['BIGINT', 'DOUBLE', 'VARCHAR'])")
+        described = self.con.sql(f"DESCRIBE SELECT * FROM {source}").fetchall()
+        # columnas por posición: nombres de pandas (Unnamed: N) → normalizados, sin las Unnamed
+        cols = [(c[0], c[1], raw) for c, raw in zip(described, raw_names) if not str(raw).startswith("Unnamed")]
+        norm = normalize_names([raw for _, _, raw in cols])
+
+        where = "TRUE"
+        if cols and all(t == "VARCHAR" for _, t, _ in cols):
+            # encabezados repetidos dentro del archivo (ver `schema.drop_header_rows`)
+            same = " AND ".join(f"trim({_q(c)}) = {_lit(str(raw).strip())}" for c, _, raw in cols)
+            where = f"COALESCE(NOT ({same}), TRUE)"
+        self.con.execute(f"CREATE OR REPLACE TEMP VIEW {_q('raw_' + name)} AS SELECT * FROM {source} WHERE {where}")
+
+        kinds = {new: column_kind(name, new, schema) for new in norm}
+        integral = self._integral_ids(name, [(c, t) for (c, t, _), new in zip(cols, norm)
+                                             if kinds[new] == ID and t != "BIGINT"])
+        exprs, types = [], {}
+        for (col, sql_type, _), new in zip(cols, norm):
+            fmt = self._date_format(name, col) if kinds[new] == DATE else None
+            expr, out_type = self._typed(_q(col), sql_type, kinds[new], integral.get(col), fmt)
+            exprs.append(f"{expr} AS {_q(new)}")
+            types[new] = out_type
+        self.con.execute(f"CREATE OR REPLACE TEMP VIEW {_q(name)} AS SELECT {', '.join(exprs)} "
+                         f"FROM {_q('raw_' + name)}")
+        self.types[name] = types
+        self.ids[name] = [new for new in norm if kinds[new] == ID]
+
+    def _integral_ids(self, name: str, cols: list) -> dict:
+        """Para cada id no entero en el CSV: True si todos sus valores son números enteros."""
+        if not cols:
+            return {}
+        checks = []
+        for col, _ in cols:
+            text, num = f"trim(CAST({_q(col)} AS VARCHAR))", f"TRY_CAST(trim(CAST({_q(col)} AS VARCHAR)) AS DOUBLE)"
+            checks.append(f"count({text}) = count({num}) AND COALESCE(bool_and({num} = round({num})), TRUE)")
+        row = self.con.sql(f"SELECT {', '.join(checks)} FROM {_q('raw_' + name)}").fetchone()
+        return {col: bool(ok) for (col, _), ok in zip(cols, row)}
+
+    def _date_format(self, name: str, col: str):
+        """Formato de fecha detectado sobre una muestra de la columna (ver `dates.detect_date_format`)."""
+        sample = self.con.sql(f"SELECT {_q(col)} FROM {_q('raw_' + name)} WHERE {_q(col)} IS NOT NULL "
+                              f"LIMIT {SAMPLE_SIZE}").arrow().read_all().column(0).to_pandas()
+        return detect_date_format(sample)
+
+    @staticmethod
+    def _date_expr(col: str, numeric: bool, fmt):
+        """Como `dates.decode_dates` con el formato `fmt` ya detectado."""
+        num = f"CAST({col} AS DOUBLE)" if numeric else f"TRY_CAST(trim({col}) AS DOUBLE)"
+        if fmt == SERIAL:
+            return (f"CASE WHEN {num} >= {SERIAL_RANGE[0]} AND {num} < {SERIAL_RANGE[1]} THEN TIMESTAMP '1899-12-30' "
+                    f"+ to_microseconds(CAST(round({num} * 86400000000) AS BIGINT)) END")
+        if fmt == YYYYMMDD:
+            return f"try_strptime(CAST(CAST({num} AS BIGINT) AS VARCHAR), '%Y%m%d')"
+        if fmt == UNIX:
+            return f"make_timestamp(CAST({num} * 1000000 AS BIGINT))"
+        if numeric or fmt is None:
+            return "CAST(NULL AS TIMESTAMP)"
+        if fmt in (DMY, MDY):
+            d, m = ("%d", "%m") if fmt == DMY else ("%m", "%d")
+            formats = ", ".join(_lit(f"{d}/{m}/{rest}") for rest in ("%Y", "%Y %H:%M", "%Y %H:%M:%S", "%y"))
+            return f"try_strptime(regexp_replace(trim({col}), '[.-]', '/', 'g'), [{formats}])"
+        return f"TRY_CAST(trim({col}) AS TIMESTAMP)"
+
+    def _typed(self, col: str, sql_type: str, kind, integral=None, date_format=None):
+        """(expresión SQL, tipo) equivalente a `schema.type_column` para la columna."""
+        numeric = _is_numeric_type(sql_type)
+        as_double = f"CAST({col} AS DOUBLE)" if numeric else f"TRY_CAST(trim({col}) AS DOUBLE)"
+        if kind == ID:
+            if sql_type == "BIGINT":
+                return col, "BIGINT"
+            if integral:
+                return f"CAST({as_double} AS BIGINT)", "BIGINT"
+            return (as_double, "DOUBLE") if numeric else (f"trim({col})", "VARCHAR")
+        if kind == NUMERIC:
+            return f"CAST({as_double} AS {self.float_type})", self.float_type
+        if kind == DATE:
+            return self._date_expr(col, numeric, date_format), "TIMESTAMP"
+        if kind == TEXT or sql_type == "VARCHAR":
+            return f"trim(CAST({col} AS VARCHAR))", "VARCHAR"
+        return col, sql_type
+
+    # ------------------------- integrado -------------------------
+    def _join(self, columns: dict, table: str, alias: str, left_key: str, right_key: str, suffixes, cols=None):
+        """Como `joins.gather_join`: agrega las columnas de `table` con los mismos sufijos."""
+        types = self.types[table]
+        cols = list(types) if cols is None else cols
+        right_cols = [c for c in cols if not (left_key == right_key and c == right_key)]
+        overlap = set(right_cols) & set(columns)
+        out = {}
+        for name, (expr, sql_type) in columns.items():
+            out[f"{name}{suffixes[0]}" if name in overlap else name] = (expr, sql_type)
+        for name in right_cols:
+            out[f"{name}{suffixes[1]}" if name in overlap else name] = (f"{alias}.{_q(name)}", types[name])
+        left_expr, left_type = columns[left_key]
+        right_expr = f"{alias}.{_q(right_key)}"
+        if not (_is_numeric_type(left_type) and _is_numeric_type(types[right_key])):
+            left_expr, right_expr = f"CAST({left_expr} AS VARCHAR)", f"CAST({right_expr} AS VARCHAR)"
+        return out, f"LEFT JOIN {_q(table)} AS {alias} ON {left_expr} = {right_expr}"
+
+    def _register_integrated(self):
+        keys = self.keys
+        columns = {c: (f"d.{_q(c)}", t) for c, t in self.types["detalle"].items()}
+        columns, join_p = self._join(columns, "productos", "p", keys["det_prod_key"], keys["prod_key"], ("", "_prod"))
+        columns, join_v = self._join(columns, "ventas", "v", keys["det_venta_key"], keys["venta_key"], ("_x", "_y"))
+        joins = [join_p, join_v]
+        cli_key_det, cli_key_cli = keys.get("cli_key_det"), keys.get("cli_key_cli")
+        if cli_key_det and cli_key_cli and cli_key_det in columns and cli_key_cli in self.types["clientes"]:
+            extras = [c for c in _CITY_EXTRAS if c in self.types["clientes"]][:1]
+            columns, join_c = self._join(columns, "clientes", "c", cli_key_det, cli_key_cli, ("", "_cli"),
+                                         [cli_key_cli] + extras)
+            joins.append(join_c)
+
+        def num(c):
+            return f"TRY_CAST({columns[c][0]} AS DOUBLE)"
+
+        derived = {}
+        if {"cantidad", "precio_unitario"}.issubset(columns):
+            derived["subtotal_calc"] = (f"{num('cantidad')} * {num('precio_unitario')}", "DOUBLE")
+        if "importe" in columns and "subtotal_calc" in derived:
+            derived["desvio_importe"] = (f"{num('importe')} - ({derived['subtotal_calc'][0]})", "DOUBLE")
+        fecha_col = detect_date_col(columns)
+        if fecha_col:
+            fecha = f"TRY_CAST({columns[fecha_col][0]} AS TIMESTAMP)"
+            # mismas columnas que la dimensión calendario de `dates` (semana ISO, lunes = 0)
+            derived["anio"] = (f"CAST(year({fecha}) AS SMALLINT)", "SMALLINT")
+            derived["mes"] = (f"COALESCE(strftime({fecha}, '%Y-%m'), 'NaT')", "VARCHAR")
+            derived["mes_num"] = (f"CAST(month({fecha}) AS TINYINT)", "TINYINT")
+            derived["semana"] = (f"CAST(weekofyear({fecha}) AS TINYINT)", "TINYINT")
+            derived["dia_semana"] = (f"CAST(isodow({fecha}) - 1 AS TINYINT)", "TINYINT")
+        columns.update(derived)
+        select = ", ".join(f"{expr} AS {_q(name)}" for name, (expr, _) in columns.items())
+        self.con.execute(f"CREATE OR REPLACE TEMP VIEW integrado AS SELECT {select} "
+                         f"FROM detalle AS d {' '.join(joins)}")
+        self.types["integrado"] = {name: t for name, (_, t) in columns.items()}
+
+    def _sql(self, sql: str):
+        with self._lock:
+            return self.con.sql(sql)
+
+    def _execute(self, sql: str):
+        with self._lock:
+            self.con.execute(sql)
+
+    # ------------------------- consultas -------------------------
+    def columns(self, table: str) -> list:
+        return list(self.types[table])
+
+    def where(self, table: str = "integrado", filters: dict = None, date_range=None) -> str:
+        """Condición SQL para `dim=[valores]` y un rango de fechas inclusive (días completos)."""
+        conds = []
+        for dim, values in (filters or {}).items():
+            if values and dim in self.types[table]:
+                conds.append(f"CAST({_q(dim)} AS VARCHAR) IN ({', '.join(_lit(v) for v in values)})")
+        fecha_col = detect_date_col(self.types[table])
+        if date_range is not None and fecha_col:
+            start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]).normalize() + pd.Timedelta(days=1)
+            conds.append(f"{_q(fecha_col)} >= TIMESTAMP {_lit(start)} AND {_q(fecha_col)} < TIMESTAMP {_lit(end)}")
+        return " AND ".join(conds) or "TRUE"
+
+    def select(self, table: str = "integrado", columns=None, filters: dict = None, date_range=None, limit=None):
+        """Relación DuckDB perezosa con sólo `columns` y las filas que cumplen los filtros."""
+        columns = self.columns(table) if columns is None else [c for c in columns if c in self.types[table]]
+        sql = f"SELECT {', '.join(_q(c) for c in columns)} FROM {_q(table)} WHERE {self.where(table, filters, date_range)}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self._sql(sql)
+
+    def explain(self, relation) -> str:
+        """Plan físico (para verificar qué columnas y filtros llegan a cada escaneo)."""
+        with self._lock:
+            return self.con.sql(f"EXPLAIN {relation.sql_query()}").fetchall()[0][1]
+
+    def to_pandas(self, relation, table: str = None) -> pd.DataFrame:
+        """Resultado como DataFrame con los mismos dtypes que el camino pandas."""
+        with self._lock:
+            df = relation.arrow().read_all().to_pandas()
+        return self._pandas_dtypes(df, table)
+
+    def _pandas_dtypes(self, df: pd.DataFrame, table: str = None) -> pd.DataFrame:
+        ids, types = self.ids.get(table, []), self.types.get(table, {})
+        for col in df.columns:
+            text = df[col].dtype == object or isinstance(df[col].dtype, pd.StringDtype)
+            if col in ids and text:
+                df[col] = df[col].astype(TEXT_DTYPE).astype("category")
+            elif text:
+                df[col] = df[col].astype(TEXT_DTYPE)
+            elif col in ids and types.get(col) == "BIGINT" and df[col].isna().any():
+                df[col] = df[col].astype("Int64")
+        return df
+
+    def fetch(self, table: str, columns=None, filters: dict = None, date_range=None, limit=None) -> pd.DataFrame:
+        return self.to_pandas(self.select(table, columns, filters, date_range, limit), table)
+
+    def batches(self, relation, table: str = None, batch_rows: int = DEFAULT_BATCH_ROWS):
+        """DataFrames de a `batch_rows` filas (el resultado nunca se materializa entero).
+
+        La conexión queda tomada hasta agotar (o cerrar) el generador.
+        """
+        with self._lock:
+            reader = relation.arrow(batch_rows) if batch_rows else relation.arrow()
+            for batch in reader:
+                if batch.num_rows:
+                    yield self._pandas_dtypes(batch.to_pandas(), table)
+
+    # ------------------------- cubo -------------------------
+    def cube(self, filters: dict = None, date_range=None, sample_size: int = 20_000,
+             batch_rows: int = DEFAULT_BATCH_ROWS, **builder_opts):
+        """Cubo del Paso 3 (misma lógica que `cube.build_cube`) leyendo sólo sus columnas."""
+        cols = self.types["integrado"]
+        cat_col = detect_cat_col(pd.DataFrame(columns=list(cols)))
+        ventas_cols = pd.DataFrame(columns=list(self.types["ventas"]))
+        total_col = detect_total_col(ventas_cols)
+        builder = CubeBuilder(cube_dims(cols, cat_col), sample_size=sample_size, **builder_opts)
+        measures = [m for m in dict.fromkeys(LINE_MEASURES + QUANTILE_MEASURES) if m in cols]
+        # los tickets se eligen sin los filtros de línea (ver `cube.ticket_filters`)
+        where = self.where("integrado", ticket_filters(filters or {}, builder.ticket_dims), date_range)
+        for chunk in self.batches(self.select("integrado", builder.dims + measures, filters, date_range),
+                                  "integrado", batch_rows):
+            builder.update(chunk)
+
+        det_key, venta_key = self.keys["det_venta_key"], self.keys["venta_key"]
+        attrs = ", ".join(f"any_value({_q(d)}) AS {_q(d)}" for d in builder.ticket_dims)
+        base_col = "importe" if "importe" in cols else ("subtotal_calc" if "subtotal_calc" in cols else None)
+        if total_col:
+            # los tickets de la selección, con su total tomado de ventas
+            sql = (f"WITH sel AS (SELECT {_q(det_key)} AS k{', ' + attrs if attrs else ''} FROM integrado "
+                   f"WHERE {where} AND {_q(det_key)} IS NOT NULL GROUP BY {_q(det_key)}) "
+                   f"SELECT v.{_q(total_col)} AS total_ticket{''.join(f', sel.{_q(d)}' for d in builder.ticket_dims)} "
+                   f"FROM ventas AS v LEFT JOIN sel ON CAST(v.{_q(venta_key)} AS VARCHAR) = CAST(sel.k AS VARCHAR)"
+                   + ("" if where == "TRUE" else " WHERE sel.k IS NOT NULL"))
+        elif base_col:
+            sql = (f"SELECT COALESCE(sum({_q(base_col)}), 0) AS total_ticket{', ' + attrs if attrs else ''} "
+                   f"FROM integrado WHERE {where} AND {_q(det_key)} IS NOT NULL GROUP BY {_q(det_key)}")
+        else:
+            sql = None
+        tickets = self.to_pandas(self._sql(sql)) if sql else pd.DataFrame({"total_ticket": []})
+        builder.set_tickets(tickets["total_ticket"], tickets)
+        return builder.build({"cat_col": cat_col, "total_col": total_col})
+
+    # ------------------------- exportación -------------------------
+    def copy_csv(self, table: str, path: str) -> str:
+        """CSV con el formato de `DataFrame.to_csv`: una columna de fechas cuyas horas son todas
+        00:00 se escribe sin la hora (DuckDB la escribiría siempre)."""
+        types = self.types[table]
+        stamps = [c for c, t in types.items() if t.startswith("TIMESTAMP")]
+        dates = set()
+        if stamps:
+            checks = ", ".join(f"COALESCE(bool_and(CAST({_q(c)} AS TIME) = TIME '00:00:00'), TRUE)" for c in stamps)
+            with self._lock:
+                row = self.con.sql(f"SELECT {checks} FROM {_q(table)}").fetchone()
+            dates = {c for c, midnight in zip(stamps, row) if midnight}
+        cols = ", ".join(f"strftime({_q(c)}, '%Y-%m-%d') AS {_q(c)}" if c in dates else _q(c) for c in types)
+        self._execute(f"COPY (SELECT {cols} FROM {_q(table)}) TO {_lit(path)} (HEADER, DELIMITER ',')")
+        return path
+
+    def copy_parquet(self, table: str, output_dir: str) -> str:
+        """Como `storage.write_table`: `parquet/<tabla>/anio=…/mes=…/part-N.parquet`, zstd."""
+        path = clear_table(output_dir, table)
+        cols = ", ".join(_q(c) for c in self.types[table] if c not in ("anio", "mes"))  # las particiones van al final
+        if table == "integrado" and "mes" in self.types[table]:
+            source = f"SELECT {cols}, anio, mes FROM integrado"
+        elif table == "detalle" and detect_date_col(self.types["ventas"]):
+            # el detalle se particiona por la fecha de su venta (ver `storage.detalle_partitions`)
+            fecha, key = _q(detect_date_col(self.types["ventas"])), _q(self.keys["venta_key"])
+            source = (f"SELECT d.*, p.anio, p.mes FROM {_q(table)} AS d LEFT JOIN "
+                      f"(SELECT {key} AS k, any_value(year({fecha})) AS anio, "
+                      f"any_value(COALESCE(strftime({fecha}, '%Y-%m'), 'NaT')) AS mes FROM ventas GROUP BY {key}) AS p "
+                      f"ON CAST(d.{_q(self.keys['det_venta_key'])} AS VARCHAR) = CAST(p.k AS VARCHAR)")
+        else:
+            self._execute(f"COPY (SELECT * FROM {_q(table)}) TO {_lit(os.path.join(path, 'part-0.parquet'))} "
+                             f"(FORMAT parquet, COMPRESSION {COMPRESSION})")
+            return path
+        self._execute(
+            f"COPY (SELECT * EXCLUDE (anio, mes), COALESCE(CAST(anio AS VARCHAR), {_lit(_NULL_PARTITION)}) AS anio, "
+            f"COALESCE(mes, {_lit(_NULL_PARTITION)}) AS mes FROM ({source})) TO {_lit(path)} "
+            f"(FORMAT parquet, COMPRESSION {COMPRESSION}, PARTITION_BY (anio, mes), OVERWRITE_OR_IGNORE, "
+            f"FILENAME_PATTERN 'part-{{i}}')")
+        return path
+
+def lazy_pipeline(data_dir: str, output_dir: str, keys: dict = None, write_integrated: bool = False,
+                  sample_size: int = 50_000, schema: dict = None, float_dtype="float64", track_memory: bool = False,
+                  formats=("csv",), memory_limit: str = None, temp_dir: str = None, threads: int = None,
+                  batch_rows: int = DEFAULT_BATCH_ROWS) -> dict:
+    """Limpieza, exportación y cubo con el backend DuckDB; devuelve lo mismo que `stream_pipeline`.
+
+    El integrado no se materializa (``"integrado": None``): el Paso 3 trabaja sobre el
+    cubo y, para filtros que no caen en meses completos, sobre `"plan"` (`LazyPlan`).
+    Los CSV se leen con el encoding detectado en el prefijo; si más adelante aparece un
+    byte inválido se informa como ValueError (el backend pandas sí reintenta en latin-1).
+    """
+    check_backend("duckdb")
+    formats = parse_formats(formats)
+    ensure_dir(output_dir)
+    temp_dir = temp_dir or os.path.join(output_dir, SPILL_DIRNAME)
+    report = []
+    try:
+        with measure(report, "plan", track_memory):
+            plan = LazyPlan(data_dir, keys, schema, float_dtype, memory_limit, temp_dir, threads)
+        with measure(report, "load+type:dims", track_memory):
+            tables = {name: plan.fetch(name) for name in ("clientes", "productos", "ventas")}
+        with measure(report, "export", track_memory):
+            written = export_clean(tables, output_dir, formats)
+            out_paths = written["csv"]
+            targets = ["detalle"] + (["integrado"] if write_integrated or "parquet" in formats else [])
+            for name in targets:
+                if "csv" in formats and (name == "detalle" or write_integrated):
+                    fname = CLEAN_FILES.get(name, INTEGRATED_FILE)
+                    out_paths[name] = plan.copy_csv(name, os.path.join(output_dir, fname))
+                if "parquet" in formats:
+                    written["parquet"][name] = plan.copy_parquet(name, output_dir)
+        with measure(report, "aggregate", track_memory) as rows:
+            cube = plan.cube(sample_size=sample_size, batch_rows=batch_rows)
+            cube.save(output_dir)
+            rows.update(rows_in=cube.meta["rows"], rows_out=len(cube.cells))
+    except duckdb.Error as e:
+        # p.ej. un byte no UTF-8 más allá del prefijo detectado: pandas reintenta en latin-1, DuckDB no
+        raise ValueError(f"DuckDB no pudo procesar los CSV: {e}") from e
+
+    return {
+        **tables,
+        "detalle": plan.fetch("detalle", limit=100),
+        "integrado": None,
+        "streaming": True,
+        "backend": "duckdb",
+        "plan": plan,
+        "cube": cube,
+        "index": None,
+        "rows": cube.meta["rows"],
+        "cat_col": cube.cat_col,
+        "total_col": cube.meta.get("total_col"),
+        "keys": {k: plan.keys.get(k) for k in KEY_NAMES},
+        "paths": out_paths,
+        "parquet": written["parquet"],
+        "report": report,
+    }
@@ -0,0 +1,48 @@
+"""Pool de workers para la carga y la tipificación (hilos o procesos).
+
+`workers=None` usa todos los núcleos (`os.cpu_count()`); `workers=1` ejecuta todo en
+el hilo actual, exactamente como el camino secuencial. Los resultados se combinan
+siempre en el orden en que se enviaron las tareas, no en el que terminan, de modo
+que la salida es la misma con cualquier cantidad de workers.
+"""
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+POOL_KINDS = ("thread", "process")
+
+def resolve_workers(workers: int = None) -> int:
+    if workers is None:
+        return os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f"La cantidad de workers debe ser >= 1 (recibido: {workers})")
+    return int(workers)
+
+class _InlineExecutor(Executor):
+    """Ejecuta cada tarea al enviarla (workers=1): sin hilos ni serialización."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+@contextmanager
+def worker_pool(workers: int = None, kind: str = "thread"):
+    """Executor con `workers` hilos o procesos (`kind`), o uno en línea si `workers` es 1.
+
+    Con procesos las funciones y argumentos deben poder serializarse (funciones de
+    módulo, rutas, DataFrames); conviene para el parseo de CSV, que en hilos queda
+    limitado por el GIL durante la conversión de tipos.
+    """
+    if kind not in POOL_KINDS:
+        raise ValueError(f"Tipo de pool no soportado: {kind} (opciones: {', '.join(POOL_KINDS)})")
+    workers = resolve_workers(workers)
+    if workers == 1:
+        yield _InlineExecutor()
+        return
+    pool_cls = ThreadPoolExecutor if kind == "thread" else ProcessPoolExecutor
+    with pool_cls(max_workers=workers) as pool:
+        yield pool
@@ -0,0 +1,317 @@
+"""Pipeline sin UI: normalización → tipificación → exportación → integración → derivadas.
+
+Es el mismo flujo que ejecuta la app de Streamlit en el Paso 2, pero las columnas
+clave llegan como parámetro (dict `keys`) en lugar de leerse de la barra lateral,
+de modo que puede correr en batch sin importar Streamlit.
+"""
+import os
+import unicodedata
+
+import pandas as pd
+
+from .cube import build_cube
+from .dates import calendar_parts, month_label
+from .filters import build_filter_index
+from .joins import dims_are_unique, integrate_gather
+from .parallel import resolve_workers, worker_pool
+from .profiling import measure, table_rows
+from .readers import load_raw_data
+from .reconcile import reconcile_tables
+from .schema import TEXT_DTYPE, apply_schema, column_kind, detect_date_col, drop_header_rows, type_column
+from .storage import detalle_partitions, parse_formats, ventas_partitions, write_table
+
+KEY_NAMES = ("det_prod_key", "prod_key", "det_venta_key", "venta_key", "cli_key_det", "cli_key_cli")
+CLEAN_FILES = {
+    "clientes": "clientes_limpio.csv",
+    "productos": "productos_limpio.csv",
+    "ventas": "ventas_limpio.csv",
+    "detalle": "detalle_limpio.csv",
+}
+INTEGRATED_FILE = "integrado_limpio.csv"
+CALENDAR_COLS = ("anio", "mes_id", "mes_num", "semana", "dia_semana")  # derivadas de la fecha (mes_id → mes)
+
+# ========================= UTILIDADES BASE =========================
+def _strip_accents(s: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+def normalize_names(columns) -> list:
+    """Normaliza nombres: minúsculas, sin tildes, espacios→'_'."""
+    return list(
+        pd.Series(list(columns), dtype=object)
+        .astype(str)
+        .map(_strip_accents)
+        .str.strip()
+        .str.lower()
+        .str.replace(r"\s+", "_", regex=True)
+    )
+
+def ensure_dir(path: str):
+    os.makedirs(path, exist_ok=True)
+
+def find_key(df_or_cols, candidates=(), contains_all=()):
+    """Encuentra columna clave por candidatos exactos o por tokens contenidos."""
+    cols = list(getattr(df_or_cols, "columns", df_or_cols))
+    for c in candidates:
+        if c in cols:
+            return c
+    hits = [c for c in cols if all(tok in c for tok in contains_all)]
+    if len(hits) == 1:
+        return hits[0]
+    if len(hits) > 1:
+        return sorted(hits, key=len, reverse=True)[0]
+    return None
+
+# ========================= CLAVES =========================
+def default_keys(clientes_cols, productos_cols, ventas_cols, detalle_cols) -> dict:
+    """Detección automática de columnas clave (sobre nombres ya normalizados).
+
+    Las claves de cliente quedan en None si `clientes` no tiene un ID reconocible;
+    `cli_key_det` se busca en el detalle y, si no está, en ventas (el integrado trae
+    ambas); queda en None si ninguna de las dos trae ID de cliente.
+    """
+    detalle_cols, productos_cols = list(detalle_cols), list(productos_cols)
+    ventas_cols, clientes_cols = list(ventas_cols), list(clientes_cols)
+    cli_key_cli = find_key(clientes_cols, ("id_cliente", "cliente_id"), ("cliente", "id"))
+    return {
+        "det_prod_key": find_key(detalle_cols, ("id_producto", "producto_id"), ("producto", "id")) or detalle_cols[0],
+        "prod_key": find_key(productos_cols, ("id_producto", "producto_id"), ("producto", "id")) or productos_cols[0],
+        "det_venta_key": find_key(detalle_cols, ("id_venta", "venta_id"), ("venta", "id"))
+                         or detalle_cols[min(1, len(detalle_cols) - 1)],
+        "venta_key": find_key(ventas_cols, ("id_venta", "venta_id"), ("venta", "id")) or ventas_cols[0],
+        "cli_key_det": (find_key(detalle_cols, ("id_cliente", "cliente_id"), ("cliente", "id"))
+                        or find_key(ventas_cols, ("id_cliente", "cliente_id"), ("cliente", "id"))) if cli_key_cli else None,
+        "cli_key_cli": cli_key_cli,
+    }
+
+def resolve_keys(tables: dict, keys: dict = None) -> dict:
+    """Completa `keys` con la detección automática y valida que las columnas existan."""
+    resolved = default_keys(
+        tables["clientes"].columns, tables["productos"].columns,
+        tables["ventas"].columns, tables["detalle"].columns,
+    )
+    unknown = set(keys or ()) - set(KEY_NAMES)
+    if unknown:
+        raise ValueError(f"Claves desconocidas en el mapeo: {', '.join(sorted(unknown))}")
+    resolved.update({k: v for k, v in (keys or {}).items()})
+    owners = {
+        "det_prod_key": ("detalle",), "prod_key": ("productos",), "det_venta_key": ("detalle",),
+        "venta_key": ("ventas",), "cli_key_det": ("detalle", "ventas"), "cli_key_cli": ("clientes",),
+    }
+    for name, owner in owners.items():
+        col = resolved[name]
+        if col is not None and not any(col in tables[t].columns for t in owner):
+            raise ValueError(f"La columna '{col}' ({name}) no existe en {' ni '.join(owner)}")
+    return resolved
+
+# ========================= LIMPIEZA =========================
+def prepare_tables(clientes, productos, ventas, detalle, schema: dict = None, float_dtype="float64",
+                   report: list = None, track_memory: bool = False, workers: int = 1) -> dict:
+    """Pasos 1–5: normaliza nombres y tipifica cada columna una sola vez según el esquema.
+
+    Trabaja sobre los DataFrames recibidos (no hace `df.copy()`): los nombres se
+    reemplazan en el lugar y cada columna se sustituye por su versión tipificada.
+    `schema` permite forzar tipos por tabla: ``{"ventas": {"id_cliente": "id"}}``.
+    Con `workers` > 1 las columnas de todas las tablas se tipifican a la vez en un
+    pool de hilos (un único paso "type" en el reporte).
+    """
+    report = [] if report is None else report
+    tables = {"clientes": clientes, "productos": productos, "ventas": ventas, "detalle": detalle}
+
+    # 1) Normalizar columnas (y descartar encabezados repetidos dentro del archivo)
+    with measure(report, "normalize", track_memory, rows_in=table_rows(*tables.values())) as rows:
+        for df in tables.values():
+            drop_header_rows(df)
+            df.columns = normalize_names(df.columns)
+        rows["rows_out"] = table_rows(*tables.values())
+
+    # 2–5) Trimming de strings, claves y conversión de números/fechas en una pasada
+    if resolve_workers(workers) > 1:
+        with measure(report, "type", track_memory, rows_in=table_rows(*tables.values())) as rows:
+            type_tables_parallel(tables, schema, float_dtype, workers)
+            rows["rows_out"] = rows["rows_in"]
+        return tables
+    for name, df in tables.items():
+        with measure(report, f"type:{name}", track_memory, rows_in=len(df)) as rows:
+            apply_schema(df, name, schema, float_dtype)
+            rows["rows_out"] = len(df)
+    return tables
+
+def type_tables_parallel(tables: dict, schema: dict = None, float_dtype="float64", workers: int = None):
+    """Como `apply_schema` sobre cada tabla, pero con una tarea por columna en un pool de hilos.
+
+    Cada columna se tipifica completa (un id categórico o entero se decide sobre toda
+    la columna, igual que en el camino secuencial); las tablas grandes se envían primero.
+    """
+    with worker_pool(workers, "thread") as pool:
+        jobs = [(name, col, pool.submit(type_column, df[col], column_kind(name, col, schema), float_dtype))
+                for name, df in sorted(tables.items(), key=lambda kv: -len(kv[1]))
+                for col in df.columns]
+        for name, col, job in jobs:
+            tables[name][col] = job.result()
+    return tables
+
+def export_clean(tables: dict, output_dir: str, formats=("csv",), keys: dict = None) -> dict:
+    """Paso 6: guarda las tablas limpias presentes en CSV y/o Parquet particionado (ver `storage`).
+
+    Devuelve ``{"csv": {tabla: ruta}, "parquet": {tabla: carpeta}}``. Con `keys`, el
+    detalle se particiona por la fecha de su venta.
+    """
+    ensure_dir(output_dir)
+    paths = {"csv": {}, "parquet": {}}
+    for name, fname in CLEAN_FILES.items():
+        if name not in tables:
+            continue
+        if "csv" in formats:
+            paths["csv"][name] = os.path.join(output_dir, fname)
+            tables[name].to_csv(paths["csv"][name], index=False, encoding="utf-8")
+        if "parquet" in formats:
+            paths["parquet"][name] = write_table(tables[name], output_dir, name,
+                                                 _partitions(tables, name, keys))
+    return paths
+
+def _partitions(tables: dict, name: str, keys: dict = None):
+    if name == "ventas":
+        return ventas_partitions(tables["ventas"])
+    if name == "detalle" and keys and "ventas" in tables:
+        return detalle_partitions(tables["detalle"], tables["ventas"], keys["det_venta_key"], keys["venta_key"])
+    return None
+
+def _align_key_pair(left: pd.DataFrame, lkey: str, right: pd.DataFrame, rkey: str):
+    """Si las dos claves no comparten tipo (p.ej. entero vs categórica), ambas pasan a texto."""
+    lt, rt = left[lkey].dtype, right[rkey].dtype
+    if pd.api.types.is_numeric_dtype(lt) and pd.api.types.is_numeric_dtype(rt):
+        return left, right
+    if lt == rt:
+        return left, right
+    left = left.assign(**{lkey: left[lkey].astype(TEXT_DTYPE)})
+    right = right.assign(**{rkey: right[rkey].astype(TEXT_DTYPE)})
+    return left, right
+
+def integrate(tables: dict, keys: dict) -> pd.DataFrame:
+    """Paso 7: detalle + productos + ventas [+ clientes].
+
+    Con claves únicas en las dimensiones (caso normal) se usa el gather indexado de
+    `joins`; si alguna dimensión repite claves se conserva el merge encadenado, que
+    multiplica filas igual que siempre.
+    """
+    cli_pair = [(tables["clientes"], keys["cli_key_cli"])] if keys.get("cli_key_cli") else []
+    if dims_are_unique((tables["productos"], keys["prod_key"]), (tables["ventas"], keys["venta_key"]), *cli_pair):
+        return integrate_gather(tables, keys)
+    return integrate_merge(tables, keys)
+
+def integrate_merge(tables: dict, keys: dict) -> pd.DataFrame:
+    """Paso 7 con `DataFrame.merge` encadenados (camino de referencia)."""
+    clientes = tables["clientes"]
+    detalle, productos = _align_key_pair(tables["detalle"], keys["det_prod_key"], tables["productos"], keys["prod_key"])
+    df = detalle.merge(productos, left_on=keys["det_prod_key"], right_on=keys["prod_key"],
+                       how="left", suffixes=("", "_prod"))
+    df, ventas = _align_key_pair(df, keys["det_venta_key"], tables["ventas"], keys["venta_key"])
+    df = df.merge(ventas, left_on=keys["det_venta_key"], right_on=keys["venta_key"], how="left")
+    cli_key_det, cli_key_cli = keys.get("cli_key_det"), keys.get("cli_key_cli")
+    if cli_key_det and cli_key_cli and cli_key_det in df.columns and cli_key_cli in clientes.columns:
+        extras = [c for c in ("ciudad", "localidad", "provincia") if c in clientes.columns][:1]
+        df, clientes = _align_key_pair(df, cli_key_det, clientes[[cli_key_cli] + extras], cli_key_cli)
+        df = df.merge(clientes, left_on=cli_key_det, right_on=cli_key_cli,
+                      how="left", suffixes=("", "_cli"))
+    return df
+
+def add_derived(df: pd.DataFrame) -> pd.DataFrame:
+    """Paso 8: subtotal_calc, desvio_importe y atributos de calendario de la fecha.
+
+    `anio`, `mes_num`, `semana` y `dia_semana` son enteros tomados de la dimensión
+    calendario (ver `dates.calendar`); `mes` es la etiqueta 'AAAA-MM' de cada mes.
+    """
+    if {"cantidad", "precio_unitario"}.issubset(df.columns):
+        df["subtotal_calc"] = (pd.to_numeric(df["cantidad"], errors="coerce")
+                               * pd.to_numeric(df["precio_unitario"], errors="coerce"))
+    if {"importe", "subtotal_calc"}.issubset(df.columns):
+        df["desvio_importe"] = pd.to_numeric(df["importe"], errors="coerce") - df["subtotal_calc"]
+
+    # fechas derivadas: un join por nº de día contra el calendario precalculado
+    fecha_col = detect_date_col(df.columns)
+    if fecha_col:
+        parts = calendar_parts(df[fecha_col], CALENDAR_COLS)
+        df["anio"], df["mes"] = parts["anio"], month_label(parts["mes_id"])
+        for col in CALENDAR_COLS[2:]:
+            df[col] = parts[col]
+    return df
+
+def detect_cat_col(df: pd.DataFrame):
+    """Columna de categoría flexible."""
+    return next((c for c in df.columns if "categoria" in c), None)
+
+def detect_total_col(ventas: pd.DataFrame):
+    """Detección avanzada de columna total en ventas."""
+    total_candidates = ["total", "importe_total", "monto_total", "monto", "total_venta", "total_ticket", "total_factura"]
+    return next((c for c in ventas.columns if any(tc in c for tc in total_candidates)), None)
+
+def clean_data(clientes, productos, ventas, detalle, keys: dict = None, output_dir: str = "data_limpios",
+               schema: dict = None, float_dtype="float64", track_memory: bool = False,
+               with_cube: bool = True, formats=("csv",), workers: int = 1) -> dict:
+    """Limpieza + exportación + integración completa. `keys` puede ser parcial (el resto se autodetecta).
+
+    Los DataFrames de entrada se modifican en el lugar. `report` del resultado lista
+    duración, CPU, filas de entrada/salida y memoria de cada paso (ver
+    `profiling.measure`). Con `with_cube` se precalcula el cubo de agregados del Paso 3
+    (guardado en `output_dir/cubo/`) y el índice de filtros sobre el integrado (ver
+    `filters.FilterIndex`). `formats` elige CSV y/o Parquet particionado por anio/mes
+    (en Parquet también se guarda el integrado).
+    `workers` > 1 (o None = todos los núcleos) tipifica las tablas en paralelo.
+    `reconciliation` trae los controles de `reconcile` (importes, precios, huérfanos, totales).
+    """
+    formats = parse_formats(formats)
+    report = []
+    tables = prepare_tables(clientes, productos, ventas, detalle, schema=schema, float_dtype=float_dtype,
+                            report=report, track_memory=track_memory, workers=workers)
+    keys = resolve_keys(tables, keys)
+    with measure(report, "export", track_memory, rows_in=table_rows(*tables.values())) as rows:
+        paths = export_clean(tables, output_dir, formats, keys)
+        rows["rows_out"] = rows["rows_in"]
+    with measure(report, "merge", track_memory, rows_in=len(tables["detalle"])) as rows:
+        df = integrate(tables, keys)
+        rows["rows_out"] = len(df)
+    with measure(report, "derive", track_memory, rows_in=len(df)) as rows:
+        df = add_derived(df)
+        rows["rows_out"] = len(df)
+    if "parquet" in formats:
+        with measure(report, "export:integrado", track_memory, rows_in=len(df)) as rows:
+            paths["parquet"]["integrado"] = write_table(df, output_dir, "integrado")
+            rows["rows_out"] = len(df)
+    cat_col, total_col = detect_cat_col(df), detect_total_col(tables["ventas"])
+    with measure(report, "reconcile", track_memory, rows_in=len(tables["detalle"])) as rows:
+        reconciliation = reconcile_tables(tables, keys, total_col)
+        rows["exceptions"] = sum(c["excepciones"] for c in reconciliation["checks"])
+    cube, index = None, None
+    if with_cube:
+        with measure(report, "aggregate", track_memory, rows_in=len(df)) as rows:
+            cube = build_cube(df, cat_col, keys, tables["ventas"], total_col)
+            cube.save(output_dir)
+            rows["rows_out"] = len(cube.cells)
+        with measure(report, "index", track_memory, rows_in=len(df)):
+            index = build_filter_index(df, cat_col)
+    return {
+        **tables,
+        "integrado": df,
+        "cube": cube,
+        "index": index,
+        "paths": paths["csv"],
+        "parquet": paths["parquet"],
+        "cat_col": cat_col,
+        "total_col": total_col,
+        "reconciliation": reconciliation,
+        "keys": keys,
+        "report": report,
+    }
+
+def run_pipeline(data_dir: str, output_dir: str, keys: dict = None, cache=None, write_integrated: bool = True,
+                 workers: int = None, pool: str = "thread", **clean_opts) -> dict:
+    """Carga los CSV originales de `data_dir`, limpia, integra y escribe las salidas en `output_dir`.
+
+    La carga y la tipificación usan `workers` hilos o procesos (`pool`; None = todos los núcleos).
+    """
+    raw = load_raw_data(data_dir, cache=cache, workers=workers, pool=pool)
+    cleaned = clean_data(*raw, keys=keys, output_dir=output_dir, workers=workers, **clean_opts)
+    if write_integrated and "csv" in parse_formats(clean_opts.get("formats", ("csv",))):
+        cleaned["paths"]["integrado"] = os.path.join(output_dir, INTEGRATED_FILE)
+        cleaned["integrado"].to_csv(cleaned["paths"]["integrado"], index=False, encoding="utf-8")
+    return cleaned
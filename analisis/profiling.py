@@ -0,0 +1,133 @@
+"""Instrumentación por etapa: tiempo, CPU, filas, memoria y (opcional) cProfile.
+
+`measure` envuelve cada paso del pipeline y agrega una entrada al `report`:
+
+    {"step": "merge", "seconds": 0.19, "cpu_seconds": 0.18, "rows_in": 1000000,
+     "rows_out": 1000000, "mem_delta_mb": 212.4}
+
+`rows_in`/`rows_out` (y cualquier otro dato, p.ej. si un gráfico salió de la caché)
+los completa el paso a través del dict que entrega el `with`;
+`mem_delta_mb` es la variación de RSS (barata, siempre disponible en Linux) y
+`peak_mb` el pico de `tracemalloc`, sólo con `track_memory` porque éste frena los
+pasos con muchas asignaciones. El CPU es el del proceso (incluye todos los hilos).
+
+Las entradas se pueden volcar como JSON lines (`write_jsonl`) y una corrida completa
+se puede perfilar con `profiled`, que deja un volcado de pstats.
+
+`listen` registra, para el hilo actual, una función que recibe el inicio y el fin de
+cada `measure` y los avances intermedios que publique un paso largo con `progress`
+(p.ej. cada bloque del streaming). La usa `jobs` para mostrar el progreso de un
+trabajo en segundo plano y cortarlo entre etapas si se cancela.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+_listener = ContextVar("stage_listener", default=None)
+
+def rss_mb():
+    """RSS actual (MB) según /proc; None fuera de Linux."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return round(int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+@contextmanager
+def measure(report: list, step: str, track_memory: bool = False, rows_in: int = None):
+    """Agrega a `report` duración, CPU, filas y memoria del paso (ver el docstring del módulo).
+
+    El `with` entrega un dict donde el paso puede anotar ``rows_in`` / ``rows_out`` u
+    otros campos, que se copian a la entrada.
+    """
+    started_here = track_memory and not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start()
+    if track_memory:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    info = {} if rows_in is None else {"rows_in": rows_in}
+    listener = _listener.get()
+    if listener is not None:
+        listener("start", step, dict(info))
+    rss0 = rss_mb()
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    try:
+        yield info
+    finally:
+        entry = {"step": step, "seconds": round(time.perf_counter() - t0, 4),
+                 "cpu_seconds": round(time.process_time() - cpu0, 4)}
+        entry.update({k: int(v) if k.startswith("rows_") else v for k, v in info.items() if v is not None})
+        rss1 = rss_mb()
+        if rss0 is not None and rss1 is not None:
+            entry["mem_delta_mb"] = round(rss1 - rss0, 1)
+        if track_memory:
+            entry["peak_mb"] = round((tracemalloc.get_traced_memory()[1] - base) / 1024 ** 2, 2)
+        report.append(entry)
+        if started_here:
+            tracemalloc.stop()
+        if listener is not None:
+            listener("end", step, entry)
+
+@contextmanager
+def listen(callback):
+    """`callback(evento, step, datos)` con evento "start", "progress" o "end" para los pasos de este hilo.
+
+    Una excepción de `callback` se propaga desde el paso (así se corta un trabajo cancelado).
+    """
+    token = _listener.set(callback)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+def progress(step: str, **info):
+    """Avance intermedio de un paso largo (filas procesadas, bloque actual…) para quien escuche."""
+    listener = _listener.get()
+    if listener is not None:
+        listener("progress", step, info)
+
+def table_rows(*tables) -> int:
+    """Filas totales de los DataFrames recibidos (None se ignora)."""
+    return sum(len(t) for t in tables if t is not None)
+
+def write_jsonl(report: list, path: str, **context) -> str:
+    """Agrega las entradas de `report` a `path` (una por línea), con `context` y la hora en cada una."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    stamp = datetime.now().isoformat(timespec="seconds")
+    with open(path, "a", encoding="utf-8") as fh:
+        for entry in report:
+            fh.write(json.dumps({"time": stamp, **context, **entry}, ensure_ascii=False, default=str) + "\n")
+    return path
+
+@contextmanager
+def profiled(path: str = None, enabled: bool = True):
+    """Perfila el bloque con cProfile; si hay `path`, guarda el volcado de pstats ahí.
+
+    Entrega el `cProfile.Profile` (o None si no está habilitado) para usar con `top_functions`.
+    """
+    if not enabled:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            profiler.dump_stats(path)
+
+def top_functions(profiler, limit: int = 25, sort: str = "cumulative") -> str:
+    """Resumen de pstats (las `limit` funciones con más tiempo acumulado) como texto."""
+    buf = io.StringIO()
+    pstats.Stats(profiler, stream=buf).strip_dirs().sort_stats(sort).print_stats(limit)
+    return buf.getvalue()
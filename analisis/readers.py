@@ -0,0 +1,214 @@
+"""Lectura robusta de los CSV originales (detección de dialecto en una sola pasada)."""
+import codecs
+import csv
+import io
+import os
+
+import pandas as pd
+
+from .parallel import resolve_workers, worker_pool
+
+SNIFF_BYTES = 64 * 1024  # prefijo acotado que se inspecciona para detectar dialecto
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+def _decode_prefix(raw: bytes, encodings):
+    """Decodifica el prefijo con el primer encoding válido (tolera un multibyte cortado al final)."""
+    for enc in encodings:
+        try:
+            return raw.decode(enc), enc
+        except UnicodeDecodeError as e:
+            if e.start >= len(raw) - 3:  # el corte del prefijo partió un carácter
+                try:
+                    return raw[:e.start].decode(enc), enc
+                except UnicodeDecodeError:
+                    pass
+    return raw.decode("latin-1"), "latin-1"
+
+def _score_sep(lines, sep):
+    """Cantidad de líneas cuyo nº de campos coincide con el modal (> 1); 0 si el separador no aplica."""
+    counts = [len(r) for r in csv.reader(lines, delimiter=sep)]
+    if not counts:
+        return 0
+    modal = max(set(counts), key=counts.count)
+    return counts.count(modal) if modal > 1 else 0
+
+def sniff_csv(path, try_seps=(",", ";", "\t", "|"), encodings=("utf-8", "latin-1"), sample_bytes=SNIFF_BYTES) -> dict:
+    """Detecta BOM, encoding y separador leyendo una sola vez un prefijo acotado del archivo."""
+    with open(path, "rb") as fh:
+        raw = fh.read(sample_bytes)
+    bom, encoding = False, None
+    for mark, enc in _BOMS:
+        if raw.startswith(mark):
+            bom, encoding = True, enc
+            break
+    if encoding:
+        text = raw.decode(encoding, errors="ignore")
+    else:
+        text, encoding = _decode_prefix(raw, encodings)
+
+    lines = text.splitlines()
+    if len(raw) == sample_bytes and len(lines) > 1:
+        lines = lines[:-1]  # la última línea del prefijo puede estar incompleta
+    lines = [ln for ln in lines if ln.strip()][:200]
+
+    scores = [(_score_sep(lines, sep), -i, sep) for i, sep in enumerate(try_seps)]
+    best = max(scores)
+    sep = best[2] if best[0] > 0 else try_seps[0]
+    return {"sep": sep, "encoding": encoding, "bom": bom}
+
+def _drop_unnamed(df: pd.DataFrame) -> pd.DataFrame:
+    return df.loc[:, ~df.columns.astype(str).str.contains(r"^Unnamed")]
+
+def robust_read_csv(path, try_seps=(",", ";", "\t", "|"), encodings=("utf-8", "latin-1"), engine="c") -> pd.DataFrame:
+    """Lectura robusta: detecta dialecto sobre un prefijo y parsea una única vez + elimina Unnamed:*."""
+    dialect = sniff_csv(path, try_seps=try_seps, encodings=encodings)
+    try:
+        df = pd.read_csv(path, sep=dialect["sep"], encoding=dialect["encoding"], engine=engine)
+    except UnicodeDecodeError:
+        # el prefijo era UTF-8 válido pero el resto del archivo no: reintento único en latin-1
+        if dialect["bom"] or dialect["encoding"] == "latin-1":
+            raise
+        df = pd.read_csv(path, sep=dialect["sep"], encoding="latin-1", engine=engine)
+    return _drop_unnamed(df)
+
+RAW_FILES = {
+    "clientes": "clientes99.csv",
+    "productos": "productos99.csv",
+    "ventas": "ventas99.csv",
+    "detalle": "detalle_ventas99.csv",
+}
+
+def raw_paths(base_dir: str) -> dict:
+    """Rutas de los cuatro CSV originales dentro de `base_dir`."""
+    return {name: os.path.join(base_dir, fname) for name, fname in RAW_FILES.items()}
+
+def read_csv_head(path, nrows: int) -> pd.DataFrame:
+    """Primeras `nrows` filas de un CSV (mismo dialecto que robust_read_csv), sin leer el resto."""
+    dialect = sniff_csv(path)
+    df = pd.read_csv(path, sep=dialect["sep"], encoding=dialect["encoding"], nrows=nrows)
+    return _drop_unnamed(df)
+
+# ========================= RANGOS DE BYTES =========================
+BLOCK_BYTES = 64 * 1024 * 1024
+
+def read_header(path, dialect: dict = None):
+    """(columnas, offset donde empiezan los datos) leyendo sólo la primera línea."""
+    dialect = dialect or sniff_csv(path)
+    if dialect["encoding"] == "utf-16":
+        raise ValueError(f"{path}: la lectura por rangos de bytes no admite UTF-16")
+    with open(path, "rb") as fh:
+        line = fh.readline()
+    header = pd.read_csv(io.BytesIO(line), sep=dialect["sep"], encoding=dialect["encoding"], nrows=0)
+    return list(header.columns), len(line)
+
+def iter_byte_range(path, start: int, end: int, columns, dialect: dict, block_bytes: int = BLOCK_BYTES):
+    """DataFrames de las filas entre los offsets `start` y `end` (cortando siempre en fin de línea).
+
+    `start` debe caer al comienzo de una línea (p.ej. el offset de datos de `read_header`
+    o el final de una lectura anterior). No admite campos entre comillas con saltos de línea.
+    """
+    encoding = "utf-8" if dialect["encoding"] == "utf-8-sig" else dialect["encoding"]
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        pos, tail = start, b""
+        while True:
+            chunk = fh.read(min(block_bytes, end - pos)) if pos < end else b""
+            pos += len(chunk)
+            last = not chunk or pos >= end
+            block = tail + chunk
+            cut = len(block) if last else block.rfind(b"\n") + 1
+            if cut <= 0 and not last:
+                tail = block  # línea más larga que el bloque: se sigue acumulando
+                continue
+            data, tail = block[:cut], block[cut:]
+            if data.strip():
+                yield pd.read_csv(io.BytesIO(data), sep=dialect["sep"], encoding=encoding,
+                                  header=None, names=columns)
+            if last:
+                return
+
+# ========================= CARGA EN PARALELO =========================
+SHARD_MIN_BYTES = 32 * 1024 * 1024  # por debajo de esto no conviene partir un archivo
+
+def plan_shards(path, data_start: int, n_shards: int, min_bytes: int = SHARD_MIN_BYTES) -> list:
+    """Rangos ``(inicio, fin)`` que parten los datos en hasta `n_shards` partes, cortando en fin de línea."""
+    size = os.path.getsize(path)
+    n = int(max(1, min(n_shards, (size - data_start) // max(min_bytes, 1))))
+    bounds = [data_start]
+    with open(path, "rb") as fh:
+        for k in range(1, n):
+            fh.seek(data_start + (size - data_start) * k // n - 1)
+            fh.readline()  # avanza hasta el comienzo de la línea siguiente
+            if bounds[-1] < fh.tell() < size:
+                bounds.append(fh.tell())
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def read_byte_range(path, start: int, end: int, columns, dialect: dict) -> pd.DataFrame:
+    """Las filas entre `start` y `end` como un único DataFrame (una tarea del pool)."""
+    frames = list(iter_byte_range(path, start, end, columns, dialect, block_bytes=max(end - start, 1)))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+def _submit_read(pool, path, n_shards: int, min_bytes: int = SHARD_MIN_BYTES) -> list:
+    """Envía la lectura de `path` al pool: entera o, si es grande, por rangos de bytes."""
+    if n_shards > 1 and os.path.getsize(path) >= 2 * min_bytes:
+        dialect = sniff_csv(path)
+        if dialect["encoding"] != "utf-16":
+            columns, data_start = read_header(path, dialect)
+            shards = plan_shards(path, data_start, n_shards, min_bytes)
+            if len(shards) > 1:
+                return [pool.submit(read_byte_range, path, start, end, columns, dialect) for start, end in shards]
+    return [pool.submit(robust_read_csv, path)]
+
+def _gather_read(path, jobs: list) -> pd.DataFrame:
+    """Junta las partes en el orden del archivo; si alguna no es UTF-8 se relee todo en latin-1."""
+    try:
+        parts = [job.result() for job in jobs]
+    except UnicodeDecodeError:
+        dialect = sniff_csv(path)
+        if dialect["bom"] or dialect["encoding"] == "latin-1":
+            raise
+        dialect = dict(dialect, encoding="latin-1")
+        columns, data_start = read_header(path, dialect)
+        parts = [read_byte_range(path, data_start, os.path.getsize(path), columns, dialect)]
+    df = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    return _drop_unnamed(df)
+
+def load_raw_data(base_dir: str, cache=None, detalle_rows: int = None, workers: int = None,
+                  pool: str = "thread", shard_min_bytes: int = SHARD_MIN_BYTES):
+    """Carga clientes, productos, ventas y detalle (vía la TableCache `cache` si se pasa).
+
+    Los archivos que no están en caché se parsean a la vez en un pool de `workers`
+    hilos o procesos (`pool`, ver `parallel.worker_pool`); el detalle grande se parte
+    además en rangos de bytes que se parsean por separado y se concatenan en orden.
+    Con `detalle_rows` sólo se leen las primeras filas del detalle (modo streaming).
+    """
+    paths = raw_paths(base_dir)
+    missing = [k for k, p in paths.items() if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"Faltan archivos: {', '.join(missing)} en {base_dir}")
+
+    if detalle_rows is not None:
+        head = read_csv_head(paths["detalle"], detalle_rows)
+        paths = {k: p for k, p in paths.items() if k != "detalle"}
+    cached = {k: cache.get(p) for k, p in paths.items()} if cache is not None else {}
+    n_shards = resolve_workers(workers)
+    with worker_pool(workers, pool) as executor:
+        # el detalle (el más grande) se envía primero para que sus partes arranquen antes
+        jobs = {k: _submit_read(executor, paths[k], n_shards if k == "detalle" else 1, shard_min_bytes)
+                for k in sorted(paths, key=lambda k: k != "detalle") if cached.get(k) is None}
+        tables = {k: _gather_read(paths[k], job) for k, job in jobs.items()}
+    for k, df in tables.items():
+        if cache is not None:
+            cache.put(paths[k], df)
+    tables.update({k: df for k, df in cached.items() if df is not None})
+    if detalle_rows is not None:
+        tables["detalle"] = head
+    return tables["clientes"], tables["productos"], tables["ventas"], tables["detalle"]
@@ -0,0 +1,204 @@
+"""Conciliación de importes, precios, claves y totales por ticket, por bloques del detalle.
+
+Controles (uno por fila de `summary_table`):
+
+- ``importe_linea``: `importe` vs `cantidad * precio_unitario` de cada línea;
+- ``precio_catalogo``: `precio_unitario` de la línea vs el de `productos`;
+- ``producto_huerfano`` / ``venta_huerfana``: líneas cuyo producto o venta no existe
+  (las que el join por izquierda del Paso 7 deja con nulos);
+- ``cliente_huerfano``: ventas cuyo cliente no está en `clientes`;
+- ``total_ticket``: total de la cabecera (`ventas`) vs suma de los importes de sus líneas;
+- ``venta_sin_detalle``: ventas sin ninguna línea;
+- ``producto_duplicado`` / ``venta_duplicada`` / ``cliente_duplicado``: filas de una
+  dimensión que repiten una clave ya vista. Los demás controles usan la primera fila
+  de cada clave (como el gather), así que una clave repetida no corta la conciliación.
+
+`Reconciler.update` recibe un bloque del detalle limpio: cada control es una máscara
+vectorizada sobre el bloque y las búsquedas en las dimensiones usan las posiciones de
+`joins.lookup_positions`; los totales por ticket se acumulan con `bincount` por
+posición de la venta, así que la memoria depende de la cantidad de ventas y no de
+líneas. Los contadores son exactos; de cada control se guardan como ejemplo las
+primeras `max_exceptions` excepciones. Una diferencia cuenta si supera `tolerance`
+(en unidades de la moneda).
+"""
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .joins import lookup_positions
+
+CHECKS = ("importe_linea", "precio_catalogo", "producto_huerfano", "venta_huerfana",
+          "cliente_huerfano", "total_ticket", "venta_sin_detalle",
+          "producto_duplicado", "venta_duplicada", "cliente_duplicado")
+DUPLICATE_CHECKS = {"productos": ("prod_key", "producto_duplicado"), "ventas": ("venta_key", "venta_duplicada"),
+                    "clientes": ("cli_key_cli", "cliente_duplicado")}
+DEFAULT_TOLERANCE = 0.01
+MAX_EXCEPTIONS = 10_000
+RECONCILE_DIRNAME = "conciliacion"
+
+def _num(df: pd.DataFrame, col: str):
+    """Columna como float64 con NaN en los nulos (None si no existe)."""
+    if col is None or col not in df.columns:
+        return None
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+class Reconciler:
+    """Controles de conciliación alimentados por bloques del detalle (`update`); `build` arma el resultado."""
+
+    def __init__(self, tables: dict, keys: dict, total_col: str = None, tolerance: float = DEFAULT_TOLERANCE,
+                 max_exceptions: int = MAX_EXCEPTIONS):
+        self.keys = keys
+        self.total_col = total_col
+        self.tolerance = tolerance
+        self.max_exceptions = max_exceptions
+        self.lines = 0
+        self.seconds = 0.0
+        self._counts = {}
+        self._examples = {}
+        self.tables = {name: self._unique_keys(tables[name], *DUPLICATE_CHECKS[name])
+                       for name in ("clientes", "productos", "ventas")}
+        self.catalog_price = _num(self.tables["productos"], "precio_unitario")
+        n = len(self.tables["ventas"])
+        self._ticket_sum = np.zeros(n)
+        self._ticket_lines = np.zeros(n, dtype=np.int64)
+
+    def _unique_keys(self, table: pd.DataFrame, key_name: str, check: str) -> pd.DataFrame:
+        """`table` con la primera fila de cada clave; las repetidas se cuentan en `check`."""
+        key = self.keys.get(key_name)
+        if not key or key not in table.columns:
+            return table
+        repeated = table[key].duplicated(keep="first").to_numpy()
+        values = table[key].to_numpy()
+        self._record(check, len(table), repeated, None, lambda pos: pd.DataFrame({"fila": pos, key: values[pos]}))
+        return table[~repeated].reset_index(drop=True) if repeated.any() else table
+
+    # ------------------------- acumulación -------------------------
+    def _record(self, check: str, evaluated: int, mask: np.ndarray, amount, examples):
+        """Suma el control `check`; `examples(pos)` arma las filas de ejemplo de las posiciones `pos`."""
+        counts = self._counts.setdefault(check, {"evaluadas": 0, "excepciones": 0, "monto": 0.0})
+        hits = np.flatnonzero(mask)
+        counts["evaluadas"] += int(evaluated)
+        counts["excepciones"] += len(hits)
+        counts["monto"] += float(np.sum(amount)) if amount is not None else 0.0
+        kept = self._examples.setdefault(check, [])
+        room = self.max_exceptions - sum(len(e) for e in kept)
+        if len(hits) and room > 0:
+            kept.append(examples(hits[:room]))
+
+    def update(self, detalle: pd.DataFrame) -> "Reconciler":
+        """Un bloque del detalle limpio (mismas columnas que `detalle_limpio`)."""
+        t0 = time.perf_counter()
+        keys, n, offset = self.keys, len(detalle), self.lines
+        det_venta, det_prod = keys["det_venta_key"], keys["det_prod_key"]
+        venta_pos = lookup_positions(detalle[det_venta], self.tables["ventas"][keys["venta_key"]])
+        prod_pos = lookup_positions(detalle[det_prod], self.tables["productos"][keys["prod_key"]])
+        venta_ids, prod_ids = detalle[det_venta].to_numpy(), detalle[det_prod].to_numpy()
+
+        def lines(pos, **values):
+            return pd.DataFrame({"linea": pos + offset, det_venta: venta_ids[pos], det_prod: prod_ids[pos],
+                                 **{k: v[pos] for k, v in values.items()}})
+
+        importe, cantidad, precio = _num(detalle, "importe"), _num(detalle, "cantidad"), _num(detalle, "precio_unitario")
+        subtotal = cantidad * precio if cantidad is not None and precio is not None else None
+        if importe is not None and subtotal is not None:
+            diff = importe - subtotal
+            valid = ~np.isnan(diff)
+            mask = valid & (np.abs(diff) > self.tolerance)
+            self._record("importe_linea", valid.sum(), mask, np.abs(diff[mask]),
+                         lambda pos: lines(pos, importe=importe, subtotal_calc=subtotal, desvio_importe=diff))
+        if precio is not None and self.catalog_price is not None:
+            catalog = np.full(n, np.nan)
+            matched = prod_pos >= 0
+            catalog[matched] = self.catalog_price[prod_pos[matched]]
+            diff = precio - catalog
+            valid = ~np.isnan(diff)
+            mask = valid & (np.abs(diff) > self.tolerance)
+            weight = np.abs(diff[mask]) * (np.nan_to_num(cantidad[mask]) if cantidad is not None else 1.0)
+            self._record("precio_catalogo", valid.sum(), mask, weight,
+                         lambda pos: lines(pos, precio_unitario=precio, precio_catalogo=catalog, desvio_precio=diff))
+        for check, pos_array in (("producto_huerfano", prod_pos), ("venta_huerfana", venta_pos)):
+            mask = pos_array < 0
+            self._record(check, n, mask, None, lambda pos: lines(pos))
+
+        base = importe if importe is not None else subtotal
+        matched = venta_pos >= 0
+        if base is not None:
+            self._ticket_sum += np.bincount(venta_pos[matched], weights=np.nan_to_num(base[matched]),
+                                            minlength=len(self._ticket_sum))
+        self._ticket_lines += np.bincount(venta_pos[matched], minlength=len(self._ticket_lines))
+        self.lines += n
+        self.seconds += time.perf_counter() - t0
+        return self
+
+    # ------------------------- resultado -------------------------
+    def _header_checks(self):
+        """Controles sobre las dimensiones, una vez vistas todas las líneas."""
+        ventas, clientes, keys = self.tables["ventas"], self.tables["clientes"], self.keys
+        venta_ids = ventas[keys["venta_key"]].to_numpy()
+        cli_det, cli_key = keys.get("cli_key_det"), keys.get("cli_key_cli")
+        if cli_det and cli_key and cli_det in ventas.columns and cli_key in clientes.columns:
+            cli_pos = lookup_positions(ventas[cli_det], clientes[cli_key])
+            cli_ids = ventas[cli_det].to_numpy()
+            self._record("cliente_huerfano", len(ventas), cli_pos < 0, None,
+                         lambda pos: pd.DataFrame({keys["venta_key"]: venta_ids[pos], cli_det: cli_ids[pos]}))
+        header = _num(ventas, self.total_col)
+        has_lines = self._ticket_lines > 0
+        if header is not None:
+            diff = header - self._ticket_sum
+            valid = has_lines & ~np.isnan(header)
+            mask = valid & (np.abs(diff) > self.tolerance)
+            self._record("total_ticket", valid.sum(), mask, np.abs(diff[mask]),
+                         lambda pos: pd.DataFrame({keys["venta_key"]: venta_ids[pos], "total_cabecera": header[pos],
+                                                   "total_detalle": self._ticket_sum[pos],
+                                                   "lineas": self._ticket_lines[pos], "diferencia": diff[pos]}))
+        self._record("venta_sin_detalle", len(ventas), ~has_lines, None,
+                     lambda pos: pd.DataFrame({keys["venta_key"]: venta_ids[pos]}))
+
+    def build(self) -> dict:
+        """``{"rows", "tolerance", "total_col", "checks": [contadores], "exceptions": {control: DataFrame}}``.
+
+        Agrega los controles de cabecera, así que se llama una sola vez, después del último bloque.
+        """
+        t0 = time.perf_counter()
+        self._header_checks()
+        checks = []
+        for check in CHECKS:
+            if check not in self._counts:
+                continue  # faltan las columnas que usa el control
+            c = self._counts[check]
+            rate = c["excepciones"] / c["evaluadas"] if c["evaluadas"] else 0.0
+            checks.append({"check": check, **c, "monto": round(c["monto"], 2), "tasa": round(rate, 6)})
+        exceptions = {check: pd.concat(parts, ignore_index=True) for check, parts in self._examples.items() if parts}
+        return {"rows": self.lines, "tolerance": self.tolerance, "total_col": self.total_col, "checks": checks,
+                "exceptions": exceptions, "seconds": round(self.seconds + time.perf_counter() - t0, 4)}
+
+def reconcile_tables(tables: dict, keys: dict, total_col: str = None, tolerance: float = DEFAULT_TOLERANCE,
+                     max_exceptions: int = MAX_EXCEPTIONS) -> dict:
+    """Conciliación de tablas limpias ya cargadas (el detalle completo como un solo bloque)."""
+    return Reconciler(tables, keys, total_col, tolerance, max_exceptions).update(tables["detalle"]).build()
+
+def summary_table(result: dict) -> pd.DataFrame:
+    """Una fila por control: evaluadas, excepciones, tasa y monto de las diferencias."""
+    return pd.DataFrame(result["checks"], columns=["check", "evaluadas", "excepciones", "tasa", "monto"])
+
+def failed_checks(result: dict, max_rate: float = 0.0, checks=None) -> list:
+    """Controles (de `checks`, o todos) cuya tasa de excepciones supera `max_rate`."""
+    return [c["check"] for c in result["checks"]
+            if (checks is None or c["check"] in checks) and c["tasa"] > max_rate]
+
+def save_reconciliation(result: dict, output_dir: str) -> str:
+    """`output_dir/conciliacion/`: resumen.json con los contadores y un CSV de excepciones por control."""
+    folder = os.path.join(output_dir, RECONCILE_DIRNAME)
+    os.makedirs(folder, exist_ok=True)
+    for name in os.listdir(folder):
+        if name.endswith(".csv"):
+            os.remove(os.path.join(folder, name))
+    summary = {k: v for k, v in result.items() if k != "exceptions"}
+    with open(os.path.join(folder, "resumen.json"), "w", encoding="utf-8") as fh:
+        json.dump(summary, fh, ensure_ascii=False, indent=2, default=str)
+    for check, table in result["exceptions"].items():
+        table.to_csv(os.path.join(folder, f"{check}.csv"), index=False, encoding="utf-8")
+    return folder
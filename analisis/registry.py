@@ -0,0 +1,163 @@
+"""Registro de datasets limpios compartido por todas las sesiones del servidor.
+
+Cada resultado de la limpieza se guarda una sola vez, bajo una clave que resume sus
+entradas: huella de los CSV originales (ruta, mtime y tamaño), mapeo de claves y
+opciones que cambian el resultado (`dataset_key`). Una sesión que pide un dataset ya
+registrado recibe una `DatasetView` en lugar de volver a limpiar, así que la memoria
+crece con la cantidad de datasets distintos y no con la de sesiones.
+
+La vista es de sólo lectura y no copia datos: cada DataFrame (y la `CompactTable`
+del integrado) se entrega como copia superficial, que con copy-on-write de pandas
+comparte los buffers de Arrow/NumPy y sólo copia si la sesión modifica algo; cubo,
+índice y rutas se comparten tal cual (su API no los modifica). Como Streamlit atiende
+todas las sesiones en un mismo proceso, no hace falta memoria compartida entre procesos.
+
+El conteo de referencias lo llevan las propias vistas: al soltarse (la sesión la
+reemplaza o se cierra) un `weakref.finalize` descuenta la referencia. Un dataset sin
+referencias se conserva `idle_seconds` por si alguien lo vuelve a pedir y después se
+desaloja; si el total supera `max_bytes`, primero se desalojan los ociosos más viejos.
+Los que tienen referencias nunca se desalojan.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from collections.abc import Mapping
+
+import pandas as pd
+
+from .compact import CompactTable, memory_bytes
+
+DEFAULT_IDLE_SECONDS = 600
+DATASET_TABLES = ("clientes", "productos", "ventas", "detalle", "integrado")
+
+def dataset_key(paths: dict, keys: dict = None, **options) -> str:
+    """Huella de las entradas de una limpieza: archivos (ruta, mtime, tamaño), claves y opciones."""
+    files = {}
+    for name, path in sorted(paths.items()):
+        st = os.stat(path)
+        files[name] = [os.path.abspath(path), st.st_mtime_ns, st.st_size]
+    raw = json.dumps({"files": files, "keys": keys or {}, "options": options}, sort_keys=True, default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+def dataset_bytes(dataset: dict) -> int:
+    """Memoria de las tablas del dataset (el detalle de un integrado compacto es una vista de sus hechos)."""
+    shared = isinstance(dataset.get("integrado"), CompactTable)
+    return sum(memory_bytes(dataset.get(name)) for name in DATASET_TABLES
+               if not (shared and name == "detalle"))
+
+def _view(value):
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)  # copy-on-write: comparte los buffers
+    if isinstance(value, CompactTable):
+        return CompactTable(value.fact.copy(deep=False), value.dims, value.positions, value.layout)
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+class DatasetView(Mapping):
+    """Acceso de sólo lectura a un dataset registrado (se usa como el dict de `clean_data`)."""
+
+    def __init__(self, key: str, dataset: dict):
+        self.key = key
+        self._dataset = dataset
+
+    def __getitem__(self, name):
+        return _view(self._dataset[name])
+
+    def __iter__(self):
+        return iter(self._dataset)
+
+    def __len__(self) -> int:
+        return len(self._dataset)
+
+class _Entry:
+    def __init__(self, dataset: dict, nbytes: int):
+        self.dataset = dataset
+        self.nbytes = nbytes
+        self.refs = 0
+        self.idle_since = time.time()
+
+class DatasetRegistry:
+    """Datasets limpios por clave, con vistas contadas y desalojo de los que nadie usa."""
+
+    def __init__(self, max_bytes: int = None, idle_seconds: float = DEFAULT_IDLE_SECONDS):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def put(self, key: str, dataset: dict) -> bool:
+        """Registra `dataset` bajo `key`; si ya había uno se conserva ése (False)."""
+        with self._lock:
+            if key in self._entries:
+                return False
+            self._entries[key] = _Entry(dataset, dataset_bytes(dataset))
+            self._evict(keep=key)  # recién llegado: todavía nadie lo abrió
+            return True
+
+    def open(self, key: str):
+        """Nueva vista del dataset `key` (suma una referencia mientras viva), o None si no está."""
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.refs += 1
+        view = DatasetView(key, entry.dataset)
+        weakref.finalize(view, self._release, key)
+        return view
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def _release(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refs -= 1
+                if entry.refs <= 0:
+                    entry.refs, entry.idle_since = 0, time.time()
+            self._evict()
+
+    def _evict(self, keep: str = None) -> int:
+        now = time.time()
+        idle = sorted((k for k, e in self._entries.items() if e.refs == 0 and k != keep),
+                      key=lambda k: self._entries[k].idle_since)
+        dropped = [k for k in idle if now - self._entries[k].idle_since >= self.idle_seconds]
+        total = sum(e.nbytes for k, e in self._entries.items() if k not in dropped)
+        for k in idle:
+            if self.max_bytes is None or total <= self.max_bytes:
+                break
+            if k not in dropped:
+                dropped.append(k)
+                total -= self._entries[k].nbytes
+        for k in dropped:
+            del self._entries[k]
+        return len(dropped)
+
+    def evict(self) -> int:
+        """Desaloja lo que corresponda ahora; devuelve cuántos datasets se sacaron."""
+        with self._lock:
+            return self._evict()
+
+    def clear(self) -> int:
+        """Saca los datasets sin referencias (los que se están usando quedan)."""
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if e.refs == 0]
+            for k in keys:
+                del self._entries[k]
+            return len(keys)
+
+    def stats(self) -> list:
+        """Una fila por dataset: clave, referencias, MB y segundos ocioso."""
+        now = time.time()
+        with self._lock:
+            return [{"dataset": k[:12], "refs": e.refs, "mb": round(e.nbytes / 1024 ** 2, 2),
+                     "idle_s": round(now - e.idle_since, 1) if e.refs == 0 else 0.0}
+                    for k, e in self._entries.items()]
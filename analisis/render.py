@@ -0,0 +1,225 @@
+"""Dibujo de los gráficos del Paso 3 a partir de resúmenes ya calculados con NumPy.
+
+Matplotlib nunca recibe las filas del integrado, sólo resúmenes de tamaño fijo:
+
+- histograma: conteos y bordes (`Cube.ticket_histogram`) → un único escalonado;
+- boxplot: cuartiles, bigotes y outliers acotados (`Cube.box_stats`) → `Axes.bxp`;
+- dispersión: grilla 2-D de conteos (`density_grid`) → `Axes.pcolormesh`. Con pocos
+  pares (≤ `MAX_POINTS`) se dibujan los puntos, que es igual de barato.
+
+Así el tiempo de dibujo y el tamaño del PNG dependen de la cantidad de bins, no de
+la cantidad de filas. `FigureCache` guarda los PNG ya renderizados por huella de esos
+resúmenes: un rerun que no los cambia no vuelve a dibujar ni a escribir archivos.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 2_000   # hasta acá la dispersión se dibuja punto por punto
+MAX_FLIERS = 50      # outliers dibujados por caja
+GRID_BINS = 60
+FIG_DPI = 150
+FIG_CACHE_MAX_BYTES = 64 * 1024 ** 2
+
+# ========================= RESÚMENES =========================
+def _edges(v: np.ndarray, bins: int) -> np.ndarray:
+    """Bordes de bins; para enteros con pocos valores distintos, uno por valor (centrado)."""
+    lo, hi = float(v.min()), float(v.max())
+    if np.array_equal(v, np.round(v)) and hi - lo < bins:
+        return np.arange(lo - 0.5, hi + 1.5)
+    if hi == lo:
+        lo, hi = lo - 0.5, hi + 0.5
+    return np.linspace(lo, hi, bins + 1)
+
+def density_grid(x, y, bins: int = GRID_BINS, weight: float = 1.0):
+    """(conteos, bordes_x, bordes_y) de los pares finitos de `x`, `y` (np.histogram2d).
+
+    `weight` escala cada par (p.ej. filas / tamaño de la muestra para estimar líneas).
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    ok = np.isfinite(x) & np.isfinite(y)
+    x, y = x[ok], y[ok]
+    if not x.size:
+        return np.zeros((0, 0)), np.zeros(0), np.zeros(0)
+    counts, xedges, yedges = np.histogram2d(x, y, bins=(_edges(x, bins), _edges(y, bins)))
+    return counts * weight, xedges, yedges
+
+def cap_fliers(fliers, limit: int = MAX_FLIERS) -> np.ndarray:
+    """Hasta `limit` outliers repartidos en todo el rango (los extremos siempre quedan)."""
+    fliers = np.sort(np.asarray(fliers, dtype="float64"))
+    if fliers.size <= limit:
+        return fliers
+    return fliers[np.unique(np.linspace(0, fliers.size - 1, limit).round().astype(int))]
+
+# ========================= DIBUJO =========================
+def draw_histogram(ax, counts, edges, **kwargs):
+    """Histograma precalculado como un solo polígono (no una barra por bin)."""
+    kwargs.setdefault("fill", True)
+    return ax.stairs(counts, edges, **kwargs)
+
+def draw_boxes(ax, stats: list, max_fliers: int = MAX_FLIERS, **kwargs):
+    """`Axes.bxp` con los outliers de cada caja acotados a `max_fliers`."""
+    stats = [{**s, "fliers": cap_fliers(s["fliers"], max_fliers)} for s in stats]
+    return ax.bxp(stats, **kwargs)
+
+def draw_density(ax, counts, xedges, yedges, cmap: str = "Blues", label: str = "Líneas"):
+    """Grilla de conteos (celdas vacías transparentes) con su barra de colores."""
+    mesh = ax.pcolormesh(xedges, yedges, np.ma.masked_equal(counts.T, 0), cmap=cmap, shading="flat")
+    ax.figure.colorbar(mesh, ax=ax, label=label)
+    return mesh
+
+def draw_pairs(ax, x, y, max_points: int = MAX_POINTS, bins: int = GRID_BINS, weight: float = 1.0,
+               **scatter_kwargs) -> str:
+    """Puntos si hay a lo sumo `max_points` pares; si no, la grilla de densidad.
+
+    Devuelve "puntos" o "densidad" según lo que se dibujó.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    ok = np.isfinite(x) & np.isfinite(y)
+    if ok.sum() <= max_points:
+        ax.scatter(x[ok], y[ok], **scatter_kwargs)
+        return "puntos"
+    counts, xedges, yedges = density_grid(x[ok], y[ok], bins=bins, weight=weight)
+    draw_density(ax, counts, xedges, yedges, label="Líneas (estimadas)" if weight != 1.0 else "Líneas")
+    return "densidad"
+
+# ========================= FIGURAS DEL PASO 3 =========================
+def histogram_figure(counts, edges):
+    """3.1: total por ticket (`Cube.ticket_histogram`)."""
+    fig, ax = plt.subplots(figsize=(8, 4))
+    draw_histogram(ax, counts, edges)
+    ax.set_title("Distribución del total por ticket", weight="bold")
+    ax.set_xlabel("Total por ticket")
+    ax.set_ylabel("Frecuencia")
+    ax.grid(axis="y", linestyle="--", alpha=0.6)
+    return fig
+
+def box_figure(stats: list):
+    """3.2: importe por categoría (`Cube.box_stats`)."""
+    fig, ax = plt.subplots(figsize=(max(7, len(stats) * 0.7), 5))
+    draw_boxes(ax, stats, patch_artist=True, boxprops=dict(facecolor="lightblue"),
+               medianprops=dict(color="navy", linewidth=2))
+    ax.set_title("Boxplot de importe por categoría", weight="bold")
+    ax.set_ylabel("Importe")
+    plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
+    return fig
+
+def pairs_figure(x, y, weight: float = 1.0):
+    """3.3: cantidad vs precio unitario (puntos o densidad, ver `draw_pairs`)."""
+    fig, ax = plt.subplots(figsize=(7, 5))
+    draw_pairs(ax, x, y, weight=weight, alpha=0.6, color="royalblue")
+    ax.set_xlabel("Cantidad")
+    ax.set_ylabel("Precio unitario")
+    ax.set_title("Dispersión: cantidad vs precio unitario", weight="bold")
+    ax.grid(alpha=0.3)
+    return fig
+
+def revenue_figure(serie: pd.Series):
+    """3.4: ingresos por categoría (`Cube.revenue_by`); horizontales si hay más de 8."""
+    num_cats = len(serie)
+    fig, ax = plt.subplots(figsize=(10, max(4, num_cats * 0.42)))
+    if num_cats > 8:
+        ax.barh(serie.index.astype(str), serie.values, color="teal")
+        ax.invert_yaxis()
+        ax.set_xlabel("Ingresos totales"); ax.set_ylabel("Categoría")
+        for i, v in enumerate(serie.values):
+            ax.text(v, i, f"{v:,.0f}", va="center", ha="left", fontsize=8)
+    else:
+        ax.bar(serie.index.astype(str), serie.values, color="teal")
+        plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
+        ax.set_ylabel("Ingresos totales")
+        for i, v in enumerate(serie.values):
+            ax.text(i, v, f"{v:,.0f}", ha="center", va="bottom", fontsize=8)
+    ax.set_title("Ingresos por categoría", weight="bold")
+    ax.grid(axis="x", linestyle="--", alpha=0.55)
+    return fig
+
+# ========================= CACHÉ DE FIGURAS =========================
+def _feed(h, obj):
+    """Agrega `obj` (arrays, tablas, dicts/listas anidados o escalares) al hash `h`."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        h.update(repr((type(obj).__name__, list(getattr(obj, "columns", [obj.name])), obj.shape)).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.dtype.str, obj.shape)).encode())
+        h.update(np.ascontiguousarray(obj).tobytes() if obj.dtype != object else repr(obj.tolist()).encode())
+    elif isinstance(obj, dict):
+        for k in sorted(obj, key=str):
+            h.update(repr(k).encode())
+            _feed(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"[{len(obj)}".encode())
+        for item in obj:
+            _feed(h, item)
+    else:
+        h.update(repr(obj).encode())
+
+def figure_key(name: str, *parts) -> str:
+    """Huella BLAKE2b del nombre del gráfico, sus datos de entrada y sus parámetros."""
+    h = hashlib.blake2b(name.encode(), digest_size=16)
+    for part in parts:
+        _feed(h, part)
+    return h.hexdigest()
+
+def figure_png(fig, dpi: int = FIG_DPI) -> bytes:
+    """PNG de `fig`; la figura se cierra siempre (pyplot no la retiene entre reruns)."""
+    try:
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
+
+class FigureCache:
+    """PNG renderizados en memoria, por huella de datos y parámetros, con desalojo LRU por tamaño."""
+
+    def __init__(self, max_bytes: int = FIG_CACHE_MAX_BYTES, dpi: int = FIG_DPI):
+        self.max_bytes = max_bytes
+        self.dpi = dpi
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # compartida entre sesiones de Streamlit
+
+    def get(self, key: str):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return png
+
+    def put(self, key: str, png: bytes) -> bytes:
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            total = sum(len(v) for v in self._entries.values())
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                total -= len(old)
+        return png
+
+    def render(self, key: str, build):
+        """(png, nuevo): el PNG cacheado o el de `build()` (que devuelve una figura) si no estaba."""
+        png = self.get(key)
+        if png is not None:
+            return png, False
+        with self._lock:
+            self.misses += 1
+        return self.put(key, figure_png(build(), self.dpi)), True
+
+    def clear(self) -> int:
+        with self._lock:
+            n = len(self._entries)
+            self._entries.clear()
+            return n
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._entries.values())
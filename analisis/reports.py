@@ -0,0 +1,297 @@
+"""Reportes por sucursal: gráficos, tablas resumen y conclusiones a partir del cubo.
+
+Cada carpeta de datos (una por sucursal) produce un paquete en
+``proyecto_Archivos_definitivos/reportes/<sucursal>/``::
+
+    plots/*.png          los cuatro gráficos del Paso 3
+    tablas/*.csv         total por ticket, medidas de línea, ingresos por categoría, conciliación
+    conciliacion/        excepciones de `reconcile`
+    data_limpios/        tablas limpias y cubo
+    conclusiones.txt     el texto del Paso 4, con los números de la sucursal
+    manifest.json        huella de las entradas, tiempos y cifras principales
+
+`batch_reports` reparte las sucursales en un pool de procesos (`parallel.worker_pool`).
+Cada sucursal corre el pipeline con un solo worker: el paralelismo está entre
+sucursales, así que el rendimiento total crece con los núcleos. Una sucursal cuya
+huella (CSV originales, claves, opciones y `REPORT_VERSION`, ver
+`registry.dataset_key`) coincide con la de su `manifest.json` se saltea. Si una
+sucursal falla, su error queda en el índice y el resto sigue.
+"""
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .parallel import worker_pool
+from .pipeline import run_pipeline
+from .readers import raw_paths
+from .reconcile import save_reconciliation, summary_table
+from .registry import dataset_key
+from .render import box_figure, figure_png, histogram_figure, pairs_figure, revenue_figure
+from .streaming import stream_pipeline
+
+REPORT_VERSION = 1
+REPORTS_DIRNAME = "reportes"
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "indice_reportes.csv"
+CONCLUSIONS_FILE = "conclusiones.txt"
+PARETO_SHARE = 0.8
+
+# ========================= CONTENIDO =========================
+def report_figures(cube) -> dict:
+    """nombre → función que arma la figura, sólo para los gráficos con datos."""
+    figures = {}
+    counts, edges = cube.ticket_histogram(bins=20)
+    if counts.sum() > 0:
+        figures["hist_total_ticket"] = lambda: histogram_figure(counts, edges)
+    cat_col = cube.cat_col
+    if cat_col and cube.has_measure("importe") and cube.count("importe") > 0:
+        stats = cube.box_stats(cat_col)
+        if stats:
+            figures["box_importe_categoria"] = lambda: box_figure(stats)
+        serie = cube.revenue_by(cat_col)
+        serie = serie[serie > 0]
+        if not serie.empty:
+            figures["bar_ingresos_categoria"] = lambda: revenue_figure(serie)
+    sample = cube.sample
+    if {"cantidad", "precio_unitario"}.issubset(sample.columns):
+        x = pd.to_numeric(sample["cantidad"], errors="coerce")
+        y = pd.to_numeric(sample["precio_unitario"], errors="coerce")
+        mask = x.notna() & y.notna()
+        if mask.any():
+            weight = max(cube.rows, 1) / max(len(sample), 1)
+            figures["scatter_cantidad_precio"] = lambda: pairs_figure(x[mask], y[mask], weight)
+    return figures
+
+def summary_tables(cube, reconciliation: dict = None) -> dict:
+    """nombre → DataFrame con los resúmenes del Paso 3 (y la conciliación si la hay)."""
+    tables = {}
+    ticket = cube.ticket_summary()
+    if ticket.get("count"):
+        q = ticket["quantiles"]
+        tables["desc_ticket"] = pd.DataFrame([{"count": ticket["count"], "mean": ticket["mean"], "std": ticket["std"],
+                                               "min": ticket["min"], "25%": q[0], "50%": q[1], "75%": q[2],
+                                               "max": ticket["max"]}], index=["total_ticket"])
+    desc = cube.describe(["cantidad", "precio_unitario", "importe"])
+    if not desc.empty:
+        tables["desc_detalle"] = desc
+    if cube.cat_col and cube.has_measure("importe"):
+        tables["resumen_categoria"] = cube.revenue_by(cube.cat_col).reset_index()
+    if reconciliation is not None:
+        tables["conciliacion"] = summary_table(reconciliation)
+    return tables
+
+def _money(v: float) -> str:
+    return f"{v:,.0f}" if v == v else "s/d"
+
+def _correlation(cube):
+    """Correlación de Spearman cantidad–precio unitario en la muestra del cubo (None si no alcanza)."""
+    sample = cube.sample
+    if not {"cantidad", "precio_unitario"}.issubset(sample.columns):
+        return None
+    pairs = sample[["cantidad", "precio_unitario"]].apply(pd.to_numeric, errors="coerce").dropna()
+    if len(pairs) < 3 or pairs.nunique().min() < 2:
+        return None
+    ranks = pairs.rank()  # Spearman = Pearson sobre los rangos (sin depender de scipy)
+    return float(ranks["cantidad"].corr(ranks["precio_unitario"]))
+
+def conclusions_text(cube, reconciliation: dict = None, output_dir: str = None, title: str = None) -> str:
+    """Texto del Paso 4 armado con los agregados del cubo y los contadores de la conciliación."""
+    header = f"Informe de conclusiones{f' — {title}' if title else ''} — {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    lines = [header, ""]
+
+    lines.append("1) Calidad de datos")
+    lines.append(f"- {cube.rows:,} líneas de detalle integradas; nombres, tipos, fechas y claves normalizados.")
+    if reconciliation is not None:
+        found = [c for c in reconciliation["checks"] if c["excepciones"]]
+        if found:
+            for c in found:
+                amount = f" (diferencia total {_money(c['monto'])})" if c["monto"] else ""
+                lines.append(f"- {c['check']}: {c['excepciones']:,} de {c['evaluadas']:,} "
+                             f"({100 * c['tasa']:.2f} %){amount}.")
+            lines.append("- Acción: revisar las excepciones de la conciliación antes de usar estas cifras.")
+        else:
+            lines.append("- La conciliación no encontró diferencias de importes, precios, claves ni totales.")
+    lines.append("")
+
+    lines.append("2) Total por ticket (histograma)")
+    ticket = cube.ticket_summary()
+    if ticket.get("count"):
+        mean, median, q3 = ticket["mean"], ticket["quantiles"][1], ticket["quantiles"][2]
+        lines.append(f"- {int(ticket['count']):,} tickets: promedio {_money(mean)}, mediana {_money(median)}, "
+                     f"el 25 % supera {_money(q3)} y el mayor llega a {_money(ticket['max'])}.")
+        if median and mean > 1.1 * median:
+            lines.append("- El promedio supera a la mediana: muchos tickets chicos y pocos muy altos (cola a la derecha).")
+            lines.append("- Acción: entender qué genera los tickets altos (combos, productos premium, promociones).")
+        else:
+            lines.append("- Promedio y mediana están cerca: los montos se reparten de forma bastante pareja.")
+    else:
+        lines.append("- Sin totales por ticket para analizar.")
+    lines.append("")
+
+    cat_col = cube.cat_col
+    lines.append("3) Importe por categoría (boxplot)")
+    stats = cube.box_stats(cat_col) if cat_col and cube.has_measure("importe") else []
+    stats = [s for s in stats if s["med"] == s["med"]]
+    if len(stats) > 1:
+        top = max(stats, key=lambda s: s["med"])
+        spread = sorted(stats, key=lambda s: s["q3"] - s["q1"])
+        lines.append(f"- Mediana más alta: {top['label']} ({_money(top['med'])} por línea).")
+        lines.append(f"- Más heterogénea: {spread[-1]['label']} (rango intercuartil {_money(spread[-1]['q3'] - spread[-1]['q1'])}); "
+                     f"más estable: {spread[0]['label']} ({_money(spread[0]['q3'] - spread[0]['q1'])}).")
+        lines.append("- Acción: revisar precios y mix en las categorías con más dispersión.")
+    else:
+        lines.append("- No hay categorías suficientes para comparar.")
+    lines.append("")
+
+    lines.append("4) Cantidad vs precio unitario (dispersión)")
+    r = _correlation(cube)
+    if r is None:
+        lines.append("- No hay pares suficientes de cantidad y precio.")
+    else:
+        strength = ("prácticamente nula" if abs(r) < 0.1 else "débil" if abs(r) < 0.3
+                    else "moderada" if abs(r) < 0.6 else "fuerte")
+        direction = "a más precio, menos unidades" if r < 0 else "a más precio, más unidades"
+        lines.append(f"- Correlación de Spearman {r:+.2f}: relación {strength}"
+                     + (f" ({direction})." if abs(r) >= 0.1 else "; precio y cantidad se mueven por separado."))
+        lines.append("- Acción: segmentar productos por sensibilidad al precio para promos y bundles.")
+    lines.append("")
+
+    lines.append("5) Ingresos por categoría (barras)")
+    serie = cube.revenue_by(cat_col) if cat_col else pd.Series(dtype="float64")
+    serie = serie[serie > 0]
+    if not serie.empty:
+        share = serie / serie.sum()
+        needed = int(np.searchsorted(share.cumsum().to_numpy(), PARETO_SHARE) + 1)
+        lines.append(f"- Ingresos totales {_money(serie.sum())}; la primera categoría ({serie.index[0]}) "
+                     f"explica el {100 * share.iloc[0]:.1f} %.")
+        lines.append(f"- {min(needed, len(serie))} de {len(serie)} categorías concentran el "
+                     f"{100 * PARETO_SHARE:.0f} % de la facturación.")
+        lines.append("- Acción: priorizar stock y campañas en las primeras; revisar las de menor rendimiento.")
+    else:
+        lines.append("- Sin ingresos por categoría para comparar.")
+    lines.append("")
+
+    lines.append("Notas:")
+    lines.append("- Cifras calculadas con los agregados del cubo (cuartiles aproximados al 1 %).")
+    if output_dir:
+        lines.append(f"- Los datos limpios quedaron guardados en: {output_dir}")
+    return "\n".join(lines) + "\n"
+
+# ========================= PAQUETE POR SUCURSAL =========================
+def report_fingerprint(data_dir: str, keys: dict = None, chunksize: int = None) -> str:
+    """Huella de las entradas del reporte: CSV originales, claves, opciones y versión del formato."""
+    return dataset_key(raw_paths(data_dir), keys, report_version=REPORT_VERSION, chunksize=chunksize)
+
+def read_manifest(bundle_dir: str):
+    try:
+        with open(os.path.join(bundle_dir, MANIFEST_FILE), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+def unchanged_report(data_dir: str, bundle_dir: str, keys: dict = None, chunksize: int = None):
+    """El manifest del reporte anterior si las entradas no cambiaron desde entonces; si no, None."""
+    previous = read_manifest(bundle_dir)
+    try:
+        if previous and previous.get("fingerprint") == report_fingerprint(data_dir, keys, chunksize):
+            return {**previous, "estado": "sin cambios"}
+    except OSError:  # faltan CSV: el error se informa al generar el reporte
+        pass
+    return None
+
+def _write_json(path: str, data: dict):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp, path)  # un manifest a medio escribir no debe parecer un reporte válido
+
+def build_report(data_dir: str, bundle_dir: str, keys: dict = None, chunksize: int = None,
+                 force: bool = False) -> dict:
+    """Pipeline + gráficos + tablas + conclusiones de una sucursal en `bundle_dir`; devuelve su manifest.
+
+    Con `chunksize` el detalle se procesa por bloques (ver `streaming`). Si la huella
+    no cambió desde el último reporte (y no hay `force`) no se recalcula nada.
+    """
+    previous = None if force else unchanged_report(data_dir, bundle_dir, keys, chunksize)
+    if previous is not None:
+        return previous
+    fingerprint = report_fingerprint(data_dir, keys, chunksize)
+    t0 = time.perf_counter()
+    output_dir = os.path.join(bundle_dir, "data_limpios")
+    if chunksize:
+        cleaned = stream_pipeline(data_dir, output_dir, keys=keys, chunksize=chunksize)
+    else:
+        cleaned = run_pipeline(data_dir, output_dir, keys=keys, write_integrated=False, workers=1)
+    cube, reconciliation = cleaned["cube"], cleaned["reconciliation"]
+    files = []
+    os.makedirs(os.path.join(bundle_dir, "plots"), exist_ok=True)
+    for name, build in report_figures(cube).items():
+        files.append(os.path.join("plots", f"{name}.png"))
+        with open(os.path.join(bundle_dir, files[-1]), "wb") as fh:
+            fh.write(figure_png(build()))
+    os.makedirs(os.path.join(bundle_dir, "tablas"), exist_ok=True)
+    for name, table in summary_tables(cube, reconciliation).items():
+        files.append(os.path.join("tablas", f"{name}.csv"))
+        table.to_csv(os.path.join(bundle_dir, files[-1]), index=not isinstance(table.index, pd.RangeIndex))
+    save_reconciliation(reconciliation, bundle_dir)
+    name = os.path.basename(os.path.normpath(bundle_dir))
+    with open(os.path.join(bundle_dir, CONCLUSIONS_FILE), "w", encoding="utf-8") as fh:
+        fh.write(conclusions_text(cube, reconciliation, os.path.abspath(output_dir), title=name))
+    ticket = cube.ticket_summary()
+    manifest = {
+        "sucursal": name, "data_dir": os.path.abspath(data_dir), "fingerprint": fingerprint,
+        "generado": datetime.now().isoformat(timespec="seconds"), "seconds": round(time.perf_counter() - t0, 3),
+        "lineas": cube.rows, "tickets": int(ticket.get("count", 0)),
+        "ingresos": cube.total("importe") if cube.has_measure("importe") else None,
+        "excepciones": sum(c["excepciones"] for c in reconciliation["checks"]),
+        "archivos": files + [CONCLUSIONS_FILE],
+    }
+    _write_json(os.path.join(bundle_dir, MANIFEST_FILE), manifest)
+    return {**manifest, "estado": "generado"}
+
+def _report_task(data_dir: str, bundle_dir: str, keys: dict, chunksize: int, force: bool) -> dict:
+    """`build_report` para el pool: un error queda en el resultado en lugar de cortar el lote."""
+    try:
+        return build_report(data_dir, bundle_dir, keys, chunksize, force)
+    except Exception as e:
+        return {"sucursal": os.path.basename(os.path.normpath(bundle_dir)), "data_dir": os.path.abspath(data_dir),
+                "estado": "error", "error": f"{type(e).__name__}: {e}"}
+
+def branch_names(data_dirs) -> list:
+    """Nombre de carpeta de cada sucursal (con la carpeta padre si dos se llaman igual)."""
+    parts = [os.path.normpath(os.path.abspath(d)).split(os.sep) for d in data_dirs]
+    names = [p[-1] for p in parts]
+    repeated = {n for n in names if names.count(n) > 1}
+    return ["_".join(p[-2:]) if n in repeated else n for n, p in zip(names, parts)]
+
+def _input_bytes(data_dir: str) -> int:
+    return sum(os.path.getsize(p) for p in raw_paths(data_dir).values() if os.path.exists(p))
+
+def batch_reports(data_dirs, out_root: str = "proyecto_Archivos_definitivos", workers: int = None,
+                  keys: dict = None, chunksize: int = None, force: bool = False) -> pd.DataFrame:
+    """Un reporte por carpeta de `data_dirs` en `out_root/reportes/`, en `workers` procesos.
+
+    Las sucursales más grandes se envían primero (mejor reparto entre procesos); el
+    índice resultante (también en `indice_reportes.csv`) respeta el orden recibido.
+    """
+    data_dirs = list(data_dirs)
+    root = os.path.join(out_root, REPORTS_DIRNAME)
+    os.makedirs(root, exist_ok=True)
+    bundles = [os.path.join(root, name) for name in branch_names(data_dirs)]
+    t0 = time.perf_counter()
+    results = [None if force else unchanged_report(d, b, keys, chunksize) for d, b in zip(data_dirs, bundles)]
+    pending = sorted((i for i, r in enumerate(results) if r is None), key=lambda i: -_input_bytes(data_dirs[i]))
+    if pending:  # las que no cambiaron ni siquiera llegan al pool
+        with worker_pool(min(workers or os.cpu_count() or 1, len(pending)), "process") as pool:
+            futures = {i: pool.submit(_report_task, data_dirs[i], bundles[i], keys, chunksize, force) for i in pending}
+            for i, future in futures.items():
+                results[i] = future.result()
+    index = pd.DataFrame(results, columns=["sucursal", "estado", "seconds", "lineas", "tickets", "ingresos",
+                                           "excepciones", "error", "data_dir"])
+    index.attrs["seconds"] = round(time.perf_counter() - t0, 3)
+    index.to_csv(os.path.join(root, INDEX_FILE), index=False)
+    return index
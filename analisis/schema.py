@@ -0,0 +1,191 @@
+"""Esquema declarativo de columnas y motor de tipificación en una sola pasada.
+
+Cada columna se tipifica exactamente una vez según la primera regla de `RULES` que
+coincide con (tabla, nombre):
+
+- ``id``: entero (int64, o Int64 si hay nulos); categórico si la clave no es numérica.
+- ``numeric``: float64 (o float32 si se pide).
+- ``date``: datetime64, con el formato detectado por columna (seriales de Excel,
+  ISO, día/mes/año...; ver `dates.decode_dates`).
+- ``text``: string respaldado por Arrow, recortado.
+
+Las columnas se reemplazan de a una sobre el mismo DataFrame (sin `df.copy()`).
+
+Cuando una tabla llega por bloques, cada bloque se tipifica por separado y los tipos
+pueden variar (un id con un nulo, una columna sin regla que en un bloque es entera y
+en otro decimal); `ChunkSchema` fija los del primer bloque y convierte los siguientes.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from .dates import calendar_parts, decode_dates, month_label
+
+try:
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = pd.StringDtype("pyarrow")
+except ImportError:
+    TEXT_DTYPE = pd.StringDtype("python")
+
+ID, NUMERIC, DATE, TEXT = "id", "numeric", "date", "text"
+
+# (tablas o None = todas, patrón sobre el nombre normalizado, tipo); gana la primera que coincide
+RULES = (
+    (None, r"^(cantidad|precio_unitario|importe|total|monto|monto_total|descuento)$", NUMERIC),
+    (("ventas", "detalle"), r"^(fecha|fecha_venta|created_at)$", DATE),
+    (("clientes",), r"^fecha_alta$", DATE),
+    (None, r"(^|_)id(_|$)|^id|id$", ID),
+)
+
+def column_kind(table: str, col: str, overrides: dict = None):
+    """Tipo declarado para `table.col` (None = se deja como lo infirió el lector, salvo texto)."""
+    if overrides and col in overrides.get(table, {}):
+        return overrides[table][col]
+    for tables, pattern, kind in RULES:
+        if (tables is None or table in tables) and re.search(pattern, col):
+            return kind
+    return None
+
+# ========================= CONVERSORES =========================
+def _is_text(s: pd.Series) -> bool:
+    return s.dtype == object or isinstance(s.dtype, pd.StringDtype)
+
+def as_text(s: pd.Series) -> pd.Series:
+    """String Arrow recortado; los nulos quedan como <NA> (no como 'nan')."""
+    return s.astype(TEXT_DTYPE).str.strip()
+
+def as_numeric(s: pd.Series, float_dtype="float64") -> pd.Series:
+    if _is_text(s):
+        s = as_text(s)
+    return pd.to_numeric(s, errors="coerce").astype(float_dtype)
+
+def as_id(s: pd.Series) -> pd.Series:
+    """Clave entera si todos los valores no nulos son enteros; si no, categórica (texto recortado)."""
+    if _is_text(s):
+        text = as_text(s)
+        num = pd.to_numeric(text, errors="coerce")
+        if num.notna().sum() != text.notna().sum():
+            return text.astype("category")
+    else:
+        num = s
+    if not pd.api.types.is_numeric_dtype(num):
+        return num.astype(TEXT_DTYPE).astype("category")
+    values = num.to_numpy(dtype="float64", na_value=np.nan)
+    valid = ~np.isnan(values)
+    if not np.array_equal(values[valid], np.round(values[valid])):
+        return num.astype("float64")
+    return num.astype("int64" if valid.all() else "Int64")
+
+def as_date(s: pd.Series) -> pd.Series:
+    return decode_dates(s)
+
+DATE_COLS = ("fecha", "fecha_venta")
+
+def detect_date_col(columns):
+    """Columna de fecha de la venta (la misma que usan `anio`/`mes` derivados)."""
+    return next((c for c in DATE_COLS if c in columns), None)
+
+def date_parts(fechas: pd.Series):
+    """(anio, mes 'AAAA-MM') de una columna de fechas, vía la dimensión calendario (ver `dates`)."""
+    parts = calendar_parts(fechas, ("anio", "mes_id"))
+    return parts["anio"], month_label(parts["mes_id"])
+
+def type_column(s: pd.Series, kind, float_dtype="float64") -> pd.Series:
+    """Aplica el conversor de `kind` (o recorta texto si la columna no tiene tipo declarado)."""
+    if kind == ID:
+        return as_id(s)
+    if kind == NUMERIC:
+        return as_numeric(s, float_dtype)
+    if kind == DATE:
+        return as_date(s)
+    if kind == TEXT or _is_text(s):
+        return as_text(s)
+    return s
+
+def apply_schema(df: pd.DataFrame, table: str, overrides: dict = None, float_dtype="float64") -> pd.DataFrame:
+    """Tipifica `df` en el lugar (columna por columna) y lo devuelve."""
+    for col in df.columns:
+        df[col] = type_column(df[col], column_kind(table, col, overrides), float_dtype)
+    return df
+
+def drop_header_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Elimina (en el lugar) filas que repiten el encabezado, típicas de exportaciones concatenadas."""
+    text_cols = [c for c in df.columns if _is_text(df[c])]
+    if not text_cols or len(text_cols) < len(df.columns):
+        return df  # si alguna columna ya es numérica, no puede haber encabezados repetidos
+    mask = np.ones(len(df), dtype=bool)
+    for c in text_cols:
+        mask &= (df[c].astype(TEXT_DTYPE).str.strip() == str(c).strip()).fillna(False).to_numpy(dtype=bool)
+        if not mask.any():
+            return df
+    df.drop(index=df.index[mask], inplace=True)
+    return df
+
+# ========================= ESQUEMA POR BLOQUES =========================
+def dtype_kind(dtype) -> str:
+    """Tipo de una columna a efectos de las salidas: int (int64 e Int64 se escriben igual), float64, text..."""
+    if isinstance(dtype, pd.CategoricalDtype):
+        return "category"
+    if dtype == object or isinstance(dtype, pd.StringDtype):
+        return "text"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int"
+    return str(dtype)
+
+def _integral(num: pd.Series) -> bool:
+    values = num.to_numpy(dtype="float64", na_value=np.nan)
+    values = values[~np.isnan(values)]
+    return np.array_equal(values, np.round(values))
+
+def _as_textual(s: pd.Series) -> pd.Series:
+    if pd.api.types.is_float_dtype(s) and _integral(s):
+        s = s.astype("Int64")  # 5.0 → "5", como en el archivo
+    return as_text(s)
+
+def cast_kind(s: pd.Series, kind: str) -> pd.Series:
+    """`s` convertida al tipo `kind` de `dtype_kind`; ValueError si se perderían valores."""
+    if dtype_kind(s.dtype) == kind:
+        return s
+    if kind in ("text", "category"):
+        text = _as_textual(s)
+        return text.astype("category") if kind == "category" else text
+    if kind.startswith("datetime"):
+        return pd.to_datetime(s, errors="coerce").astype(kind)
+    num = pd.to_numeric(as_text(s) if _is_text(s) else s, errors="coerce")
+    if num.notna().sum() != s.notna().sum():
+        raise ValueError(f"hay valores que no son números ({kind})")
+    if kind == "int":
+        if not _integral(num):
+            raise ValueError("hay valores con decimales (int)")
+        return num.astype("int64" if num.notna().all() else "Int64")
+    return num.astype(kind)
+
+class ChunkSchema:
+    """Tipos fijados por el primer bloque con filas de `table`; `conform` lleva a ellos los bloques siguientes.
+
+    `kinds` (columna → `dtype_kind`) se puede guardar y volver a pasar, p.ej. entre corridas incrementales.
+    """
+
+    def __init__(self, table: str, kinds: dict = None):
+        self.table = table
+        self.kinds = dict(kinds or {})
+
+    def conform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Convierte (en el lugar) las columnas de `df` al tipo fijado y devuelve `df`."""
+        if not self.kinds:
+            if len(df):
+                self.kinds = {col: dtype_kind(df[col].dtype) for col in df.columns}
+            return df
+        for col in df.columns:
+            kind = self.kinds.get(col)
+            if kind is None:
+                if len(df):
+                    self.kinds[col] = dtype_kind(df[col].dtype)
+                continue
+            try:
+                df[col] = cast_kind(df[col], kind)
+            except ValueError as e:
+                raise ValueError(f"{self.table}.{col}: un bloque no respeta el tipo del primero: {e}. "
+                                 f"Declarar el tipo con schema, p.ej. {{'{self.table}': {{'{col}': 'text'}}}}") from e
+        return df
@@ -0,0 +1,268 @@
+"""Resúmenes acotados y combinables (sketches) para procesar datos por bloques.
+
+- `bucket_index` / `quantiles_from_buckets`: buckets logarítmicos (estilo DDSketch) con
+  los que el cubo guarda cuantiles de error relativo acotado.
+- `Reservoir`: muestra aleatoria uniforme de tamaño fijo (claves aleatorias + top-k).
+- `HyperLogLog`: cantidad aproximada de valores distintos a partir de hashes de 64 bits.
+- `TopK`: valores más frecuentes, con una cota del error de cada conteo.
+- `HashSample`: muestra por valor de hash (todas las copias de un valor o ninguna),
+  para estimar cuántas filas repetidas hay sin guardar todas las filas.
+
+Los sketches se alimentan con arrays/DataFrames completos (vectorizado) y se pueden
+fusionar con `merge`, de modo que cada bloque o proceso puede tener el suyo.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+def gamma_for(rel_acc: float) -> float:
+    return (1 + rel_acc) / (1 - rel_acc)
+
+def bucket_index(values, gamma: float):
+    """Signo (-1/0/1) y bucket logarítmico de cada valor finito (vectorizado)."""
+    v = np.asarray(values, dtype="float64")
+    sign = np.sign(v).astype(np.int8)
+    idx = np.zeros(v.shape, dtype=np.int64)
+    nz = sign != 0
+    idx[nz] = np.ceil(np.log(np.abs(v[nz])) / math.log(gamma)).astype(np.int64)
+    return sign, idx
+
+def bucket_values(sign, idx, gamma: float) -> np.ndarray:
+    """Valor representativo de cada bucket (error relativo ≤ rel_acc)."""
+    sign = np.asarray(sign, dtype="float64")
+    return sign * 2 * np.power(gamma, np.asarray(idx, dtype="float64")) / (gamma + 1)
+
+def quantiles_from_buckets(sign, idx, counts, qs, gamma: float, vmin=-math.inf, vmax=math.inf) -> list:
+    """Cuantiles a partir de conteos por bucket (p.ej. la suma de varias celdas de un cubo)."""
+    sign, idx, counts = (np.asarray(a) for a in (sign, idx, counts))
+    total = counts.sum() if counts.size else 0
+    if total == 0:
+        return [math.nan for _ in qs]
+    order = np.lexsort((sign * idx, sign))  # negativos de mayor a menor magnitud, ceros, positivos
+    values = bucket_values(sign[order], idx[order], gamma)
+    cum = np.cumsum(counts[order])
+    out = []
+    for q in qs:
+        j = min(int(np.searchsorted(cum, q * (total - 1), side="right")), len(values) - 1)
+        out.append(float(min(max(values[j], vmin), vmax)))
+    return out
+
+class Reservoir:
+    """Muestra uniforme de hasta `size` filas de un flujo de DataFrames."""
+
+    def __init__(self, size: int = 50_000, seed: int = 0):
+        self.size = size
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+        self._keys = np.empty(0)
+        self._rows = None
+
+    def update(self, df: pd.DataFrame) -> "Reservoir":
+        if df.empty:
+            return self
+        keys = self._rng.random(len(df))
+        self.seen += len(df)
+        return self._combine(keys, df.reset_index(drop=True))
+
+    def merge(self, other: "Reservoir") -> "Reservoir":
+        if other._rows is None:
+            return self
+        self.seen += other.seen
+        return self._combine(other._keys, other._rows)
+
+    def _combine(self, keys: np.ndarray, rows: pd.DataFrame) -> "Reservoir":
+        if self._rows is not None:
+            keys = np.concatenate([self._keys, keys])
+            rows = pd.concat([self._rows, rows], ignore_index=True)
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[: self.size]
+            keep.sort()
+            keys, rows = keys[keep], rows.iloc[keep].reset_index(drop=True)
+        self._keys, self._rows = keys, rows
+        return self
+
+    @property
+    def sample(self) -> pd.DataFrame:
+        return self._rows if self._rows is not None else pd.DataFrame()
+
+def _bit_length(w: np.ndarray) -> np.ndarray:
+    """Bits significativos de cada uint64 (exacto: cada mitad de 32 bits cabe en un float64)."""
+    hi = (w >> np.uint64(32)).astype("float64")
+    lo = (w & np.uint64(0xFFFFFFFF)).astype("float64")
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+class HyperLogLog:
+    """Distintos aproximados (error típico 1.04/√2^precision, ≈0,8 % con 14) sobre hashes uint64.
+
+    Mientras haya a lo sumo `exact_limit` hashes distintos se guardan tal cual y el
+    conteo es exacto (como la representación dispersa de HLL++).
+    """
+
+    def __init__(self, precision: int = 14, exact_limit: int = 1 << 15):
+        self.precision = precision
+        self.m = 1 << precision
+        self.exact_limit = exact_limit
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+        self._exact = np.empty(0, dtype=np.uint64)
+
+    def update(self, hashes) -> "HyperLogLog":
+        h = np.asarray(hashes, dtype=np.uint64)
+        if not h.size:
+            return self
+        p = self.precision
+        idx = (h >> np.uint64(64 - p)).astype(np.intp)
+        rank = (64 - p + 1) - _bit_length(h & np.uint64((1 << (64 - p)) - 1))
+        np.maximum.at(self.registers, idx, rank.astype(np.uint8))
+        if self._exact is not None:
+            self._exact = np.union1d(self._exact, h) if h.size <= self.exact_limit else None
+            if self._exact is not None and self._exact.size > self.exact_limit:
+                self._exact = None
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("No se pueden fusionar HyperLogLog con distinta precisión")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        if self._exact is not None and other._exact is not None:
+            self._exact = np.union1d(self._exact, other._exact)
+            if self._exact.size > self.exact_limit:
+                self._exact = None
+        else:
+            self._exact = None
+        return self
+
+    @property
+    def exact(self) -> bool:
+        return self._exact is not None
+
+    def count(self) -> int:
+        if self._exact is not None:
+            return int(self._exact.size)
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # corrección para cardinalidades chicas
+        return int(round(estimate))
+
+class TopK:
+    """Valores más frecuentes: `value_counts` por bloque, fusionados y truncados a `capacity`.
+
+    Un valor descartado en un truncado pudo haber tenido a lo sumo el conteo del
+    primero descartado; `error` suma esas cotas (0 = conteos exactos).
+    """
+
+    def __init__(self, k: int = 5, capacity: int = None):
+        self.k = k
+        self.capacity = capacity or max(100, 20 * k)
+        self.counts = pd.Series(dtype="int64")
+        self.error = 0
+
+    def update_counts(self, counts: pd.Series) -> "TopK":
+        """Conteos ya agregados (índice = valor), p.ej. de un `value_counts` o un `factorize`."""
+        if len(self.counts):
+            counts = pd.concat([self.counts, counts]).groupby(level=0, sort=False).sum()
+        if len(counts) > self.capacity:
+            counts = counts.sort_values(ascending=False, kind="stable")
+            self.error += int(counts.iloc[self.capacity])
+            counts = counts.iloc[: self.capacity]
+        self.counts = counts
+        return self
+
+    def update(self, values: pd.Series) -> "TopK":
+        return self.update_counts(values.value_counts(dropna=True, sort=False))
+
+    def merge(self, other: "TopK") -> "TopK":
+        self.error += other.error
+        return self.update_counts(other.counts)
+
+    def top(self, k: int = None) -> list:
+        """[(valor, conteo)] de los `k` más frecuentes, de mayor a menor."""
+        top = self.counts.sort_values(ascending=False, kind="stable").iloc[: k or self.k]
+        return list(zip(top.index.tolist(), top.astype("int64").tolist()))
+
+class HashSample:
+    """Hashes uint64 con su conteo, sólo los menores que 2^(64-nivel) (muestreo por valor adaptativo).
+
+    Cuando hay más de `limit` hashes distintos se sube el nivel y se descarta la mitad
+    de arriba; como las copias de un valor tienen el mismo hash, quedan todas o
+    ninguna, y multiplicar por 2^nivel estima distintos y repetidos sin sesgo.
+    Con nivel 0 (hasta `limit` distintos) ambos conteos son exactos.
+    """
+
+    def __init__(self, limit: int = 1 << 20):
+        self.limit = limit
+        self.level = 0
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def _bound(self):
+        return None if self.level == 0 else np.uint64(1 << (64 - self.level))
+
+    def _absorb(self, hashes: np.ndarray, counts: np.ndarray) -> "HashSample":
+        hashes = np.concatenate([self.hashes, hashes])
+        counts = np.concatenate([self.counts, counts])
+        order = np.argsort(hashes, kind="stable")
+        hashes, counts = hashes[order], counts[order]
+        starts = np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]]) if hashes.size else np.empty(0, np.intp)
+        self.hashes, self.counts = hashes[starts], np.add.reduceat(counts, starts) if starts.size else counts
+        while self.hashes.size > self.limit:
+            self.level += 1
+            keep = int(np.searchsorted(self.hashes, self._bound()))  # ordenados: se queda el prefijo
+            self.hashes, self.counts = self.hashes[:keep], self.counts[:keep]
+        return self
+
+    def update(self, hashes) -> "HashSample":
+        h = np.asarray(hashes, dtype=np.uint64)
+        if self.level:
+            h = h[h < self._bound()]
+        uniq, counts = np.unique(h, return_counts=True)
+        return self._absorb(uniq, counts.astype(np.int64))
+
+    def merge(self, other: "HashSample") -> "HashSample":
+        self.level = max(self.level, other.level)
+        bound = self._bound()
+        mine = slice(None) if bound is None else self.hashes < bound
+        theirs = slice(None) if bound is None else other.hashes < bound
+        self.hashes, self.counts = self.hashes[mine], self.counts[mine]
+        return self._absorb(other.hashes[theirs], other.counts[theirs])
+
+    @property
+    def exact(self) -> bool:
+        return self.level == 0
+
+    def distinct(self) -> int:
+        return int(self.hashes.size) << self.level
+
+    def repeated(self) -> int:
+        """Copias de más (total − distintos), como `duplicated().sum()`."""
+        return int(self.counts.sum() - self.hashes.size) << self.level
+
+def box_stats(label, quartiles, vmin: float, vmax: float, mean: float = math.nan, n: int = 0,
+              sample=None, whis: float = 1.5, max_fliers: int = 200) -> dict:
+    """Estadísticos para `Axes.bxp` (cuartiles, bigotes y outliers muestreados y acotados).
+
+    `quartiles` es (q1, mediana, q3); los bigotes se ajustan a la muestra si la hay y
+    los extremos exactos (`vmin`, `vmax`) fuera de los bigotes siempre se incluyen.
+    """
+    q1, med, q3 = quartiles
+    iqr = q3 - q1
+    lo_lim, hi_lim = q1 - whis * iqr, q3 + whis * iqr
+    fliers = np.empty(0)
+    if sample is not None and len(sample):
+        s = np.asarray(sample, dtype="float64")
+        inside = s[(s >= lo_lim) & (s <= hi_lim)]
+        whislo = float(inside.min()) if inside.size else max(vmin, lo_lim)
+        whishi = float(inside.max()) if inside.size else min(vmax, hi_lim)
+        fliers = s[(s < lo_lim) | (s > hi_lim)][:max_fliers]
+    else:
+        whislo, whishi = max(vmin, lo_lim), min(vmax, hi_lim)
+    extremes = [x for x in (vmin, vmax) if x < lo_lim or x > hi_lim]
+    fliers = np.unique(np.concatenate([fliers, np.asarray(extremes, dtype="float64")]))
+    return {
+        "label": label, "med": med, "q1": q1, "q3": q3,
+        "whislo": min(whislo, q1), "whishi": max(whishi, q3), "fliers": fliers,
+        "mean": mean, "n": n,
+    }
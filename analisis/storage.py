@@ -0,0 +1,142 @@
+"""Salida Parquet de las tablas limpias, particionada por `anio`/`mes` y con tipos preservados.
+
+Estructura (junto a los CSV de `data_limpios`)::
+
+    parquet/clientes/part-0.parquet
+    parquet/productos/part-0.parquet
+    parquet/ventas/anio=2024/mes=2024-06/part-0.parquet
+    parquet/detalle/anio=2024/mes=2024-06/part-0.parquet
+    parquet/integrado/anio=2024/mes=2024-06/part-0.parquet
+
+`ventas` se particiona por la fecha de la venta y `detalle` por la fecha de la venta a
+la que pertenece cada línea (las mismas `anio`/`mes` que el integrado). Los archivos se
+escriben una sola vez (comprimidos con zstd) y se leen de forma perezosa con
+`read_table`: sólo las columnas y particiones pedidas.
+
+Los modos por bloques e incremental agregan archivos nuevos a las particiones
+(`basename`) en lugar de reescribir la tabla.
+"""
+import glob
+import io
+import os
+import shutil
+import zipfile
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # sin pyarrow sólo queda disponible la salida CSV
+    pa = ds = pq = None
+
+from .joins import lookup_positions
+from .schema import date_parts, detect_date_col
+
+PARQUET_DIRNAME = "parquet"
+FORMATS = ("csv", "parquet")
+PARTITION_COLS = ["anio", "mes"]
+COMPRESSION = "zstd"
+_ADDED_PARTITIONS = ("ventas", "detalle")  # tablas sin anio/mes propios: se quitan al leer
+
+def parse_formats(formats) -> tuple:
+    """Normaliza `formats` ("csv", "parquet", "csv,parquet" o una secuencia) y lo valida."""
+    if isinstance(formats, str):
+        formats = formats.split(",")
+    formats = tuple(f.strip().lower() for f in formats if f and f.strip())
+    unknown = set(formats) - set(FORMATS)
+    if unknown or not formats:
+        raise ValueError(f"Formato de salida no soportado: {', '.join(sorted(unknown)) or '(vacío)'}")
+    if "parquet" in formats and pa is None:
+        raise ValueError("La salida Parquet requiere pyarrow (pip install pyarrow)")
+    return formats
+
+def table_dir(output_dir: str, name: str) -> str:
+    return os.path.join(output_dir, PARQUET_DIRNAME, name)
+
+# ========================= PARTICIONES =========================
+def ventas_partitions(ventas: pd.DataFrame) -> pd.DataFrame:
+    """`anio`/`mes` de cada venta (vacío si ventas no tiene fecha)."""
+    fecha_col = detect_date_col(ventas.columns)
+    if not fecha_col:
+        return pd.DataFrame(index=ventas.index)
+    anio, mes = date_parts(ventas[fecha_col])
+    return pd.DataFrame({"anio": anio, "mes": mes}, index=ventas.index)
+
+def detalle_partitions(detalle: pd.DataFrame, ventas: pd.DataFrame, det_venta_key: str, venta_key: str) -> pd.DataFrame:
+    """`anio`/`mes` de la venta de cada línea (nulos si la venta no existe)."""
+    parts = ventas_partitions(ventas)
+    if parts.empty:
+        return pd.DataFrame(index=detalle.index)
+    first = ~ventas[venta_key].duplicated().to_numpy()
+    pos = lookup_positions(detalle[det_venta_key], ventas[venta_key][first])
+    return pd.DataFrame({c: pd.api.extensions.take(parts[c].to_numpy()[first], pos, allow_fill=True)
+                         for c in parts.columns}, index=detalle.index)
+
+# ========================= ESCRITURA / LECTURA =========================
+def clear_table(output_dir: str, name: str) -> str:
+    """Vacía `parquet/<name>/` antes de escribirlo por partes (bloques o lotes)."""
+    path = table_dir(output_dir, name)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def write_table(df: pd.DataFrame, output_dir: str, name: str, partitions: pd.DataFrame = None,
+                basename: str = None) -> str:
+    """Escribe `df` en `parquet/<name>/` (particionado si hay `partitions` o columnas anio/mes).
+
+    Sin `basename` la tabla se reemplaza entera; con `basename` (p.ej. "lote00003")
+    se agregan archivos nuevos a las particiones existentes.
+    """
+    path = clear_table(output_dir, name) if basename is None else table_dir(output_dir, name)
+    os.makedirs(path, exist_ok=True)
+    if partitions is not None and not partitions.empty:
+        df = df.assign(**{c: partitions[c].to_numpy() for c in partitions.columns})
+    cols = [c for c in PARTITION_COLS if c in df.columns]
+    if "anio" in cols:
+        df = df.assign(anio=pd.to_numeric(df["anio"], errors="coerce").astype("Int64"))  # anio=2024, no 2024.0
+    template = f"{basename or 'part'}-{{i}}.parquet"
+    if cols:
+        df.to_parquet(path, partition_cols=cols, compression=COMPRESSION, index=False,
+                      basename_template=template, existing_data_behavior="overwrite_or_ignore")
+    else:
+        df.to_parquet(os.path.join(path, template.format(i=0)), compression=COMPRESSION, index=False)
+    return path
+
+def remove_batch(output_dir: str, name: str, prefix: str) -> int:
+    """Borra los archivos cuyo nombre empieza con `prefix` (p.ej. de una corrida incremental interrumpida)."""
+    files = glob.glob(os.path.join(table_dir(output_dir, name), "**", f"{prefix}*.parquet"), recursive=True)
+    for f in files:
+        os.remove(f)
+    return len(files)
+
+def read_table(output_dir: str, name: str, columns=None, filters=None) -> pd.DataFrame:
+    """Lee `parquet/<name>/` cargando sólo `columns` y las particiones que cumplen `filters`.
+
+    `filters` usa la sintaxis de pyarrow, p.ej. ``[("anio", "=", 2024), ("mes", "in", ["2024-06"])]``.
+    """
+    data = dataset(output_dir, name)
+    if columns is None:
+        columns = [c for c in data.schema.names if not (name in _ADDED_PARTITIONS and c in PARTITION_COLS)]
+    expr = pq.filters_to_expression(filters) if filters else None
+    return data.to_table(columns=list(columns), filter=expr).to_pandas()
+
+def dataset(output_dir: str, name: str):
+    """`pyarrow.dataset` perezoso de `parquet/<name>/` (anio entero y mes texto en las particiones)."""
+    path = table_dir(output_dir, name)
+    partitioned = any(entry.is_dir() for entry in os.scandir(path))
+    partitioning = ds.partitioning(pa.schema([("anio", pa.int64()), ("mes", pa.string())]), flavor="hive") \
+        if partitioned else None
+    return ds.dataset(path, format="parquet", partitioning=partitioning)
+
+def zip_table(output_dir: str, name: str) -> bytes:
+    """Los archivos ya escritos de `parquet/<name>/` en un ZIP sin recomprimir (para descargar)."""
+    path = table_dir(output_dir, name)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as zf:
+        for root, _, files in os.walk(path):
+            for f in sorted(files):
+                full = os.path.join(root, f)
+                zf.write(full, os.path.relpath(full, os.path.dirname(path)))
+    return buf.getvalue()
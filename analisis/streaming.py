@@ -0,0 +1,240 @@
+"""Modo streaming: `detalle_ventas` se procesa por bloques y nunca se carga entero.
+
+Las dimensiones (`clientes`, `productos`, `ventas`) se cargan y tipifican en
+memoria; el detalle se lee en bloques de `chunksize` filas. Cada bloque se limpia,
+se integra contra las dimensiones, se escribe (append) en los CSV de salida y
+alimenta al `CubeBuilder` (ver `cube`) y a un `TicketAccumulator`, que mantienen
+lo que necesitan los gráficos del Paso 3 con memoria acotada: el cubo de agregados
+por celda y los totales por ticket acumulados por posición de la venta. Los tipos
+del detalle los fija el primer bloque (`schema.ChunkSchema`), así todas las partes
+Parquet comparten esquema y los CSV no cambian de formato a mitad de archivo. Los bloques
+también pasan por el `reconcile.Reconciler`; `stream_reconcile` corre sólo esos
+controles (sin escribir salidas), p.ej. para validar cada carga nocturna.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from .cube import CubeBuilder, cube_dims
+from .joins import dims_are_unique, integrate_gather, lookup_positions
+from .pipeline import (
+    CLEAN_FILES, INTEGRATED_FILE, add_derived, detect_cat_col, detect_total_col, ensure_dir, export_clean,
+    integrate_merge, normalize_names, resolve_keys,
+)
+from .profiling import measure, progress, table_rows
+from .readers import raw_paths, robust_read_csv, sniff_csv
+from .reconcile import DEFAULT_TOLERANCE, MAX_EXCEPTIONS, Reconciler
+from .schema import ChunkSchema, apply_schema, drop_header_rows
+from .storage import clear_table, detalle_partitions, parse_formats, write_table
+
+DEFAULT_CHUNKSIZE = 500_000
+
+class TicketAccumulator:
+    """Total por ticket acumulado por posición en `ventas` (memoria = nº de ventas, no de líneas)."""
+
+    def __init__(self, venta_ids: pd.Series, base_col=None, ticket_dims=()):
+        self.venta_ids = venta_ids.reset_index(drop=True)
+        self.base_col = base_col
+        self.ticket_dims = list(ticket_dims)
+        n = len(venta_ids)
+        self._sum = np.zeros(n)
+        self._lines = np.zeros(n, dtype=np.int64)
+        self._attrs = {d: np.full(n, None, dtype=object) for d in self.ticket_dims}
+        self._orphans = []
+
+    def update(self, df: pd.DataFrame, venta_pos: np.ndarray, det_venta_key: str) -> "TicketAccumulator":
+        """`venta_pos` es la fila de `ventas` de cada línea (-1 si la venta no existe)."""
+        if not self.base_col or self.base_col not in df.columns:
+            return self
+        weights = np.nan_to_num(pd.to_numeric(df[self.base_col], errors="coerce").to_numpy(dtype="float64"))
+        matched = venta_pos >= 0
+        n = len(self.venta_ids)
+        self._sum += np.bincount(venta_pos[matched], weights=weights[matched], minlength=n)
+        self._lines += np.bincount(venta_pos[matched], minlength=n)
+        # atributos del ticket: se toman de la primera línea vista
+        pos = venta_pos[matched]
+        for d in self.ticket_dims:
+            values = df[d].to_numpy(dtype=object)[matched]
+            unset = pd.isna(self._attrs[d][pos])
+            self._attrs[d][pos[unset]] = values[unset]
+        if not matched.all():
+            orphans = pd.DataFrame({"key": df[det_venta_key].to_numpy()[~matched], "total_ticket": weights[~matched]})
+            for d in self.ticket_dims:
+                orphans[d] = df[d].to_numpy(dtype=object)[~matched]
+            agg = {"total_ticket": "sum", **{d: "first" for d in self.ticket_dims}}
+            self._orphans.append(orphans.groupby("key", sort=False).agg(agg))
+        return self
+
+    def totals(self):
+        """(totales, atributos) con un elemento por ticket que tuvo al menos una línea."""
+        has_lines = self._lines > 0
+        index = self.venta_ids[has_lines].to_numpy()
+        totals = pd.Series(self._sum[has_lines], index=index, name="total_ticket")
+        attrs = pd.DataFrame({d: v[has_lines] for d, v in self._attrs.items()}, index=index)
+        if self._orphans:
+            orphans = pd.concat(self._orphans)
+            agg = {"total_ticket": "sum", **{d: "first" for d in self.ticket_dims}}
+            orphans = orphans.groupby(level=0, sort=False).agg(agg)
+            totals = pd.concat([totals, orphans["total_ticket"]])
+            attrs = pd.concat([attrs, orphans[self.ticket_dims]])
+        return totals, attrs
+
+def prepare_raw(df: pd.DataFrame, name: str, schema=None, float_dtype="float64") -> pd.DataFrame:
+    """Pasos 1–5 sobre una tabla o bloque crudo: sin Unnamed ni encabezados repetidos, nombres y tipos."""
+    df = df.loc[:, ~df.columns.astype(str).str.contains(r"^Unnamed")]
+    drop_header_rows(df)
+    df.columns = normalize_names(df.columns)
+    return apply_schema(df, name, schema, float_dtype)
+
+def iter_chunks(path: str, chunksize: int = DEFAULT_CHUNKSIZE):
+    """Bloques crudos del CSV, con el dialecto detectado una sola vez sobre el prefijo."""
+    dialect = sniff_csv(path)
+    return pd.read_csv(path, sep=dialect["sep"], encoding=dialect["encoding"], chunksize=chunksize)
+
+def stream_pipeline(data_dir: str, output_dir: str, keys: dict = None, chunksize: int = DEFAULT_CHUNKSIZE,
+                    cache=None, write_integrated: bool = False, sample_size: int = 50_000,
+                    schema: dict = None, float_dtype="float64", track_memory: bool = False,
+                    formats=("csv",)) -> dict:
+    """Limpia e integra con `detalle` por bloques; devuelve dimensiones + agregados (sin `integrado`).
+
+    En Parquet cada bloque agrega sus propios archivos a las particiones de detalle e integrado.
+    """
+    formats = parse_formats(formats)
+    paths = raw_paths(data_dir)
+    missing = [k for k, p in paths.items() if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"Faltan archivos: {', '.join(missing)} en {data_dir}")
+
+    report = []
+    read = (lambda p: cache.load(p, robust_read_csv)) if cache is not None else robust_read_csv
+    with measure(report, "load+type:dims", track_memory) as rows:
+        tables = {name: prepare_raw(read(paths[name]), name, schema, float_dtype)
+                  for name in ("clientes", "productos", "ventas")}
+        rows["rows_out"] = table_rows(*tables.values())
+    ensure_dir(output_dir)
+    written = export_clean(tables, output_dir, formats)
+
+    out_paths = {}
+    if "csv" in formats:
+        out_paths = {name: os.path.join(output_dir, fname) for name, fname in CLEAN_FILES.items()}
+        if write_integrated:
+            out_paths["integrado"] = os.path.join(output_dir, INTEGRATED_FILE)
+    handles = {name: open(out_paths[name], "w", encoding="utf-8", newline="")
+               for name in ("detalle", "integrado") if name in out_paths}
+    parquet_dirs = written["parquet"]
+    if "parquet" in formats:
+        parquet_dirs.update({name: clear_table(output_dir, name) for name in ("detalle", "integrado")})
+
+    total_col = detect_total_col(tables["ventas"])
+    builder, tickets, reconciler, preview, integrate, n_chunks = None, None, None, None, None, 0
+    detalle_schema = ChunkSchema("detalle")
+    try:
+        with measure(report, "stream:detalle", track_memory) as rows:
+            rows["rows_in"] = rows["rows_out"] = 0
+            for i, raw in enumerate(iter_chunks(paths["detalle"], chunksize)):
+                rows["rows_in"] += len(raw)
+                chunk = detalle_schema.conform(prepare_raw(raw, "detalle", schema, float_dtype))
+                if builder is None:
+                    keys = resolve_keys({**tables, "detalle": chunk}, keys)
+                    cli_pair = [(tables["clientes"], keys["cli_key_cli"])] if keys.get("cli_key_cli") else []
+                    unique = dims_are_unique((tables["productos"], keys["prod_key"]),
+                                             (tables["ventas"], keys["venta_key"]), *cli_pair)
+                    integrate = integrate_gather if unique else integrate_merge
+                    preview = chunk.head(100)
+                    reconciler = Reconciler(tables, keys, total_col)
+                    # los tickets se acumulan por la primera fila de cada venta (como el gather)
+                    venta_ids = tables["ventas"][keys["venta_key"]]
+                    venta_ids = venta_ids[~venta_ids.duplicated()]
+                reconciler.update(chunk)
+                if "detalle" in handles:
+                    chunk.to_csv(handles["detalle"], header=i == 0, index=False)
+                df = add_derived(integrate({**tables, "detalle": chunk}, keys))
+                if "parquet" in formats:
+                    part = detalle_partitions(chunk, tables["ventas"], keys["det_venta_key"], keys["venta_key"])
+                    write_table(chunk, output_dir, "detalle", part, basename=f"bloque{i:05d}")
+                    write_table(df, output_dir, "integrado", basename=f"bloque{i:05d}")
+                if builder is None:
+                    cat_col = detect_cat_col(df)
+                    builder = CubeBuilder(cube_dims(df.columns, cat_col), sample_size=sample_size)
+                    base_col = "importe" if "importe" in df.columns else (
+                        "subtotal_calc" if "subtotal_calc" in df.columns else None)
+                    tickets = TicketAccumulator(venta_ids, base_col, builder.ticket_dims)
+                if "integrado" in handles:
+                    df.to_csv(handles["integrado"], header=i == 0, index=False)
+                builder.update(df)
+                rows["rows_out"] += len(df)
+                venta_pos = lookup_positions(df[keys["det_venta_key"]], venta_ids)
+                tickets.update(df, venta_pos, keys["det_venta_key"])
+                n_chunks += 1
+                progress("stream:detalle", rows_out=rows["rows_out"], chunks=n_chunks)
+    finally:
+        for fh in handles.values():
+            fh.close()
+    if builder is None:
+        raise ValueError(f"{paths['detalle']} no tiene filas")
+    report.append({"step": "chunks", "seconds": 0.0, "count": n_chunks})
+    with measure(report, "reconcile", track_memory, rows_in=reconciler.lines) as rows:
+        reconciliation = reconciler.build()
+        rows["exceptions"] = sum(c["excepciones"] for c in reconciliation["checks"])
+
+    with measure(report, "aggregate", track_memory, rows_in=builder.rows) as rows:
+        ventas = tables["ventas"]
+        if total_col:
+            totals = pd.Series(ventas[total_col].to_numpy(), index=ventas[keys["venta_key"]].to_numpy())
+            _, attrs = tickets.totals()
+            attrs = attrs[~attrs.index.duplicated()].reindex(totals.index)
+        else:
+            totals, attrs = tickets.totals()
+        builder.set_tickets(totals, attrs)
+        cube = builder.build({"cat_col": cat_col, "total_col": total_col})
+        cube.save(output_dir)
+        rows["rows_out"] = len(cube.cells)
+
+    return {
+        **tables,
+        "detalle": preview,
+        "integrado": None,
+        "streaming": True,
+        "cube": cube,
+        "index": None,
+        "rows": builder.rows,
+        "cat_col": cat_col,
+        "total_col": total_col,
+        "reconciliation": reconciliation,
+        "keys": keys,
+        "paths": out_paths,
+        "parquet": parquet_dirs,
+        "report": report,
+    }
+
+def stream_reconcile(data_dir: str, keys: dict = None, chunksize: int = DEFAULT_CHUNKSIZE, cache=None,
+                     schema: dict = None, float_dtype="float64", tolerance: float = DEFAULT_TOLERANCE,
+                     max_exceptions: int = MAX_EXCEPTIONS, track_memory: bool = False) -> dict:
+    """Sólo la conciliación (`reconcile`) de los CSV originales, con el detalle leído por bloques."""
+    paths = raw_paths(data_dir)
+    missing = [k for k, p in paths.items() if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"Faltan archivos: {', '.join(missing)} en {data_dir}")
+    report = []
+    read = (lambda p: cache.load(p, robust_read_csv)) if cache is not None else robust_read_csv
+    with measure(report, "load+type:dims", track_memory) as rows:
+        tables = {name: prepare_raw(read(paths[name]), name, schema, float_dtype)
+                  for name in ("clientes", "productos", "ventas")}
+        rows["rows_out"] = table_rows(*tables.values())
+    reconciler = None
+    with measure(report, "reconcile", track_memory) as rows:
+        rows["rows_in"] = 0
+        for raw in iter_chunks(paths["detalle"], chunksize):
+            chunk = prepare_raw(raw, "detalle", schema, float_dtype)
+            if reconciler is None:
+                keys = resolve_keys({**tables, "detalle": chunk}, keys)
+                reconciler = Reconciler(tables, keys, detect_total_col(tables["ventas"]), tolerance, max_exceptions)
+            reconciler.update(chunk)
+            rows["rows_in"] += len(chunk)
+            progress("reconcile", rows_in=rows["rows_in"])
+        if reconciler is None:
+            raise ValueError(f"{paths['detalle']} no tiene filas")
+        result = reconciler.build()
+        rows["exceptions"] = sum(c["excepciones"] for c in result["checks"])
+    return {**result, "keys": keys, "report": report}
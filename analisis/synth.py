@@ -0,0 +1,152 @@
+"""Generador sintético (con semilla) de los cuatro CSV de origen, a cualquier escala.
+
+Produce archivos con los mismos nombres, columnas y particularidades que los reales
+de `data/`, para medir el pipeline con volúmenes que no existen en el repositorio:
+
+- `ventas99.csv` separado por ``;``; el resto por ``,``;
+- BOM UTF-8 en `productos99.csv` y `detalle_ventas99.csv`;
+- fechas como seriales de Excel (`ventas.fecha`, `clientes.fecha_alta`);
+- con `dirty`, algunos defectos de los reales: medios de pago mal escritos, cantidades
+  negativas, importes que no cuadran o vacíos, un encabezado repetido dentro del
+  detalle y líneas en blanco al final de clientes.
+
+`rows` es la cantidad de líneas del detalle; ventas (≈ rows/3), clientes y productos
+se escalan a partir de ahí. Todo se escribe por bloques de `chunk_rows`, así que la
+memoria no depende de `rows` (100 millones de líneas ≈ 5 GB de CSV).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from .readers import RAW_FILES
+
+CHUNK_ROWS = 1_000_000
+CIUDADES = ("Cordoba", "Rio Cuarto", "Alta Gracia", "Carlos Paz", "Villa Maria", "Mendiolaza")
+MEDIOS_PAGO = ("efectivo", "qr", "transferencia", "tarjeta")
+MEDIOS_PAGO_TYPOS = ("tarjta", "efecctivo", "bitcoin")
+CATEGORIAS = ("Alimentos", "Limpieza", "Higiene", "Belleza", "Snacks", "Bebidas", "Electrónica")
+CATEGORIA_PESOS = (0.45, 0.41, 0.04, 0.03, 0.03, 0.03, 0.01)
+NOMBRES = ("Mariana", "Nicolas", "Hernan", "Uma", "Agustina", "Emilia", "Bruno", "Yamila", "Karina",
+           "Guadalupe", "Olivia", "Lucas", "Martina", "Tomas", "Valentina", "Joaquin", "Camila", "Diego")
+APELLIDOS = ("Lopez", "Rojas", "Martinez", "Flores", "Medina", "Castro", "Molina", "Acosta", "Romero",
+             "Gomez", "Fernandez", "Sosa", "Perez", "Diaz", "Alvarez", "Torres", "Ruiz", "Benitez")
+PRODUCTOS = ("Coca Cola 1.5L", "Pepsi 1.5L", "Toallas Húmedas x50", "Aceitunas Negras 200g", "Yerba Mate 1kg",
+             "Detergente 750ml", "Jabón en Polvo 3kg", "Galletitas Surtidas", "Shampoo 400ml", "Papas Fritas 150g",
+             "Agua Mineral 2L", "Lavandina 1L", "Arroz 1kg", "Fideos 500g", "Crema Dental 90g", "Auriculares BT")
+ALTA_SERIALES = (44927, 45292)    # 2023-01-01 … 2023-12-31
+VENTA_SERIALES = (45293, 45658)   # 2024-01-01 … 2024-12-31
+DIRTY_RATE = 0.002
+
+def table_sizes(rows: int) -> dict:
+    """Filas de cada tabla para `rows` líneas de detalle (proporciones del dataset real)."""
+    return {
+        "detalle": int(rows),
+        "ventas": max(1, int(rows) // 3),
+        "clientes": int(min(max(100, rows // 40), 2_000_000)),
+        "productos": int(min(max(120, rows // 2_000), 200_000)),
+    }
+
+def _dirty(rng, n: int, dirty: bool) -> np.ndarray:
+    return rng.random(n) < DIRTY_RATE if dirty else np.zeros(n, dtype=bool)
+
+def _write(path: str, df: pd.DataFrame, sep: str = ",", bom: bool = False, trailer: str = ""):
+    with open(path, "w", encoding="utf-8-sig" if bom else "utf-8", newline="") as fh:
+        df.to_csv(fh, sep=sep, index=False, lineterminator="\n")
+        fh.write(trailer)
+
+def _people(ids: np.ndarray):
+    nombres = np.asarray(NOMBRES, dtype=object)[ids % len(NOMBRES)]
+    apellidos = np.asarray(APELLIDOS, dtype=object)[(ids // len(NOMBRES)) % len(APELLIDOS)]
+    full = nombres + " " + apellidos
+    email = pd.Series(full).str.lower().str.replace(" ", ".", regex=False).to_numpy(dtype=object)
+    return full, np.where(ids >= len(NOMBRES) * len(APELLIDOS), email + ids.astype(str), email) + "@mail.com"
+
+def _clientes(n: int, rng):
+    ids = np.arange(1, n + 1)
+    nombre, email = _people(ids - 1)
+    ciudad = np.asarray(CIUDADES, dtype=object)[rng.integers(0, len(CIUDADES), n)]
+    alta = np.sort(rng.integers(ALTA_SERIALES[0], ALTA_SERIALES[1], n))
+    return pd.DataFrame({"id_cliente": ids, "nombre_cliente": nombre, "email": email,
+                         "ciudad": ciudad, "fecha_alta": alta})
+
+def _productos(n: int, rng):
+    ids = np.arange(1, n + 1)
+    base = np.asarray(PRODUCTOS, dtype=object)[(ids - 1) % len(PRODUCTOS)]
+    nombre = np.where(ids > len(PRODUCTOS), base + " #" + ids.astype(str), base)
+    categoria = np.asarray(CATEGORIAS, dtype=object)[rng.choice(len(CATEGORIAS), n, p=CATEGORIA_PESOS)]
+    precio = np.round(rng.lognormal(7.8, 0.6, n)).astype("int64")
+    return pd.DataFrame({"id_producto": ids, "nombre_producto": nombre, "categoria": categoria,
+                         "precio_unitario": precio})
+
+def _ventas_chunks(sizes: dict, clientes: pd.DataFrame, rng, dirty: bool, chunk_rows: int):
+    """Bloques de ventas con la cantidad de líneas de detalle de cada una (1 a 5)."""
+    remaining, next_id = sizes["detalle"], 1
+    medios = np.asarray(MEDIOS_PAGO, dtype=object)
+    while remaining > 0:
+        k = min(chunk_rows, remaining) // 3 + 1  # ≈ chunk_rows líneas por bloque
+        lines = rng.integers(1, 6, k)
+        cum = np.cumsum(lines)
+        if cum[-1] >= remaining:  # el último bloque corta exactamente en `rows` líneas
+            k = int(np.searchsorted(cum, remaining)) + 1
+            lines = lines[:k]
+            lines[-1] -= int(lines.sum() - remaining)
+        ids = np.arange(next_id, next_id + k)
+        cli = rng.integers(0, len(clientes), k)
+        medio = medios[rng.integers(0, len(medios), k)]
+        bad = _dirty(rng, k, dirty)
+        medio[bad] = np.asarray(MEDIOS_PAGO_TYPOS, dtype=object)[rng.integers(0, len(MEDIOS_PAGO_TYPOS), bad.sum())]
+        ventas = pd.DataFrame({
+            "id_venta": ids,
+            "fecha": rng.integers(VENTA_SERIALES[0], VENTA_SERIALES[1], k),
+            "id_cliente": clientes["id_cliente"].to_numpy()[cli],
+            "nombre_cliente": clientes["nombre_cliente"].to_numpy()[cli],
+            "email": clientes["email"].to_numpy()[cli],
+            "medio_pago": medio,
+        })
+        yield ventas, lines
+        next_id += k
+        remaining -= int(lines.sum())
+
+def _detalle(ventas: pd.DataFrame, lines: np.ndarray, productos: pd.DataFrame, rng, dirty: bool) -> pd.DataFrame:
+    n = int(lines.sum())
+    prod = rng.integers(0, len(productos), n)
+    cantidad = rng.integers(1, 6, n)
+    precio = productos["precio_unitario"].to_numpy()[prod]
+    importe = (cantidad * precio).astype("float64")
+    bad = _dirty(rng, n, dirty)
+    cantidad[bad & (rng.random(n) < 0.5)] = -2
+    importe[bad] += rng.integers(-500, 500, n)[bad]
+    importe[_dirty(rng, n, dirty)] = np.nan
+    return pd.DataFrame({
+        "id_venta": np.repeat(ventas["id_venta"].to_numpy(), lines),
+        "id_producto": productos["id_producto"].to_numpy()[prod],
+        "nombre_producto": productos["nombre_producto"].to_numpy()[prod],
+        "cantidad": cantidad,
+        "precio_unitario": precio,
+        "importe": pd.array(importe, dtype="Int64"),
+    })
+
+def generate(data_dir: str, rows: int, seed: int = 0, dirty: bool = True, chunk_rows: int = CHUNK_ROWS) -> dict:
+    """Escribe los cuatro CSV en `data_dir` y devuelve las filas de cada tabla."""
+    os.makedirs(data_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    sizes = table_sizes(rows)
+    paths = {name: os.path.join(data_dir, fname) for name, fname in RAW_FILES.items()}
+    clientes, productos = _clientes(sizes["clientes"], rng), _productos(sizes["productos"], rng)
+    _write(paths["clientes"], clientes, trailer="\n\n" if dirty else "")  # líneas en blanco al final
+    _write(paths["productos"], productos, bom=True)
+
+    # ventas y detalle se generan juntos, bloque a bloque
+    counts = {"ventas": 0, "detalle": 0}
+    with open(paths["ventas"], "w", encoding="utf-8", newline="") as vf, \
+            open(paths["detalle"], "w", encoding="utf-8-sig", newline="") as df_:
+        for i, (ventas, lines) in enumerate(_ventas_chunks(sizes, clientes, rng, dirty, chunk_rows)):
+            detalle = _detalle(ventas, lines, productos, rng, dirty)
+            ventas.to_csv(vf, sep=";", index=False, header=i == 0, lineterminator="\n")
+            if dirty and i == 1:  # encabezado repetido dentro del archivo (como en el real)
+                df_.write(",".join(detalle.columns) + "\n")
+            detalle.to_csv(df_, index=False, header=i == 0, lineterminator="\n")
+            counts["ventas"] += len(ventas)
+            counts["detalle"] += len(detalle)
+    return {"clientes": len(clientes), "productos": len(productos), **counts}
@@ -11,10 +11,16 @@ TABLES_DIR = os.path.join(OUT_DIR, "tablas")
 os.makedirs(PLOTS_DIR, exist_ok=True)
 os.makedirs(TABLES_DIR, exist_ok=True)
 
-def guardar_png(fig, nombre_sin_ext):
+def guardar_png(png, nombre_sin_ext):
+    """Escribe los bytes PNG ya renderizados (sólo si difieren del archivo existente)."""
     try:
         path = os.path.join(PLOTS_DIR, f"{nombre_sin_ext}.png")
-        fig.savefig(path, bbox_inches="tight")
+        if os.path.exists(path) and os.path.getsize(path) == len(png):
+            with open(path, "rb") as fh:
+                if fh.read() == png:
+                    return path
+        with open(path, "wb") as fh:
+            fh.write(png)
         return path
     except Exception as _e:
         return None
@@ -29,14 +35,28 @@ def guardar_csv(df, nombre_sin_ext, index=False):
 # === [END AUTO-ADDED] ===
 
 import os
-import io
-import unicodedata
+import json
 from datetime import datetime
 
 import streamlit as st
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
+
+from analisis.cache import TableCache
+from analisis.compact import compact_cleaned
+from analisis.diagnostics import clear_profiles, profile_file, profile_table
+from analisis.readers import load_raw_data as read_raw_data, raw_paths
+from analisis.reconcile import summary_table
+from analisis.reports import conclusions_text
+from analisis.registry import DatasetRegistry, dataset_key
+from analisis.pipeline import clean_data as run_clean_data, default_keys, normalize_names
+from analisis.streaming import DEFAULT_CHUNKSIZE, stream_pipeline
+from analisis.filters import cube_city_col, filtered_cube, months_bounds
+from analisis.jobs import JobRunner
+from analisis.lazy import available_backends, lazy_pipeline
+from analisis.profiling import measure, profiled, top_functions
+from analisis.render import (MAX_POINTS, FigureCache, box_figure, figure_key, histogram_figure, pairs_figure,
+                             revenue_figure)
+from analisis.storage import FORMATS, zip_table
 
 # ========================= CONFIG INICIAL =========================
 st.set_page_config(page_title="Análisis Descriptivo Profesional", layout="wide")
@@ -46,213 +66,274 @@ st.title("📊 Análisis Descriptivo Profesional (EDA + Limpieza + Conclusiones)
 BASE_DATA_DIR = st.sidebar.text_input("📁 Carpeta de datos (CSV originales)", value="data")
 OUTPUT_DIR = st.sidebar.text_input("💾 Carpeta de salida (CSV limpios)", value="data_limpios")
 DEBUG = st.sidebar.checkbox("🔎 Modo debug (muestra diagnósticos)", value=False)
+PROFILE_CLEAN = DEBUG and st.sidebar.checkbox("⏱️ Perfilar la limpieza con cProfile", value=False)
 DISABLE_CACHE = st.sidebar.checkbox("🚫 Desactivar caché (depuración)", value=True)
-
-# ========================= UTILIDADES BASE =========================
-def _strip_accents(s: str) -> str:
-    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
-
-def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    """Normaliza nombres: minúsculas, sin tildes, espacios→'_'."""
-    df = df.copy()
-    df.columns = (
-        pd.Series(df.columns)
-        .astype(str)
-        .map(_strip_accents)
-        .str.strip()
-        .str.lower()
-        .str.replace(r"\s+", "_", regex=True)
-    )
-    return df
-
-def robust_read_csv(path, try_seps=(",", ";", "\t", "|"), encodings=("utf-8", "latin-1")) -> pd.DataFrame:
-    """Lectura robusta (multi-separador y multi-encoding) + elimina Unnamed:*."""
-    last_err = None
-    for sep in try_seps:
-        for enc in encodings:
-            try:
-                df = pd.read_csv(path, sep=sep, encoding=enc, engine="python")
-                if df.shape[1] == 1 and sep != ",":  # probablemente separador incorrecto
-                    continue
-                df = df.loc[:, ~df.columns.str.contains(r"^Unnamed")]
-                return df
-            except Exception as e:
-                last_err = e
-    raise last_err if last_err else ValueError(f"No se pudo leer: {path}")
-
-def to_num(s):
-    return pd.to_numeric(s, errors="coerce")
-
-def ensure_dir(path: str):
-    os.makedirs(path, exist_ok=True)
-
-def find_key(df: pd.DataFrame, candidates=(), contains_all=()):
-    """Encuentra columna clave por candidatos exactos o por tokens contenidos."""
-    cols = list(df.columns)
-    for c in candidates:
-        if c in cols:
-            return c
-    hits = [c for c in cols if all(tok in c for tok in contains_all)]
-    if len(hits) == 1:
-        return hits[0]
-    if len(hits) > 1:
-        return sorted(hits, key=len, reverse=True)[0]
-    return None
+USE_DISK_CACHE = st.sidebar.checkbox("💽 Caché en disco de tablas crudas (Feather)", value=True)
+STREAMING = st.sidebar.checkbox("🌊 Modo streaming del detalle (por bloques)", value=False)
+BACKGROUND = st.sidebar.checkbox("🧵 Limpieza en segundo plano", value=True,
+                                 help="La página sigue respondiendo; se puede cancelar y un rerun no la reinicia")
+COMPACT = st.sidebar.checkbox("🗜️ Sesión compacta (integrado con códigos + dimensiones)", value=True,
+                              help="Ver analisis/compact.py: menos memoria por usuario conectado")
+BACKEND = st.sidebar.selectbox("⚙️ Motor de ejecución", available_backends(),
+                               help="duckdb: plan perezoso fuera de memoria (ver analisis/lazy.py)")
+DETALLE_PREVIEW = STREAMING or BACKEND == "duckdb"  # el detalle completo no se carga en pandas
+WORKERS = int(st.sidebar.number_input("🧵 Workers (lectura y tipificación en paralelo)", min_value=1,
+                                      max_value=os.cpu_count() or 1, value=os.cpu_count() or 1))
+OUTPUT_FORMATS = st.sidebar.multiselect("🗂️ Formatos de salida", list(FORMATS), default=["csv"]) or ["csv"]
+STREAM_CHUNKSIZE = DEFAULT_CHUNKSIZE
+STREAM_PREVIEW_ROWS = 1000
+
+CACHE_DIR = os.path.join(BASE_DIR, ".cache_tablas")
+PROFILE_DIR = os.path.join(CACHE_DIR, "perfiles")  # perfiles del Paso 1 (JSON por huella de archivo)
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+PROFILE_FILE = "perfil_limpieza.pstats"
+JOB_WORKERS = 2  # limpiezas simultáneas en el servidor (una por carpeta de salida)
+REGISTRY_MAX_BYTES = 4 * 1024 ** 3  # datasets limpios sin sesiones que se conservan en memoria
+REGISTRY_IDLE_SECONDS = 600
+PERF = []  # métricas por etapa de esta ejecución (carga y gráficos); la limpieza trae su propio report
 
 # ========================= CARGA DE DATOS =========================
+@st.cache_resource
+def job_runner() -> JobRunner:
+    """Trabajos en segundo plano compartidos por todas las sesiones (ver analisis/jobs.py)."""
+    return JobRunner(max_workers=JOB_WORKERS)
+
+@st.cache_resource
+def dataset_registry() -> DatasetRegistry:
+    """Datasets limpios compartidos por todas las sesiones (ver analisis/registry.py)."""
+    return DatasetRegistry(max_bytes=REGISTRY_MAX_BYTES, idle_seconds=REGISTRY_IDLE_SECONDS)
+
+@st.cache_resource
+def figure_cache() -> FigureCache:
+    """PNG de los gráficos por huella de sus agregados (compartido entre reruns y sesiones)."""
+    return FigureCache()
+
+def show_figure(name: str, data, build):
+    """Muestra el PNG de `build()`; sólo se dibuja (y se guarda en plots/) si cambió `data`."""
+    with measure(PERF, f"plot:{name}") as info:
+        png, fresh = figure_cache().render(figure_key(name, data), build)
+        info["cached"] = not fresh
+    st.image(png, use_container_width=True)
+    if fresh:
+        guardar_png(png, name)
+
 _cache = st.cache_data(ttl=0) if DISABLE_CACHE else st.cache_data
+_table_cache = TableCache(CACHE_DIR, max_bytes=CACHE_MAX_BYTES)
+
+if st.sidebar.button("🗑️ Invalidar caché en disco"):
+    n = _table_cache.invalidate() + clear_profiles(PROFILE_DIR)
+    st.cache_data.clear()
+    figure_cache().clear()
+    dataset_registry().clear()
+    st.sidebar.success(f"Entradas eliminadas: {n}")
+
+def debug_panel():
+    """Tiempo, CPU, filas y memoria de cada etapa (carga, limpieza, gráficos) en modo debug."""
+    if not DEBUG:
+        return
+    cleaned = st.session_state.get("cleaned") or {}
+    groups = (("carga", [e for e in PERF if e["step"] == "load"]),
+              ("diagnóstico", [e for e in PERF if e["step"].startswith("profile:")]),
+              ("limpieza", cleaned.get("report", [])),
+              ("gráficos", [e for e in PERF if e["step"].startswith("plot:")]))
+    entries = [{"grupo": group, **e} for group, report in groups for e in report]
+    st.markdown("---")
+    st.subheader("🔎 Diagnóstico de rendimiento por etapa")
+    if not entries:
+        st.info("Todavía no hay etapas medidas.")
+        return
+    table = pd.DataFrame(entries)
+    st.dataframe(table, use_container_width=True)
+    slowest = table.loc[table["seconds"].idxmax()]
+    st.caption(f"Etapa más lenta: **{slowest['grupo']} / {slowest['step']}** ({slowest['seconds']:.3f} s)")
+    stamp = datetime.now().isoformat(timespec="seconds")
+    jsonl = "\n".join(json.dumps({"time": stamp, **e}, ensure_ascii=False, default=str) for e in entries)
+    st.download_button("⬇️ Métricas por etapa (JSON lines)", data=jsonl.encode("utf-8"),
+                       file_name="metricas_etapas.jsonl", mime="application/x-ndjson")
+    shared = dataset_registry().stats()
+    if shared:
+        with st.expander(f"🗃️ Datasets limpios compartidos entre sesiones ({len(shared)})"):
+            st.dataframe(pd.DataFrame(shared), hide_index=True, use_container_width=True)
+    if st.session_state.get("profile_top"):
+        with st.expander("⏱️ cProfile de la última limpieza (funciones con más tiempo acumulado)"):
+            st.code(st.session_state["profile_top"])
+            profile_path = os.path.join(OUTPUT_DIR, PROFILE_FILE)
+            if os.path.exists(profile_path):
+                with open(profile_path, "rb") as fh:
+                    st.download_button("⬇️ Volcado pstats", data=fh, file_name=PROFILE_FILE,
+                                       mime="application/octet-stream")
 
 @_cache
-def load_raw_data(base_dir: str):
-    paths = {
-        "clientes": os.path.join(base_dir, "clientes99.csv"),
-        "productos": os.path.join(base_dir, "productos99.csv"),
-        "ventas":    os.path.join(base_dir, "ventas99.csv"),
-        "detalle":   os.path.join(base_dir, "detalle_ventas99.csv"),
-    }
-    missing = [k for k, p in paths.items() if not os.path.exists(p)]
-    if missing:
-        raise FileNotFoundError(f"Faltan archivos: {', '.join(missing)} en {base_dir}")
-
-    clientes = robust_read_csv(paths["clientes"])
-    productos = robust_read_csv(paths["productos"])
-    ventas    = robust_read_csv(paths["ventas"])
-    detalle   = robust_read_csv(paths["detalle"])
-    return clientes, productos, ventas, detalle
+def load_raw_data(base_dir: str, use_disk_cache: bool = True, streaming: bool = False, workers: int = 1):
+    return read_raw_data(base_dir, cache=_table_cache if use_disk_cache else None,
+                         detalle_rows=STREAM_PREVIEW_ROWS if streaming else None, workers=workers)
 
-def profile_df(df: pd.DataFrame, name: str):
+def profile_df(df: pd.DataFrame, name: str, table: str):
+    """Vista previa + perfil del CSV original (una pasada con sketches, cacheado por huella del archivo)."""
     st.subheader(f"📄 {name}")
+    path = raw_paths(BASE_DATA_DIR)[table]
+    full = not (DETALLE_PREVIEW and table == "detalle")  # en streaming el detalle se perfila por bloques
+    with measure(PERF, f"profile:{table}") as info:
+        profile = profile_file(path, df if full else None, PROFILE_DIR if USE_DISK_CACHE else None,
+                               chunksize=STREAM_CHUNKSIZE)
+        info.update(rows_out=profile["rows"], cached=profile["cached"])
     c1, c2 = st.columns([2, 1])
     with c1:
         st.write("Vista previa:")
         st.dataframe(df.head(15))
     with c2:
         st.write("Información básica:")
-        st.write({"filas": df.shape[0], "columnas": df.shape[1]})
-        st.write("Tipos de datos:")
-        st.write(df.dtypes.astype(str))
-        st.write("Nulos por columna:")
-        st.write(df.isna().sum())
-        st.write("Duplicados (filas exactas):", int(df.duplicated().sum()))
+        st.write({"filas": profile["rows"], "columnas": len(profile["columns"])})
+        dup_label = "Duplicados (filas exactas):" if profile["duplicates_exact"] else "Duplicados (filas exactas, estimado):"
+        st.write(dup_label, int(profile["duplicates"]))
+    st.write("Columnas (tipo, nulos, distintos, rango y valores más frecuentes):")
+    st.dataframe(profile_table(profile), use_container_width=True, hide_index=True)
 
 # ========================= LIMPIEZA =========================
-def clean_data(clientes, productos, ventas, detalle):
-    # 1) Normalizar columnas
-    clientes = normalize_columns(clientes)
-    productos = normalize_columns(productos)
-    ventas    = normalize_columns(ventas)
-    detalle   = normalize_columns(detalle)
-
-    # 2) Trimming de strings y conversión básica
-    for df in (clientes, productos, ventas, detalle):
-        for c in df.select_dtypes(include=["object"]).columns:
-            df[c] = df[c].astype(str).str.strip()
-
-    # 3) Detección de claves y mapeo manual (sidebar)
+def select_keys(clientes, productos, ventas, detalle) -> dict:
+    """Mapeo manual de columnas clave (sidebar) sobre los nombres normalizados."""
+    cols = {
+        "clientes": normalize_names(clientes.columns),
+        "productos": normalize_names(productos.columns),
+        "ventas": normalize_names(ventas.columns),
+        "detalle": normalize_names(detalle.columns),
+    }
+    defaults = default_keys(cols["clientes"], cols["productos"], cols["ventas"], cols["detalle"])
+
     st.sidebar.markdown("### 🔗 Configurar columnas clave")
 
     # Producto
-    det_prod_key_default = find_key(detalle, ("id_producto", "producto_id"), ("producto", "id")) or detalle.columns[0]
-    prod_key_default     = find_key(productos, ("id_producto", "producto_id"), ("producto", "id")) or productos.columns[0]
-    det_prod_key = st.sidebar.selectbox("Detalle → ID Producto", detalle.columns, index=list(detalle.columns).index(det_prod_key_default))
-    prod_key     = st.sidebar.selectbox("Productos → ID Producto", productos.columns, index=list(productos.columns).index(prod_key_default))
+    det_prod_key = st.sidebar.selectbox("Detalle → ID Producto", cols["detalle"], index=cols["detalle"].index(defaults["det_prod_key"]))
+    prod_key     = st.sidebar.selectbox("Productos → ID Producto", cols["productos"], index=cols["productos"].index(defaults["prod_key"]))
 
     # Venta
-    det_venta_key_default = find_key(detalle, ("id_venta", "venta_id"), ("venta", "id")) or detalle.columns[min(1, len(detalle.columns)-1)]
-    venta_key_default     = find_key(ventas,  ("id_venta", "venta_id"), ("venta", "id")) or ventas.columns[0]
-    det_venta_key = st.sidebar.selectbox("Detalle → ID Venta", detalle.columns, index=list(detalle.columns).index(det_venta_key_default))
-    venta_key     = st.sidebar.selectbox("Ventas → ID Venta", ventas.columns, index=list(ventas.columns).index(venta_key_default))
+    det_venta_key = st.sidebar.selectbox("Detalle → ID Venta", cols["detalle"], index=cols["detalle"].index(defaults["det_venta_key"]))
+    venta_key     = st.sidebar.selectbox("Ventas → ID Venta", cols["ventas"], index=cols["ventas"].index(defaults["venta_key"]))
 
     # Cliente (opcional)
-    cli_key_cli_default = find_key(clientes, ("id_cliente", "cliente_id"), ("cliente", "id"))
-    cli_key_det_default = find_key(detalle,  ("id_cliente", "cliente_id"), ("cliente", "id"))
-
     cli_key_det = None
     cli_key_cli = None
-    if cli_key_cli_default and cli_key_cli_default in clientes.columns:
+    if defaults["cli_key_cli"]:
+        det_venta_cols = cols["detalle"] + [c for c in cols["ventas"] if c not in cols["detalle"]]
         cli_key_det = st.sidebar.selectbox(
-            "Detalle → ID Cliente (opcional)", detalle.columns,
-            index=list(detalle.columns).index(cli_key_det_default) if cli_key_det_default in detalle.columns else 0
+            "Detalle/Ventas → ID Cliente (opcional)", det_venta_cols,
+            index=det_venta_cols.index(defaults["cli_key_det"]) if defaults["cli_key_det"] else 0
         )
         cli_key_cli = st.sidebar.selectbox(
-            "Clientes → ID Cliente (opcional)", clientes.columns,
-            index=list(clientes.columns).index(cli_key_cli_default)
+            "Clientes → ID Cliente (opcional)", cols["clientes"],
+            index=cols["clientes"].index(defaults["cli_key_cli"])
         )
 
-    # 4) Asegurar keys como texto (merge seguro)
-    for df in (clientes, productos, ventas, detalle):
-        for c in df.columns:
-            if "id" in c:
-                df[c] = df[c].astype(str).str.strip()
-
-    # 5) Conversión de campos numéricos y fechas más comunes (sin romper)
-    for col in ("cantidad", "precio_unitario", "importe", "total", "monto", "monto_total", "descuento"):
-        for df in (detalle, ventas):
-            if col in df.columns:
-                df[col] = to_num(df[col])
-
-    # Fechas
-    for col in ("fecha", "fecha_venta", "created_at"):
-        if col in ventas.columns:
-            ventas[col] = pd.to_datetime(ventas[col], errors="coerce")
-        if col in detalle.columns:
-            detalle[col] = pd.to_datetime(detalle[col], errors="coerce")
-
-    # 6) Guardar limpios
-    ensure_dir(OUTPUT_DIR)
-    clientes.to_csv(os.path.join(OUTPUT_DIR, "clientes_limpio.csv"), index=False, encoding="utf-8")
-    productos.to_csv(os.path.join(OUTPUT_DIR, "productos_limpio.csv"), index=False, encoding="utf-8")
-    ventas.to_csv(os.path.join(OUTPUT_DIR, "ventas_limpio.csv"), index=False, encoding="utf-8")
-    detalle.to_csv(os.path.join(OUTPUT_DIR, "detalle_limpio.csv"), index=False, encoding="utf-8")
-
-    # 7) Integración (detalle + productos + ventas [+ clientes])
-    df = detalle.merge(productos, left_on=det_prod_key, right_on=prod_key, how="left", suffixes=("", "_prod"))
-    df = df.merge(ventas, left_on=det_venta_key, right_on=venta_key, how="left")
-    if cli_key_det and cli_key_cli and cli_key_det in df.columns and cli_key_cli in clientes.columns:
-        extras = [c for c in ("ciudad", "localidad", "provincia") if c in clientes.columns][:1]
-        df = df.merge(clientes[[cli_key_cli] + extras], left_on=cli_key_det, right_on=cli_key_cli, how="left", suffixes=("", "_cli"))
-
-    # 8) Derivadas
-    if {"cantidad", "precio_unitario"}.issubset(df.columns):
-        df["subtotal_calc"] = to_num(df["cantidad"]) * to_num(df["precio_unitario"])
-    if {"importe", "subtotal_calc"}.issubset(df.columns):
-        df["desvio_importe"] = to_num(df["importe"]) - df["subtotal_calc"]
-
-    # fechas derivadas
-    fecha_col = "fecha" if "fecha" in df.columns else ("fecha_venta" if "fecha_venta" in df.columns else None)
-    if fecha_col:
-        df["anio"] = pd.to_datetime(df[fecha_col], errors="coerce").dt.year
-        df["mes"] = pd.to_datetime(df[fecha_col], errors="coerce").dt.to_period("M").astype(str)
-
-    # Columna de categoría flexible
-    cat_col = next((c for c in df.columns if "categoria" in c), None)
-
-    # Detección avanzada de columna total en ventas
-    total_candidates = ["total", "importe_total", "monto_total", "monto", "total_venta", "total_ticket", "total_factura"]
-    total_col = next((c for c in ventas.columns if any(tc in c for tc in total_candidates)), None)
-
     return {
-        "clientes": clientes,
-        "productos": productos,
-        "ventas": ventas,
-        "detalle": detalle,
-        "integrado": df,
-        "cat_col": cat_col,
-        "total_col": total_col,
-        "keys": {
-            "det_prod_key": det_prod_key,
-            "prod_key": prod_key,
-            "det_venta_key": det_venta_key,
-            "venta_key": venta_key,
-            "cli_key_det": cli_key_det,
-            "cli_key_cli": cli_key_cli,
-        }
+        "det_prod_key": det_prod_key,
+        "prod_key": prod_key,
+        "det_venta_key": det_venta_key,
+        "venta_key": venta_key,
+        "cli_key_det": cli_key_det,
+        "cli_key_cli": cli_key_cli,
     }
 
+def clean_data(clientes, productos, ventas, detalle, keys: dict):
+    if BACKEND == "duckdb":
+        return lazy_pipeline(BASE_DATA_DIR, OUTPUT_DIR, keys=keys, formats=OUTPUT_FORMATS)
+    if STREAMING:
+        return stream_pipeline(BASE_DATA_DIR, OUTPUT_DIR, keys=keys, chunksize=STREAM_CHUNKSIZE,
+                               cache=_table_cache if USE_DISK_CACHE else None, formats=OUTPUT_FORMATS)
+    return run_clean_data(clientes, productos, ventas, detalle, keys=keys, output_dir=OUTPUT_DIR,
+                          formats=OUTPUT_FORMATS, workers=WORKERS)
+
+def cleaning_key(keys: dict) -> str:
+    """Clave del resultado en `dataset_registry()`: CSV originales, claves y opciones que lo cambian."""
+    return dataset_key(raw_paths(BASE_DATA_DIR), keys, backend=BACKEND, streaming=STREAMING, compact=COMPACT,
+                       formats=sorted(OUTPUT_FORMATS), output_dir=os.path.abspath(OUTPUT_DIR))
+
+def run_cleaning(clientes, productos, ventas, detalle, keys: dict, dataset: str, registry: DatasetRegistry) -> dict:
+    """Limpieza completa del Paso 2, registrada en `registry` como `dataset`.
+
+    No llama a Streamlit: puede correr en un hilo de `job_runner()`. Devuelve sólo la clave,
+    así el trabajo terminado no retiene las tablas fuera del registro.
+    """
+    with profiled(os.path.join(OUTPUT_DIR, PROFILE_FILE), enabled=PROFILE_CLEAN) as profiler:
+        cleaned = clean_data(clientes, productos, ventas, detalle, keys)
+        if COMPACT:
+            cleaned = compact_cleaned(cleaned)
+    registry.put(dataset, cleaned)
+    return {"dataset": dataset, "profile_top": top_functions(profiler) if profiler is not None else None}
+
+def publish_cleaning(result: dict, reused: bool = False):
+    """Deja en la sesión una vista del dataset registrado (no una copia)."""
+    view = dataset_registry().open(result["dataset"])
+    if view is None:  # se desalojó antes de que la sesión lo abriera
+        st.error("El resultado de la limpieza ya no está en memoria: volvé a ejecutarla.")
+        return
+    st.session_state["profile_top"] = result["profile_top"]
+    st.session_state["cleaned"] = view
+    if reused:
+        st.success(f"Mismos CSV, claves y opciones que una limpieza ya en memoria: se reutiliza (`{OUTPUT_DIR}`).")
+    else:
+        st.success(f"Tablas limpias ({', '.join(OUTPUT_FORMATS)}) guardadas en: `{OUTPUT_DIR}`")
+
+def outputs_exist(dataset: str) -> bool:
+    """El dataset está registrado y sus archivos de salida siguen en disco."""
+    view = dataset_registry().open(dataset)
+    if view is None:
+        return False
+    files = list(view["paths"].values()) + list((view.get("parquet") or {}).values())
+    return all(os.path.exists(f) for f in files)
+
+def current_job():
+    """Trabajo de limpieza de esta sesión (sigue vivo entre reruns), o None."""
+    job_id = st.session_state.get("clean_job")
+    job = job_runner().get(job_id) if job_id else None
+    if job_id and job is None:  # el registro ya no lo tiene (servidor reiniciado)
+        st.session_state.pop("clean_job", None)
+    return job
+
+def show_job(job):
+    """Progreso de la limpieza en segundo plano; al terminar, publica el resultado en la sesión."""
+    if not job.done:
+        job_progress(job.id)
+        return
+    st.session_state.pop("clean_job", None)
+    if job.state == "terminado":
+        publish_cleaning(job.result)
+    elif job.state == "cancelado":
+        st.warning("Limpieza cancelada.")
+    else:
+        st.error(f"La limpieza falló: {job.snapshot()['error']}")
+        if DEBUG and job.traceback:
+            st.code(job.traceback)
+
+@st.fragment(run_every=1.0)
+def job_progress(job_id: str):
+    """Se refresca solo (sin rerun de la página) hasta que el trabajo termina."""
+    job = job_runner().get(job_id)
+    if job is None or job.done:
+        st.rerun()
+    snap = job.snapshot()
+    st.info(f"🧵 Limpieza en segundo plano ({snap['label']}): {snap['state']} · {snap['elapsed']:.0f} s")
+    current = snap["current"]
+    if current:
+        rows = f" · {current['rows_out']:,} filas" if current.get("rows_out") else ""
+        st.caption(f"Etapa actual: **{current['step']}**{rows}")
+    previous = (st.session_state.get("cleaned") or {}).get("report")
+    if previous:
+        st.progress(min(len(snap["stages"]) / len(previous), 0.99), text="Avance estimado según la limpieza anterior")
+    if snap["stages"]:
+        stages = pd.DataFrame(snap["stages"])
+        st.dataframe(stages[[c for c in ("step", "seconds", "rows_in", "rows_out") if c in stages]],
+                     hide_index=True, use_container_width=True)
+    if snap["cancel_requested"]:
+        st.caption("Cancelación pedida: se detiene al terminar la etapa (o el bloque) en curso.")
+    elif st.button("⛔ Cancelar limpieza", key=f"cancel_{job_id}"):
+        job.cancel()
+
 # ========================= UI: PASO 1 – DATOS ORIGINALES =========================
 st.header("1) 📦 Datos originales (problemas y diagnóstico)")
 try:
-    raw_clientes, raw_productos, raw_ventas, raw_detalle = load_raw_data(BASE_DATA_DIR)
+    with measure(PERF, "load") as _load:
+        raw_clientes, raw_productos, raw_ventas, raw_detalle = load_raw_data(BASE_DATA_DIR, USE_DISK_CACHE, DETALLE_PREVIEW, WORKERS)
+        _load["rows_out"] = sum(len(t) for t in (raw_clientes, raw_productos, raw_ventas, raw_detalle))
     st.success("Archivos originales cargados correctamente.")
 except Exception as e:
     st.error(f"Error cargando CSV originales: {e}")
@@ -260,11 +341,12 @@ except Exception as e:
 
 c1, c2 = st.columns(2)
 with c1:
-    profile_df(raw_clientes, "Clientes (original)")
-    profile_df(raw_productos, "Productos (original)")
+    profile_df(raw_clientes, "Clientes (original)", "clientes")
+    profile_df(raw_productos, "Productos (original)", "productos")
 with c2:
-    profile_df(raw_ventas, "Ventas (original)")
-    profile_df(raw_detalle, "Detalle de ventas (original)")
+    profile_df(raw_ventas, "Ventas (original)", "ventas")
+    profile_df(raw_detalle, "Detalle de ventas (original" + (f", vista previa de {STREAM_PREVIEW_ROWS} filas)" if DETALLE_PREVIEW else ")"),
+               "detalle")
 
 st.info(
     "🔧 **Problemas típicos a corregir antes del análisis:**\n"
@@ -279,12 +361,31 @@ st.markdown("---")
 # ========================= PASO 2 – LIMPIEZA Y EXPORTACIÓN =========================
 st.header("2) 🧼 Limpieza y preparación (y guardado de CSV limpios)")
 if st.button("🚀 Ejecutar limpieza + guardar CSV (carpeta salida)"):
-    try:
-        cleaned = clean_data(raw_clientes, raw_productos, raw_ventas, raw_detalle)
-        st.success(f"CSV limpios guardados en: `{OUTPUT_DIR}`")
-        st.session_state["cleaned"] = cleaned
-    except Exception as e:
-        st.exception(e)
+    keys = select_keys(raw_clientes, raw_productos, raw_ventas, raw_detalle)
+    raw = (raw_clientes, raw_productos, raw_ventas, raw_detalle)
+    dataset = cleaning_key(keys)
+    if not PROFILE_CLEAN and outputs_exist(dataset):
+        # otra sesión (o esta misma) ya limpió exactamente lo mismo: se comparte su resultado
+        publish_cleaning({"dataset": dataset, "profile_top": None}, reused=True)
+    elif BACKGROUND:
+        # una limpieza por carpeta de salida: si ya hay una en curso con el mismo dataset, se engancha a ésa
+        label = f"{BACKEND}{' · streaming' if STREAMING else ''} → {OUTPUT_DIR}"
+        job = job_runner().submit(os.path.abspath(OUTPUT_DIR), run_cleaning, *raw, keys, dataset,
+                                  dataset_registry(), label=label, tag=dataset)
+        if job.tag == dataset:
+            st.session_state["clean_job"] = job.id
+        else:
+            st.warning(f"`{OUTPUT_DIR}` está ocupada por otra limpieza en curso ({job.label}) con otras claves "
+                       "u opciones. Esperá a que termine o elegí otra carpeta de salida.")
+    else:
+        try:
+            publish_cleaning(run_cleaning(*raw, keys, dataset, dataset_registry()))
+        except Exception as e:
+            st.exception(e)
+
+job = current_job()
+if job is not None:
+    show_job(job)
 
 if "cleaned" in st.session_state:
     st.write("✅ **Vista rápida (limpios):**")
@@ -300,19 +401,44 @@ if "cleaned" in st.session_state:
         st.dataframe(cl["ventas"].head(10))
         st.subheader("Detalle (limpio)")
         st.dataframe(cl["detalle"].head(10))
-
-    # Descargas directas
-    def df_to_download(df: pd.DataFrame, filename: str, label: str):
-        buf = io.BytesIO()
-        df.to_csv(buf, index=False, encoding="utf-8")
-        st.download_button(label=label, data=buf.getvalue(), file_name=filename, mime="text/csv")
-
-    st.write("⬇️ **Descargar CSV limpios:**")
-    d1, d2, d3, d4 = st.columns(4)
-    with d1: df_to_download(cl["clientes"], "clientes_limpio.csv", "Clientes limpio")
-    with d2: df_to_download(cl["productos"], "productos_limpio.csv", "Productos limpio")
-    with d3: df_to_download(cl["ventas"], "ventas_limpio.csv", "Ventas limpio")
-    with d4: df_to_download(cl["detalle"], "detalle_limpio.csv", "Detalle limpio")
+        if cl.get("backend") == "duckdb":
+            st.caption(f"Backend DuckDB: {cl['rows']:,} líneas integradas sin materializar el detalle.")
+        elif cl.get("streaming"):
+            st.caption(f"Modo streaming: {cl['rows']:,} líneas procesadas por bloques.")
+
+    # Descargas directas: se sirven los archivos ya escritos, sin volver a serializar las tablas
+    def file_to_download(path: str, filename: str, label: str, mime: str = "text/csv"):
+        with open(path, "rb") as fh:
+            st.download_button(label=label, data=fh, file_name=filename, mime=mime)
+
+    @st.cache_data(show_spinner=False)
+    def parquet_zip(output_dir: str, name: str, stamp) -> bytes:
+        return zip_table(output_dir, name)
+
+    st.write("⬇️ **Descargar tablas limpias:**")
+    labels = {"clientes": "Clientes limpio", "productos": "Productos limpio",
+              "ventas": "Ventas limpio", "detalle": "Detalle limpio"}
+    for col, (name, label) in zip(st.columns(len(labels)), labels.items()):
+        with col:
+            if name in cl["paths"]:
+                file_to_download(cl["paths"][name], f"{name}_limpio.csv", label)
+            if name in cl.get("parquet", {}):
+                stamp = os.path.getmtime(cl["parquet"][name])
+                st.download_button(label=f"{label} (Parquet)", data=parquet_zip(OUTPUT_DIR, name, stamp),
+                                   file_name=f"{name}_parquet.zip", mime="application/zip")
+
+    # Conciliación: importes por línea, precio de catálogo, claves huérfanas y totales por ticket
+    rec = cl.get("reconciliation")
+    if rec is not None:
+        st.write(f"🧾 **Conciliación** (diferencias mayores a {rec['tolerance']}):")
+        st.dataframe(summary_table(rec), hide_index=True, use_container_width=True)
+        for check, table in rec["exceptions"].items():
+            with st.expander(f"Excepciones · {check} ({len(table):,} de ejemplo)"):
+                st.dataframe(table.head(1000), hide_index=True, use_container_width=True)
+                st.download_button("⬇️ CSV", data=table.to_csv(index=False).encode("utf-8"),
+                                   file_name=f"conciliacion_{check}.csv", mime="text/csv", key=f"rec_{check}")
+    elif cl.get("backend") == "duckdb":
+        st.caption("Conciliación: con DuckDB se calcula desde la línea de comandos (`python -m analisis --reconcile`).")
 
 st.markdown("---")
 
@@ -320,11 +446,15 @@ st.markdown("---")
 st.header("3) 📈 Análisis descriptivo (gráficos + narrativa)")
 
 if "cleaned" not in st.session_state:
-    st.warning("Primero ejecutá la limpieza (Paso 2).")
+    if "clean_job" in st.session_state:
+        st.info("La limpieza está en curso; el análisis aparece cuando termine.")
+    else:
+        st.warning("Primero ejecutá la limpieza (Paso 2).")
+    debug_panel()
     st.stop()
 
 cl = st.session_state["cleaned"]
-df = cl["integrado"]
+cube = cl["cube"]  # agregados precalculados una sola vez en el Paso 2 (ver analisis/cube.py)
 ventas = cl["ventas"]
 cat_col = cl["cat_col"]
 keys = cl["keys"]
@@ -334,31 +464,48 @@ total_col = cl["total_col"]
 st.sidebar.markdown("### ⚙️ Configuración de total por ticket")
 if total_col and total_col in ventas.columns:
     st.sidebar.info(f"Columna de total detectada en ventas: **{total_col}**")
-    ticket_totals = to_num(ventas[total_col])
+    _checks = {c["check"]: c for c in (cl.get("reconciliation") or {}).get("checks", [])}
+    if _checks.get("total_ticket", {}).get("excepciones"):
+        st.sidebar.warning(f"{_checks['total_ticket']['excepciones']:,} tickets con un total distinto a la suma "
+                           "de su detalle (ver Conciliación en el Paso 2).")
 else:
     st.sidebar.warning("No se detectó columna 'total' en ventas. Se reconstruirá desde el detalle.")
-    base_col = "importe" if "importe" in df.columns else ("subtotal_calc" if "subtotal_calc" in df.columns else None)
-    if base_col and keys["det_venta_key"] in df.columns:
-        grp = df.groupby(keys["det_venta_key"])[base_col].sum().rename("total_ticket")
-        ticket_totals = grp.reset_index()["total_ticket"]
-    else:
-        ticket_totals = None
+
+# --- FILTROS: fecha, categoría, medio de pago y ciudad (resueltos con índices, ver analisis/filters.py) ---
+index = cl.get("index")
+full_cube = cube
+with st.expander("🔍 Filtros del análisis", expanded=False):
+    filter_dims = [d for d in (cat_col, "medio_pago", cube_city_col(cube)) if d and d in cube.dims]
+    fcols = st.columns(len(filter_dims) + 1)
+    date_range = None
+    bounds = index.date_bounds() if index is not None else months_bounds(cube.values("mes"))
+    with fcols[0]:
+        if bounds:
+            picked = st.date_input("Rango de fechas", value=(bounds[0].date(), bounds[1].date()),
+                                   min_value=bounds[0].date(), max_value=bounds[1].date())
+            if isinstance(picked, (tuple, list)) and len(picked) == 2 \
+                    and (picked[0] > bounds[0].date() or picked[1] < bounds[1].date()):
+                date_range = (picked[0], picked[1])
+    selected = {}
+    for col_ui, dim in zip(fcols[1:], filter_dims):
+        with col_ui:
+            options = index.values(dim) if index is not None and dim in index.dims else cube.values(dim)
+            selected[dim] = st.multiselect(dim.replace("_", " ").capitalize(), options)
+    cube = filtered_cube(full_cube, selected, date_range, index, cl.get("integrado"), keys, ventas, cl.get("plan"))
+    if cube is not full_cube:
+        st.caption(f"Líneas seleccionadas: {cube.rows:,} de {full_cube.rows:,}")
+        if index is None and cl.get("plan") is None and date_range is not None:
+            st.caption("Modo streaming: el rango de fechas se aplica por meses completos.")
 
 # --- HISTOGRAMA ---
 st.subheader("3.1 Distribución del total por ticket (Histograma)")
-if ticket_totals is not None and ticket_totals.notna().any():
-    serie = ticket_totals.dropna()
-    fig, ax = plt.subplots(figsize=(8, 4))
-    ax.hist(serie, bins=20)
-    ax.set_title("Distribución del total por ticket", weight="bold")
-    ax.set_xlabel("Total por ticket")
-    ax.set_ylabel("Frecuencia")
-    ax.grid(axis="y", linestyle="--", alpha=0.6)
-    st.pyplot(fig, use_container_width=True)
-    try:
-        guardar_png(fig, "hist_total_ticket")
-    except Exception:
-        pass
+hist_counts, hist_edges = cube.ticket_histogram(bins=20)
+if hist_counts.sum() > 0:
+    line_filters = [d for d, v in selected.items() if v and d not in cube.meta["ticket_dims"]]
+    if line_filters:
+        st.caption(f"Tickets completos, sin el filtro de {', '.join(line_filters)}: es un atributo de cada línea, "
+                   "no del ticket (el resto de los gráficos sí lo aplica).")
+    show_figure("hist_total_ticket", (hist_counts, hist_edges), lambda: histogram_figure(hist_counts, hist_edges))
 
     with st.expander("📘 Interpretación y definición estadística"):
         st.markdown("""
@@ -379,35 +526,12 @@ else:
 # --- BOXPLOT: IMPORTE vs CATEGORÍA ---
 st.subheader("3.2 Variabilidad de importe por categoría (Boxplot)")
 
-if cat_col and "importe" in df.columns:
-    sub = df[[cat_col, "importe"]].copy()
-    sub["importe"] = to_num(sub["importe"])
-    sub[cat_col] = sub[cat_col].astype(str).str.strip()
-    sub = sub.dropna(subset=[cat_col, "importe"])
-
-    if not sub.empty and sub["importe"].notna().any():
-        cats = list(sub[cat_col].unique().astype(str))
-        data = [sub.loc[sub[cat_col] == c, "importe"].dropna() for c in cats]
-        data_non_empty = [(c, s) for c, s in zip(cats, data) if len(s) > 0]
-
-        if len(data_non_empty) > 0:
-            cats_plot, data_plot = zip(*data_non_empty)
-            fig, ax = plt.subplots(figsize=(max(7, len(cats_plot) * 0.7), 5))
-            ax.boxplot(
-                data_plot,
-                labels=cats_plot,
-                patch_artist=True,
-                boxprops=dict(facecolor="lightblue"),
-                medianprops=dict(color="navy", linewidth=2),
-            )
-            ax.set_title("Boxplot de importe por categoría", weight="bold")
-            ax.set_ylabel("Importe")
-            plt.xticks(rotation=45, ha="right")
-            st.pyplot(fig, use_container_width=True)
-            try:
-                guardar_png(fig, "box_importe_categoria")
-            except Exception:
-                pass
+if cat_col and cube.has_measure("importe"):
+    data_plot = cube.box_stats(cat_col)
+
+    if cube.count("importe") > 0:
+        if len(data_plot) > 0:
+            show_figure("box_importe_categoria", data_plot, lambda: box_figure(data_plot))
 
             with st.expander("📘 Interpretación y definición estadística"):
                 st.markdown(f"""
@@ -435,22 +559,19 @@ else:
 # --- SCATTER: CANTIDAD vs PRECIO UNITARIO ---
 st.subheader("3.3 Relación cantidad vs precio unitario (Dispersión)")
 
-if {"cantidad", "precio_unitario"}.issubset(df.columns):
-    x = pd.to_numeric(df["cantidad"], errors="coerce")
-    y = pd.to_numeric(df["precio_unitario"], errors="coerce")
+scatter_src = cube.sample  # muestra uniforme acotada de líneas
+if {"cantidad", "precio_unitario"}.issubset(scatter_src.columns):
+    x = pd.to_numeric(scatter_src["cantidad"], errors="coerce")
+    y = pd.to_numeric(scatter_src["precio_unitario"], errors="coerce")
     mask = x.notna() & y.notna()
     if mask.sum() > 0:
-        fig, ax = plt.subplots(figsize=(7, 5))
-        ax.scatter(x[mask], y[mask], alpha=0.6, color="royalblue")
-        ax.set_xlabel("Cantidad")
-        ax.set_ylabel("Precio unitario")
-        ax.set_title("Dispersión: cantidad vs precio unitario", weight="bold")
-        ax.grid(alpha=0.3)
-        st.pyplot(fig, use_container_width=True)
-        try:
-            guardar_png(fig, "scatter_cantidad_precio")
-        except Exception:
-            pass
+        # muestra escalada a las líneas que representa (la grilla estima conteos de todo el integrado)
+        weight = max(cube.rows, 1) / max(len(scatter_src), 1)
+
+        show_figure("scatter_cantidad_precio", (x[mask], y[mask], weight),
+                    lambda: pairs_figure(x[mask], y[mask], weight))
+        if mask.sum() > MAX_POINTS:
+            st.caption("Con muchos pares se muestra la densidad: cada celda indica cuántas líneas caen en ese rango.")
 
         with st.expander("📘 Interpretación y definición estadística"):
             st.markdown(f"""
@@ -473,32 +594,11 @@ else:
 # --- BARRAS: INGRESOS POR CATEGORÍA ---
 st.subheader("3.4 Ingresos totales por categoría (Barras)")
 
-if cat_col and "importe" in df.columns:
-    df["importe"] = pd.to_numeric(df["importe"], errors="coerce")
-    serie = df.groupby(cat_col, dropna=True)["importe"].sum().sort_values(ascending=False)
+if cat_col and cube.has_measure("importe"):
+    serie = cube.revenue_by(cat_col)
     serie = serie[serie > 0]
     if not serie.empty:
-        num_cats = len(serie)
-        fig, ax = plt.subplots(figsize=(10, max(4, num_cats * 0.42)))
-        if num_cats > 8:
-            ax.barh(serie.index.astype(str), serie.values, color="teal")
-            ax.invert_yaxis()
-            ax.set_xlabel("Ingresos totales"); ax.set_ylabel("Categoría")
-            for i, v in enumerate(serie.values):
-                ax.text(v, i, f"{v:,.0f}", va="center", ha="left", fontsize=8)
-        else:
-            ax.bar(serie.index.astype(str), serie.values, color="teal")
-            plt.xticks(rotation=45, ha="right")
-            ax.set_ylabel("Ingresos totales")
-            for i, v in enumerate(serie.values):
-                ax.text(i, v, f"{v:,.0f}", ha="center", va="bottom", fontsize=8)
-        ax.set_title("Ingresos por categoría", weight="bold")
-        ax.grid(axis="x", linestyle="--", alpha=0.55)
-        st.pyplot(fig, use_container_width=True)
-        try:
-            guardar_png(fig, "bar_ingresos_categoria")
-        except Exception:
-            pass
+        show_figure("bar_ingresos_categoria", serie, lambda: revenue_figure(serie))
 
         with st.expander("📘 Interpretación y definición estadística"):
             st.markdown(f"""
@@ -520,33 +620,7 @@ else:
 # ===
 #====================== PASO 4 – CONCLUSIONES =========================
 st.header("4) 🧾 Conclusiones del análisis")
-conclusiones_txt = f"""
-Informe de conclusiones — {datetime.now().strftime('%Y-%m-%d %H:%M')}
-
-1) Calidad de datos
-- Los CSV originales presentaban inconsistencias normales (nombres de columnas, tipos, nulos, claves).
-- Se normalizaron nombres, se tipificaron campos numéricos y fechas, y se alinearon claves para integrar.
-
-2) Total por ticket (histograma)
-- Patrón típico: mayoría de tickets de monto bajo con algunos de alto valor (cola a la derecha).
-- Acción: vigilar outliers altos y entender qué los genera (combos, productos premium, promociones).
-
-3) Importe por categoría (boxplot)
-- Diferencias claras en mediana y dispersión. Algunas categorías son más “estables” y otras muy heterogéneas.
-- Acción: revisar estrategia de precios y mix en categorías con alta dispersión.
-
-4) Cantidad vs precio unitario (dispersión)
-- La relación no es lineal: hay productos que sostienen cantidades aun con precios altos y otros muy sensibles.
-- Acción: segmentar por sensibilidad al precio; ajustar promos y bundles.
-
-5) Ingresos por categoría (barras)
-- Pocas categorías suelen explicar la mayor parte de la facturación (ley de Pareto).
-- Acción: priorizar stock y campañas para las top; relanzar o optimizar las de menor rendimiento.
-
-Notas:
-- Este panel replica el flujo del notebook: datos crudos → limpieza → análisis visual → conclusiones.
-- Los CSV limpios quedaron guardados en: {os.path.abspath(OUTPUT_DIR)}
-"""
+conclusiones_txt = conclusions_text(cube, cl.get("reconciliation"), os.path.abspath(OUTPUT_DIR))
 
 st.text_area("Conclusiones generadas", conclusiones_txt, height=280)
 st.download_button(
@@ -556,6 +630,7 @@ st.download_button(
     mime="text/plain",
 )
 st.caption("Fin del informe. Lenguaje divulgativo para equipos no técnicos, con rigor de ciencia de datos.")
+debug_panel()
 
 
 
@@ -568,12 +643,13 @@ except Exception:
     pass
 
 try:
-    if 'df' in locals():
-        cols = [c for c in ['cantidad','precio_unitario','importe'] if c in df.columns]
-        if cols:
-            guardar_csv(df[cols].describe().T, 'desc_detalle')
-        if 'categoria' in df.columns and 'importe' in df.columns:
-            _res = df.groupby('categoria')['importe'].sum().sort_values(ascending=False).reset_index()
+    cube = full_cube if 'full_cube' in locals() else cube
+    if 'cube' in locals() and cube is not None:
+        _desc = cube.describe(['cantidad','precio_unitario','importe'])
+        if not _desc.empty:
+            guardar_csv(_desc, 'desc_detalle')
+        if 'categoria' in cube.dims and cube.has_measure('importe'):
+            _res = cube.revenue_by('categoria').reset_index()
             guardar_csv(_res, 'resumen_categoria', index=False)
 except Exception:
     pass
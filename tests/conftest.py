@@ -0,0 +1,37 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATA_DIR = os.path.join(ROOT, "data")
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Copia de `data/` que cada test puede modificar."""
+    return shutil.copytree(DATA_DIR, tmp_path / "data")
+
+def append_line(path, line: str):
+    """Agrega `line` al final del CSV (respetando si el archivo termina o no en salto de línea)."""
+    with open(path, "rb") as fh:
+        ends_with_newline = fh.read().endswith(b"\n")
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write(("" if ends_with_newline else "\n") + line + "\n")
+
+def csv_line(path, number: int) -> str:
+    """Línea `number` (0 = encabezado) del CSV, sin BOM ni salto de línea."""
+    with open(path, encoding="utf-8-sig") as fh:
+        return fh.read().splitlines()[number]
+
+def csv_outputs(output_dir) -> dict:
+    """Encabezado y filas ordenadas de cada CSV de `output_dir` (el orden de las filas depende del camino)."""
+    outputs = {}
+    for name in sorted(os.listdir(output_dir)):
+        if name.endswith(".csv"):
+            with open(os.path.join(output_dir, name), encoding="utf-8") as fh:
+                header, *rows = fh.read().splitlines()
+            outputs[name] = (header, sorted(rows))
+    return outputs
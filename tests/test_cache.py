@@ -0,0 +1,22 @@
+import os
+
+from conftest import append_line, csv_line
+
+from analisis.cache import TableCache
+from analisis.readers import robust_read_csv
+
+def test_put_after_file_change_is_found_again(data_dir, tmp_path):
+    cache = TableCache(str(tmp_path / "cache"))
+    path = str(data_dir / "clientes99.csv")
+    cache.put(path, robust_read_csv(path))
+    assert cache.get(path) is not None
+
+    append_line(path, csv_line(path, 1))
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+    assert cache.get(path) is None
+    changed = robust_read_csv(path)
+    cache.put(path, changed)
+
+    cached = cache.get(path)
+    assert cached is not None and len(cached) == len(changed)
+    assert list(cache._read_index()) == [cache.fingerprint(path)["key"]]
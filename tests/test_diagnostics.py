@@ -0,0 +1,22 @@
+import glob
+import os
+
+import pytest
+from conftest import DATA_DIR
+
+from analisis.diagnostics import profile_csv, profile_frame
+from analisis.readers import robust_read_csv
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(DATA_DIR, "*.csv"))), ids=os.path.basename)
+def test_chunked_profile_matches_in_memory(path):
+    # bloques chicos: cada uno infiere sus tipos (int64, float64 por un nulo, texto por un encabezado repetido)
+    full = profile_frame(robust_read_csv(path))
+    for chunksize in (7, 50):
+        chunked = profile_csv(path, chunksize=chunksize)
+        assert chunked["rows"] == full["rows"]
+        assert chunked["duplicates"] == full["duplicates"]
+        for a, b in zip(chunked["columns"], full["columns"]):
+            assert {k: v for k, v in a.items() if k not in ("top", "top_exact")} == \
+                   {k: v for k, v in b.items() if k not in ("top", "top_exact")}
+            if a["top_exact"] and b["top_exact"]:
+                assert [n for _, n in a["top"]] == [n for _, n in b["top"]]
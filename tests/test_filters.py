@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+from conftest import DATA_DIR
+
+from analisis.filters import filtered_cube
+from analisis.pipeline import run_pipeline
+
+@pytest.fixture(scope="module")
+def cleaned(tmp_path_factory):
+    return run_pipeline(DATA_DIR, str(tmp_path_factory.mktemp("out")), write_integrated=False)
+
+def ticket_view(cube) -> tuple:
+    return int(cube.tickets["n"].sum()), round(float(cube.tickets["total_ticket_sum"].sum()), 2)
+
+def test_category_filter_keeps_whole_tickets_on_every_path(cleaned):
+    cube, cat_col = cleaned["cube"], cleaned["cat_col"]
+    by_cat = {cat_col: cube.values(cat_col)[:1]}
+    fechas = cleaned["ventas"]["fecha"].dropna()
+    partial = (fechas.min().date(), (fechas.min() + pd.Timedelta(days=20)).date())  # no son meses completos
+    args = (cleaned["index"], cleaned["integrado"], cleaned["keys"], cleaned["ventas"])
+
+    assert ticket_view(filtered_cube(cube, by_cat)) == ticket_view(cube)
+    by_date = filtered_cube(cube, {}, partial, *args)
+    both = filtered_cube(cube, by_cat, partial, *args)
+    assert both.rows < by_date.rows
+    assert ticket_view(both) == ticket_view(by_date)
+
+    pytest.importorskip("duckdb")
+    from analisis.lazy import LazyPlan
+    plan = LazyPlan(DATA_DIR)
+    lazy = filtered_cube(cube, by_cat, partial, plan=plan)
+    assert lazy.rows == both.rows
+    assert ticket_view(lazy) == ticket_view(by_date)
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+from conftest import append_line, csv_line, csv_outputs
+
+from analisis import incremental
+from analisis.incremental import PENDING_DIRNAME, ingest
+from analisis.pipeline import run_pipeline
+from analisis.readers import raw_paths
+
+def split_sources(data_dir, fraction=0.5):
+    """Deja en ventas y detalle sólo la primera parte de sus filas; devuelve cómo restaurarlas."""
+    originals = {}
+    for name in incremental.SOURCES:
+        path = raw_paths(data_dir)[name]
+        with open(path, "rb") as fh:
+            originals[path] = fh.read()
+        lines = originals[path].splitlines(keepends=True)
+        with open(path, "wb") as fh:
+            fh.write(b"".join(lines[: 1 + int((len(lines) - 1) * fraction)]))
+
+    def restore():
+        for path, content in originals.items():
+            with open(path, "wb") as fh:
+                fh.write(content)
+    return restore
+
+def cube_totals(cube) -> dict:
+    return {
+        "lineas": int(cube.cells["n"].sum()),
+        "importe": round(float(cube.cells["importe_sum"].sum()), 2),
+        "tickets": int(cube.tickets["n"].sum()),
+        "total_tickets": round(float(cube.tickets["total_ticket_sum"].sum()), 2),
+    }
+
+@pytest.mark.parametrize("fractions", [(0.5,), (0.3, 0.6, 0.9)])
+def test_split_runs_match_full_run(data_dir, tmp_path, fractions):
+    full_out, split_out = str(tmp_path / "full"), str(tmp_path / "split")
+    full = ingest(str(data_dir), full_out, block_bytes=2048)
+    for fraction in fractions:
+        restore = split_sources(data_dir, fraction)
+        ingest(str(data_dir), split_out, block_bytes=2048)
+        restore()
+    result = ingest(str(data_dir), split_out, block_bytes=2048)
+    assert result["incremental"]["rebuild"] is None
+    assert cube_totals(result["cube"]) == cube_totals(full["cube"])
+    assert csv_outputs(split_out) == csv_outputs(full_out)
+
+def test_interrupted_commit_is_not_counted_twice(data_dir, tmp_path, monkeypatch):
+    full = cube_totals(ingest(str(data_dir), str(tmp_path / "full"))["cube"])
+    out = str(tmp_path / "out")
+    restore = split_sources(data_dir)
+    ingest(str(data_dir), out)
+    restore()
+
+    # corte antes de guardar el estado: lo pendiente se descarta y el lote se repite
+    def crash(*args, **kwargs):
+        raise RuntimeError("corte")
+    with monkeypatch.context() as m:
+        m.setattr(incremental, "write_state", crash)
+        with pytest.raises(RuntimeError):
+            ingest(str(data_dir), out)
+    assert os.path.isdir(os.path.join(out, PENDING_DIRNAME))
+    # corte después de guardar el estado: la próxima corrida completa el cambio
+    with monkeypatch.context() as m:
+        m.setattr(incremental, "_commit_pending", crash)
+        with pytest.raises(RuntimeError):
+            ingest(str(data_dir), out)
+
+    result = ingest(str(data_dir), out)
+    assert result["incremental"]["ventas"] == 0 and result["incremental"]["detalle"] == 0
+    assert cube_totals(result["cube"]) == full
+    assert not os.path.exists(os.path.join(out, PENDING_DIRNAME))
+
+def test_duplicated_venta_key_matches_batch(data_dir, tmp_path):
+    ventas = raw_paths(data_dir)["ventas"]
+    append_line(ventas, csv_line(ventas, -1))  # las dos copias caen en el segundo lote
+    batch = cube_totals(run_pipeline(str(data_dir), str(tmp_path / "batch"))["cube"])
+    assert cube_totals(ingest(str(data_dir), str(tmp_path / "full"), block_bytes=2048)["cube"]) == batch
+    out = str(tmp_path / "split")
+    restore = split_sources(data_dir)
+    ingest(str(data_dir), out, block_bytes=2048)
+    restore()
+    assert cube_totals(ingest(str(data_dir), out, block_bytes=2048)["cube"]) == batch
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+from analisis.jobs import JobRunner
+from analisis.profiling import measure
+
+@pytest.fixture
+def runner():
+    runner = JobRunner(max_workers=1)
+    yield runner
+    runner.shutdown(cancel=True, wait=True)
+
+def test_submit_attaches_to_the_active_job_with_the_same_key(runner):
+    gate = threading.Event()
+    first = runner.submit("salida", lambda: gate.wait(5) and "listo", tag="dataset-a")
+    again = runner.submit("salida", lambda: "otro", tag="dataset-b")
+    assert again is first and again.tag == "dataset-a"  # la clave está ocupada por otro dataset
+    assert runner.find("salida") is first
+
+    gate.set()
+    assert first.wait(5) and first.state == "terminado" and first.result == "listo"
+    assert runner.find("salida") is None
+    fresh = runner.submit("salida", lambda: "otro", tag="dataset-b")
+    assert fresh is not first and fresh.wait(5) and fresh.result == "otro"
+
+def test_cancel_stops_the_job_at_the_next_stage(runner):
+    started, release, reached = threading.Event(), threading.Event(), []
+
+    def work():
+        report = []
+        with measure(report, "uno"):
+            started.set()
+            release.wait(5)
+        with measure(report, "dos"):
+            reached.append("dos")
+        return report
+
+    job = runner.submit("salida", work)
+    queued = runner.submit("otra", lambda: reached.append("otra"))
+    assert started.wait(5)
+    assert queued.cancel()  # todavía no arrancó: se descarta sin correr
+    assert not job.cancel()  # corriendo: se corta al cerrar la etapa actual
+    release.set()
+    assert job.wait(5) and job.state == "cancelado"
+    assert [s["step"] for s in job.stages] == ["uno"]
+    assert reached == [] and queued.state == "cancelado" and job.result is None
@@ -0,0 +1,18 @@
+import pandas as pd
+from conftest import append_line, csv_line
+
+from analisis.joins import integrate_gather
+from analisis.pipeline import integrate_merge, prepare_tables, resolve_keys
+from analisis.readers import load_raw_data, raw_paths
+
+def test_gather_matches_merge(data_dir):
+    # una línea con un producto inexistente: el gather tiene que dejar nulos como el merge
+    detalle = raw_paths(data_dir)["detalle"]
+    fields = csv_line(detalle, 1).split(",")
+    fields[1] = "999999"
+    append_line(detalle, ",".join(fields))
+    tables = prepare_tables(*load_raw_data(str(data_dir)))
+    keys = resolve_keys(tables)
+    gathered, merged = integrate_gather(tables, keys), integrate_merge(tables, keys)
+    assert pd.isna(gathered["categoria"].iloc[-1])
+    pd.testing.assert_frame_equal(gathered, merged)
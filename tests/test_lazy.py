@@ -0,0 +1,12 @@
+import pytest
+from conftest import DATA_DIR, csv_outputs
+
+pytest.importorskip("duckdb")
+
+from analisis.lazy import lazy_pipeline
+from analisis.pipeline import run_pipeline
+
+def test_duckdb_csv_outputs_match_pandas(tmp_path):
+    run_pipeline(DATA_DIR, str(tmp_path / "pandas"), write_integrated=True)
+    lazy_pipeline(DATA_DIR, str(tmp_path / "duckdb"), write_integrated=True)
+    assert csv_outputs(tmp_path / "duckdb") == csv_outputs(tmp_path / "pandas")
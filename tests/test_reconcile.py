@@ -0,0 +1,33 @@
+from conftest import append_line, csv_line
+
+from analisis.pipeline import run_pipeline
+from analisis.readers import raw_paths
+from analisis.reconcile import summary_table
+from analisis.streaming import stream_pipeline, stream_reconcile
+
+def test_duplicated_product_key_is_reported_not_fatal(data_dir, tmp_path):
+    productos = data_dir / "productos99.csv"
+    append_line(productos, csv_line(productos, 1))  # misma clave que el primer producto
+
+    cleaned = run_pipeline(str(data_dir), str(tmp_path / "out"), write_integrated=False)
+    checks = {c["check"]: c for c in cleaned["reconciliation"]["checks"]}
+    assert checks["producto_duplicado"]["excepciones"] == 1
+    assert checks["venta_duplicada"]["excepciones"] == 0
+    assert len(cleaned["integrado"]) > len(cleaned["detalle"])  # el merge multiplica, como antes
+
+    streamed = stream_pipeline(str(data_dir), str(tmp_path / "out_stream"), chunksize=100)
+    assert summary_table(streamed["reconciliation"]).equals(summary_table(cleaned["reconciliation"]))
+
+def test_duplicated_venta_key_is_reported_on_every_path(data_dir, tmp_path):
+    ventas = raw_paths(data_dir)["ventas"]
+    append_line(ventas, csv_line(ventas, 1))  # misma clave que la primera venta
+
+    cleaned = run_pipeline(str(data_dir), str(tmp_path / "out"), write_integrated=False)
+    checks = {c["check"]: c for c in cleaned["reconciliation"]["checks"]}
+    assert checks["venta_duplicada"]["excepciones"] == 1
+    assert checks["producto_duplicado"]["excepciones"] == 0
+
+    expected = summary_table(cleaned["reconciliation"])
+    streamed = stream_pipeline(str(data_dir), str(tmp_path / "out_stream"), chunksize=100)
+    assert summary_table(streamed["reconciliation"]).equals(expected)
+    assert summary_table(stream_reconcile(str(data_dir), chunksize=50)).equals(expected)
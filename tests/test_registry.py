@@ -0,0 +1,45 @@
+import gc
+
+import pandas as pd
+
+from analisis.registry import DatasetRegistry, dataset_bytes
+
+def dataset(n=10_000):
+    return {"ventas": pd.DataFrame({"id_venta": range(n), "total": 1.0})}
+
+def refs(registry) -> dict:
+    return {row["dataset"]: row["refs"] for row in registry.stats()}
+
+def test_released_view_is_evicted_once_idle():
+    registry = DatasetRegistry(idle_seconds=3600)
+    registry.put("a", dataset())
+    view = registry.open("a")
+    assert refs(registry) == {"a": 1}
+    ventas = view["ventas"]
+    ventas["total"] = 0.0  # la vista entrega copias: el dataset registrado no cambia
+    assert (registry.open("a")["ventas"]["total"] == 1.0).all()
+    gc.collect()
+    assert refs(registry) == {"a": 1}
+
+    registry.idle_seconds = 0
+    assert registry.evict() == 0  # todavía hay una vista viva
+    del view
+    gc.collect()
+    assert "a" not in registry
+    assert registry.open("a") is None
+
+def test_max_bytes_never_evicts_referenced_datasets():
+    size = dataset_bytes(dataset())
+    registry = DatasetRegistry(max_bytes=int(size * 1.5), idle_seconds=3600)
+    registry.put("a", dataset())
+    view = registry.open("a")
+
+    registry.put("b", dataset())  # supera el tope, pero "a" está en uso y "b" recién llega
+    assert "a" in registry and "b" in registry
+    registry.put("c", dataset())  # sale el ocioso más viejo
+    assert "b" not in registry
+    assert refs(registry) == {"a": 1, "c": 0}
+
+    del view
+    gc.collect()  # al soltar "a" se vuelve a aplicar el tope: "c" lleva más tiempo ocioso
+    assert refs(registry) == {"a": 0}